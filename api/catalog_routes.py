@@ -0,0 +1,188 @@
+from flask import Blueprint, request, jsonify
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from models import Department, KPI, TARGET_TYPES
+from database import db
+
+catalog_bp = Blueprint('catalog', __name__)
+
+# Optional KPI fields and the values new KPIs get when they are left out
+KPI_DEFAULTS = {
+    'description': '',
+    'unit': '',
+    'target_type': 'higher_better',
+    'retention_days': None
+}
+# Department ids per query when loading the current KPIs (MSSQL allows 2100 parameters)
+ID_CHUNK = 1000
+
+def validate_catalog(document):
+    """Problems with a catalog document; empty when it can be applied"""
+    if not isinstance(document, dict) or not isinstance(document.get('departments'), list):
+        return ['Catalog must be an object with a list of departments']
+
+    errors = []
+    department_names = set()
+    for i, department in enumerate(document['departments']):
+        if not isinstance(department, dict) or not isinstance(department.get('name'), str) or not department['name'].strip():
+            errors.append(f'Department {i}: Missing required field: name')
+            continue
+        if department['name'] in department_names:
+            errors.append(f'Department {i}: Duplicate department {department["name"]}')
+        department_names.add(department['name'])
+        if not isinstance(department.get('description', ''), str):
+            errors.append(f'Department {i}: description must be a string')
+
+        kpis = department.get('kpis', [])
+        if not isinstance(kpis, list):
+            errors.append(f'Department {i}: kpis must be a list')
+            continue
+
+        kpi_names = set()
+        for j, kpi in enumerate(kpis):
+            if not isinstance(kpi, dict) or not isinstance(kpi.get('name'), str) or not kpi['name'].strip():
+                errors.append(f'Department {i}, KPI {j}: Missing required field: name')
+                continue
+            if kpi['name'] in kpi_names:
+                errors.append(f'Department {i}, KPI {j}: Duplicate KPI {kpi["name"]}')
+            kpi_names.add(kpi['name'])
+            for field in ('description', 'unit'):
+                if not isinstance(kpi.get(field, ''), str):
+                    errors.append(f'Department {i}, KPI {j}: {field} must be a string')
+            if kpi.get('target_type', KPI_DEFAULTS['target_type']) not in TARGET_TYPES:
+                errors.append(f'Department {i}, KPI {j}: target_type must be one of {", ".join(TARGET_TYPES)}')
+            if not isinstance(kpi.get('is_active', True), bool):
+                errors.append(f'Department {i}, KPI {j}: is_active must be true or false')
+            retention_days = kpi.get('retention_days')
+            # bool is an int subclass: true would otherwise be kept as 1 day
+            if retention_days is not None and (type(retention_days) is not int or retention_days < 1):
+                errors.append(f'Department {i}, KPI {j}: retention_days must be a positive integer')
+
+    return errors
+
+def current_kpis(department_ids):
+    """Current KPI rows of the given departments, oldest first"""
+    rows = []
+    for first in range(0, len(department_ids), ID_CHUNK):
+        rows.extend(db.session.execute(
+            select(KPI.id, KPI.department_id, KPI.name, KPI.is_active, *[getattr(KPI, field) for field in KPI_DEFAULTS])
+            .where(KPI.department_id.in_(department_ids[first:first + ID_CHUNK]))
+            .order_by(KPI.id)
+        ))
+    return rows
+
+def apply_catalog(document):
+    """Bring the catalog in line with a validated document, in one transaction.
+
+    Departments are matched by name and KPIs by name within their
+    department. Listed rows are inserted or updated (fields left out keep
+    their current values); KPIs of a listed department that the document
+    does not list are deactivated. Departments the document does not list
+    are left alone. Every step is one set-based statement, so the number
+    of queries does not grow with the size of the catalog.
+    """
+    departments = document['departments']
+    existing = {row.name: row for row in db.session.execute(select(Department.id, Department.name, Department.description))}
+
+    new_departments = [
+        {'name': department['name'], 'description': department.get('description', '')}
+        for department in departments if department['name'] not in existing
+    ]
+    changed_departments = [
+        {'id': existing[department['name']].id, 'description': department['description']}
+        for department in departments
+        if department['name'] in existing and 'description' in department
+        and department['description'] != existing[department['name']].description
+    ]
+
+    listed_ids = [existing[department['name']].id for department in departments if department['name'] in existing]
+    rows = current_kpis(listed_ids)
+    current = {}
+    for row in rows:
+        # With duplicate names in the database, the oldest KPI is the one the document manages
+        current.setdefault((row.department_id, row.name), row)
+
+    department_ids = {name: row.id for name, row in existing.items()}
+    if new_departments:
+        # Names are unique, so one read gets the new ids back; RETURNING
+        # in parameter order would send one INSERT per row on SQLite
+        db.session.execute(insert(Department), new_departments)
+        department_ids = dict(db.session.execute(select(Department.name, Department.id)).all())
+    if changed_departments:
+        db.session.execute(update(Department), changed_departments)
+
+    new_kpis = []
+    changed_kpis = []
+    listed = set()
+    for department in departments:
+        department_id = department_ids[department['name']]
+        for kpi in department.get('kpis', []):
+            row = current.get((department_id, kpi['name']))
+            if row is None:
+                new_kpis.append({
+                    'name': kpi['name'],
+                    'department_id': department_id,
+                    'is_active': kpi.get('is_active', True),
+                    **{field: kpi.get(field, default) for field, default in KPI_DEFAULTS.items()}
+                })
+                continue
+
+            listed.add(row.id)
+            values = {field: kpi[field] for field in KPI_DEFAULTS if field in kpi and kpi[field] != getattr(row, field)}
+            if kpi.get('is_active', True) != row.is_active:
+                values['is_active'] = kpi.get('is_active', True)
+            if values:
+                changed_kpis.append({'id': row.id, **values})
+
+    deactivated = [
+        {'id': row.id, 'is_active': False}
+        for row in rows if row.id not in listed and row.is_active
+    ]
+
+    if new_kpis:
+        db.session.execute(insert(KPI), new_kpis)
+    if changed_kpis or deactivated:
+        # Bulk UPDATE by primary key: one executemany per set of changed columns
+        db.session.execute(update(KPI), changed_kpis + deactivated)
+
+    db.session.commit()
+
+    listed_kpis = sum(len(department.get('kpis', [])) for department in departments)
+    return {
+        'departments': {
+            'created': len(new_departments),
+            'updated': len(changed_departments),
+            'unchanged': len(departments) - len(new_departments) - len(changed_departments)
+        },
+        'kpis': {
+            'created': len(new_kpis),
+            'updated': len(changed_kpis),
+            'deactivated': len(deactivated),
+            'unchanged': listed_kpis - len(new_kpis) - len(changed_kpis)
+        }
+    }
+
+@catalog_bp.route('', methods=['PUT'])
+def put_catalog():
+    """Create, update and deactivate departments and KPIs to match a catalog document"""
+    try:
+        document = request.get_json(silent=True)
+
+        errors = validate_catalog(document)
+        if errors:
+            return jsonify({'success': False, 'error': 'Invalid catalog', 'errors': errors}), 400
+
+        summary = apply_catalog(document)
+
+        return jsonify({
+            'success': True,
+            'message': 'Catalog applied successfully',
+            'summary': summary
+        })
+
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Catalog changed by another request, try again'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
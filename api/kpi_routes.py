@@ -1,10 +1,17 @@
 from flask import Blueprint, request, jsonify
-from models import KPI, KPIData, Department
+from models import KPI, KPIData, KPILatest, Department, PERFORMANCE_STATUSES, performance_status_case
 from database import db
+from database.comparisons import AGGREGATES, GRAINS, MAX_PERIODS, period_comparisons
+from database.history import downsample, kpi_history
+from database.partitions import query_partitions
 from datetime import datetime
+import numpy as np
 
 kpi_bp = Blueprint('kpi', __name__)
 
+# Most points one history response carries
+MAX_HISTORY_POINTS = 10000
+
 @kpi_bp.route('/', methods=['GET'])
 def get_kpis():
     """Get all KPIs with optional filtering"""
@@ -71,6 +78,89 @@ def create_kpi():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@kpi_bp.route('/latest', methods=['GET'])
+def get_latest_values():
+    """Get the latest value of every KPI in one read of kpi_latest"""
+    try:
+        department_id = request.args.get('department_id', type=int)
+        active_only = request.args.get('active_only', 'true').lower() == 'true'
+        
+        query = db.session.query(
+            KPILatest,
+            KPI.name,
+            KPI.unit,
+            KPI.department_id,
+            Department.name.label('department_name'),
+            performance_status_case(KPILatest.value, KPILatest.target, KPI.target_type, KPI.id.is_not(None))
+        ).join(KPI, KPILatest.kpi_id == KPI.id).join(Department).order_by(Department.name, KPI.name)
+        
+        if department_id:
+            query = query.filter(KPI.department_id == department_id)
+        
+        if active_only:
+            query = query.filter(KPI.is_active == True)
+        
+        values = [
+            {
+                **latest.to_dict(),
+                'kpi_name': name,
+                'unit': unit,
+                'department_id': dept_id,
+                'department_name': department_name,
+                'performance_status': status
+            }
+            for latest, name, unit, dept_id, department_name, status in query
+        ]
+        
+        return jsonify({
+            'success': True,
+            'data': values,
+            'count': len(values)
+        })
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@kpi_bp.route('/compare', methods=['GET'])
+def compare_periods():
+    """Compare KPI values with the previous period and the same period a year earlier"""
+    try:
+        grain = request.args.get('grain', 'month')
+        aggregate = request.args.get('aggregate', 'avg')
+        periods = request.args.get('periods', 12, type=int)
+        
+        try:
+            kpi_ids = [int(kpi_id) for kpi_id in request.args.get('kpi_ids', '').split(',') if kpi_id.strip()]
+        except ValueError:
+            return jsonify({'success': False, 'error': 'kpi_ids must be a comma-separated list of ids'}), 400
+        if not kpi_ids:
+            return jsonify({'success': False, 'error': 'Missing required parameter: kpi_ids'}), 400
+        
+        if grain not in GRAINS:
+            return jsonify({'success': False, 'error': f'Invalid grain: {grain}'}), 400
+        if aggregate not in AGGREGATES:
+            return jsonify({'success': False, 'error': f'Invalid aggregate: {aggregate}'}), 400
+        if not 1 <= periods <= MAX_PERIODS:
+            return jsonify({'success': False, 'error': f'periods must be between 1 and {MAX_PERIODS}'}), 400
+        
+        try:
+            end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'end must be an ISO date'}), 400
+        
+        comparisons = period_comparisons(kpi_ids, grain, periods, aggregate, end)
+        
+        return jsonify({
+            'success': True,
+            'data': comparisons,
+            'count': len(comparisons),
+            'grain': grain,
+            'aggregate': aggregate
+        })
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @kpi_bp.route('/<int:kpi_id>', methods=['GET'])
 def get_kpi(kpi_id):
     """Get a specific KPI by ID"""
@@ -93,13 +183,38 @@ def get_kpi_data(kpi_id):
         # Get query parameters for filtering
         limit = request.args.get('limit', 100, type=int)
         period = request.args.get('period')
+        status = request.args.get('status')
         
-        query = KPIData.query.filter_by(kpi_id=kpi_id)
+        if status and status not in PERFORMANCE_STATUSES:
+            return jsonify({'success': False, 'error': f'Invalid status: {status}'}), 400
         
-        if period:
-            query = query.filter_by(period=period)
+        try:
+            start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+            end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'start and end must be ISO dates'}), 400
         
-        kpi_data = query.order_by(KPIData.timestamp.desc()).limit(limit).all()
+        def build_query(entity):
+            query = db.session.query(entity).filter(entity.kpi_id == kpi_id)
+            
+            if period:
+                query = query.filter(entity.period == period)
+            
+            if status:
+                query = query.filter(entity.performance_status == status)
+            
+            if start:
+                query = query.filter(entity.timestamp >= start)
+            if end:
+                query = query.filter(entity.timestamp < end)
+            
+            return query.order_by(entity.timestamp.desc()).limit(limit)
+        
+        kpi_data = query_partitions(
+            build_query, start, end,
+            limit=limit, newest_first=True,
+            sort_key=lambda point: point.timestamp or datetime.min
+        )
         
         return jsonify({
             'success': True,
@@ -111,6 +226,42 @@ def get_kpi_data(kpi_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@kpi_bp.route('/<int:kpi_id>/history', methods=['GET'])
+def get_kpi_history(kpi_id):
+    """Get a KPI's history as columns, for charts over long ranges"""
+    try:
+        kpi = db.session.get(KPI, kpi_id)
+        if not kpi:
+            return jsonify({'success': False, 'error': 'KPI not found'}), 404
+        
+        points = request.args.get('points', 1000, type=int)
+        if not 1 <= points <= MAX_HISTORY_POINTS:
+            return jsonify({'success': False, 'error': f'points must be between 1 and {MAX_HISTORY_POINTS}'}), 400
+        
+        try:
+            start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+            end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'start and end must be ISO dates'}), 400
+        
+        timestamps, values, targets = downsample(*kpi_history(kpi_id, start, end), points)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'timestamps': np.datetime_as_string(timestamps.astype('datetime64[us]'), unit='s').tolist(),
+                'values': values.tolist(),
+                'targets': [None if np.isnan(target) else target for target in targets.tolist()]
+            },
+            'count': len(timestamps),
+            'kpi_id': kpi.id,
+            'kpi_name': kpi.name,
+            'unit': kpi.unit
+        })
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @kpi_bp.route('/<int:kpi_id>/data', methods=['POST'])
 def add_kpi_data(kpi_id):
     """Add new data point for a KPI"""
@@ -0,0 +1,38 @@
+from flask import Blueprint, request, jsonify
+from database.search import SEARCH_KINDS, search
+
+search_bp = Blueprint('search', __name__)
+
+MAX_LIMIT = 100
+MAX_OFFSET = 1000
+
+@search_bp.route('', methods=['GET'])
+def search_catalog():
+    """Search KPIs, departments and data point notes by keyword, best matches first"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'success': False, 'error': 'Missing required parameter: q'}), 400
+        
+        kinds = request.args.get('type', ','.join(SEARCH_KINDS)).split(',')
+        invalid = [kind for kind in kinds if kind not in SEARCH_KINDS]
+        if invalid:
+            return jsonify({'success': False, 'error': f'Invalid type: {invalid[0]}'}), 400
+        
+        limit = min(max(request.args.get('limit', 20, type=int), 1), MAX_LIMIT)
+        offset = min(max(request.args.get('offset', 0, type=int), 0), MAX_OFFSET)
+        
+        results = search(query, kinds, limit, offset)
+        
+        return jsonify({
+            'success': True,
+            'data': results,
+            'count': len(results),
+            'limit': limit,
+            'offset': offset
+        })
+    
+    except NotImplementedError as e:
+        return jsonify({'success': False, 'error': str(e)}), 501
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -0,0 +1,5 @@
+"""Async read API entry point: uvicorn asgi:app (see README, Async read API)"""
+from app import app as flask_app
+from async_api import create_asgi_app
+
+app = create_asgi_app(flask_app)
@@ -0,0 +1,337 @@
+import asyncio
+import csv
+from datetime import datetime
+from io import StringIO
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database.engines import configure_engine, engine_options, engine_profile
+from models import Department, KPI, KPIData, PERFORMANCE_STATUSES
+from views import EXPORT_FIELDS, export_columns, export_record, get_archived_export_rows
+from web import dumps
+from web.ratelimit import RateLimits
+from .http import ASGIApp, Response, Router, StreamingResponse, json_response
+
+# Async drivers for the sync database URLs the app is configured with
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'mssql': 'mssql+aioodbc',
+    'postgresql': 'postgresql+asyncpg'
+}
+
+def async_database_url(uri):
+    """The async-driver version of a sync database URL"""
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver for database backend: {backend}')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+def create_read_engine(config):
+    """Async engine for the read API, on the reader database if one is set"""
+    uri = config.get('DATABASE_READ_URL') or config['SQLALCHEMY_DATABASE_URI']
+    profile = config.get('DATABASE_ENGINE_PROFILE', 'default')
+
+    options = engine_options(uri, profile)
+    options.pop('fast_executemany', None)
+    if 'pool_size' in options or make_url(uri).database not in (None, '', ':memory:'):
+        options['pool_size'] = config.get('ASYNC_POOL_SIZE', 20)
+
+    engine = create_async_engine(async_database_url(uri), **options)
+    # No statement timeout: the SQLite one is a progress handler on the
+    # driver connection, which aiosqlite runs in its own thread
+    configure_engine(engine.sync_engine, pragmas=engine_profile(uri, profile).get('pragmas'), read_only=True)
+    return engine
+
+def parse_dates(args):
+    """start/end query arguments as datetimes"""
+    try:
+        start = datetime.fromisoformat(args['start']) if args.get('start') else None
+        end = datetime.fromisoformat(args['end']) if args.get('end') else None
+    except ValueError:
+        raise ValueError('start and end must be ISO dates')
+    return start, end
+
+def kpi_select():
+    """KPI columns of KPI.to_dict(), with counts computed in SQL"""
+    data_points = select(func.count(KPIData.id))\
+        .where(KPIData.kpi_id == KPI.id)\
+        .correlate(KPI)\
+        .scalar_subquery()
+    return select(
+        KPI.id, KPI.name, KPI.description, KPI.unit, KPI.target_type, KPI.department_id,
+        Department.name.label('department_name'), KPI.created_at, KPI.is_active,
+        data_points.label('data_points')
+    ).outerjoin(Department, KPI.department_id == Department.id)
+
+def department_select():
+    """Department columns of Department.to_dict(), with counts computed in SQL"""
+    kpi_count = select(func.count(KPI.id))\
+        .where(KPI.department_id == Department.id)\
+        .correlate(Department)\
+        .scalar_subquery()
+    return select(
+        Department.id, Department.name, Department.description, Department.created_at,
+        kpi_count.label('kpi_count')
+    )
+
+def kpi_dict(row):
+    return {
+        'id': row.id,
+        'name': row.name,
+        'description': row.description,
+        'unit': row.unit,
+        'target_type': row.target_type,
+        'department_id': row.department_id,
+        'department_name': row.department_name,
+        'created_at': row.created_at,
+        'is_active': row.is_active,
+        'data_points': row.data_points
+    }
+
+def department_dict(row):
+    return {
+        'id': row.id,
+        'name': row.name,
+        'description': row.description,
+        'created_at': row.created_at,
+        'kpi_count': row.kpi_count
+    }
+
+def data_point_dict(row):
+    return {
+        'id': row.id,
+        'kpi_id': row.kpi_id,
+        'kpi_name': row.kpi_name,
+        'department_name': row.department_name,
+        'value': row.value,
+        'target': row.target,
+        'timestamp': row.timestamp,
+        'period': row.period,
+        'notes': row.notes,
+        'created_by': row.created_by,
+        'performance_status': row.performance_status
+    }
+
+class ReadAPI:
+    """Async handlers for the read-heavy and long-running endpoints.
+
+    Responses match the Flask views; rows are read with Core selects over
+    the shared models, so nothing is lazy-loaded per row.
+    """
+
+    def __init__(self, flask_app, engine):
+        self.flask_app = flask_app
+        self.engine = engine
+        self.batch_size = flask_app.config.get('ASYNC_EXPORT_BATCH_SIZE', 1000)
+
+    def routes(self):
+        router = Router()
+        router.add('/api/dashboard-data', self.dashboard_data)
+        router.add('/api/kpi/<int:kpi_id>/data', self.kpi_data)
+        router.add('/api/departments/', self.departments)
+        router.add('/api/departments/<int:dept_id>', self.department)
+        router.add('/api/departments/<int:dept_id>/kpis', self.department_kpis)
+        router.add('/export/powerbi-data', self.export_powerbi_data)
+        router.add('/export/csv', self.export_csv)
+        return router
+
+    async def fetch(self, statement):
+        async with self.engine.connect() as connection:
+            return (await connection.execute(statement)).all()
+
+    async def dashboard_data(self, request):
+        async with self.engine.connect() as connection:
+            totals = (await connection.execute(select(
+                select(func.count(Department.id)).scalar_subquery(),
+                select(func.count(KPI.id)).scalar_subquery(),
+                select(func.count(KPIData.id)).scalar_subquery()
+            ))).one()
+            recent = (await connection.execute(
+                select(KPIData.id, KPI.name.label('kpi_name'), Department.name.label('department'),
+                       KPIData.value, KPIData.target, KPIData.timestamp)
+                .join(KPI, KPIData.kpi_id == KPI.id)
+                .join(Department, KPI.department_id == Department.id)
+                .order_by(KPIData.timestamp.desc())
+                .limit(20)
+            )).all()
+
+        return json_response({
+            'success': True,
+            'summary': {
+                'total_departments': totals[0],
+                'total_kpis': totals[1],
+                'total_data_points': totals[2]
+            },
+            'recent_kpis': [{
+                'id': row.id,
+                'kpi_name': row.kpi_name,
+                'department': row.department,
+                'value': row.value,
+                'target': row.target,
+                'timestamp': row.timestamp,
+                'performance': 'Above Target' if row.target is not None and row.value >= row.target else 'Below Target'
+            } for row in recent]
+        })
+
+    async def kpi_data(self, request, kpi_id):
+        try:
+            limit = int(request.args.get('limit', 100))
+        except ValueError:
+            limit = 100
+        period = request.args.get('period')
+        status = request.args.get('status')
+
+        if status and status not in PERFORMANCE_STATUSES:
+            return json_response({'success': False, 'error': f'Invalid status: {status}'}, 400)
+        try:
+            start, end = parse_dates(request.args)
+        except ValueError as e:
+            return json_response({'success': False, 'error': str(e)}, 400)
+
+        kpi = await self.fetch(kpi_select().where(KPI.id == kpi_id))
+        if not kpi:
+            return json_response({'success': False, 'error': 'KPI not found'}, 404)
+
+        query = select(
+            KPIData.id, KPIData.kpi_id, KPI.name.label('kpi_name'), Department.name.label('department_name'),
+            KPIData.value, KPIData.target, KPIData.timestamp, KPIData.period, KPIData.notes,
+            KPIData.created_by, KPIData.performance_status.label('performance_status')
+        ).join(KPI, KPIData.kpi_id == KPI.id)\
+         .outerjoin(Department, KPI.department_id == Department.id)\
+         .where(KPIData.kpi_id == kpi_id)
+        if period:
+            query = query.where(KPIData.period == period)
+        if status:
+            query = query.where(KPIData.performance_status == status)
+        if start:
+            query = query.where(KPIData.timestamp >= start)
+        if end:
+            query = query.where(KPIData.timestamp < end)
+
+        rows = await self.fetch(query.order_by(KPIData.timestamp.desc()).limit(limit))
+        return json_response({
+            'success': True,
+            'data': [data_point_dict(row) for row in rows],
+            'count': len(rows),
+            'kpi': kpi_dict(kpi[0])
+        })
+
+    async def departments(self, request):
+        rows = await self.fetch(department_select())
+        return json_response({
+            'success': True,
+            'data': [department_dict(row) for row in rows],
+            'count': len(rows)
+        })
+
+    async def department(self, request, dept_id):
+        rows = await self.fetch(department_select().where(Department.id == dept_id))
+        if not rows:
+            return json_response({'success': False, 'error': 'Department not found'}, 404)
+        return json_response({'success': True, 'data': department_dict(rows[0])})
+
+    async def department_kpis(self, request, dept_id):
+        department = await self.fetch(department_select().where(Department.id == dept_id))
+        if not department:
+            return json_response({'success': False, 'error': 'Department not found'}, 404)
+
+        kpis = await self.fetch(kpi_select().where(KPI.department_id == dept_id))
+        return json_response({
+            'success': True,
+            'data': [kpi_dict(row) for row in kpis],
+            'count': len(kpis),
+            'department': department_dict(department[0])
+        })
+
+    def export_query(self, status_filter, start, end):
+        query = select(*export_columns(KPIData)).select_from(KPIData)\
+            .join(KPI, KPIData.kpi_id == KPI.id)\
+            .join(Department, KPI.department_id == Department.id)
+        if status_filter:
+            query = query.where(KPIData.performance_status == status_filter)
+        if start:
+            query = query.where(KPIData.timestamp >= start)
+        if end:
+            query = query.where(KPIData.timestamp < end)
+        return query
+
+    def archived_rows(self, status_filter, start, end):
+        with self.flask_app.app_context():
+            return get_archived_export_rows(status_filter, start, end)
+
+    async def export_batches(self, status_filter, start, end):
+        """Export rows in batches, archived rows first, as get_export_rows() orders them"""
+        if start:
+            archived = await asyncio.to_thread(self.archived_rows, status_filter, start, end)
+            for first in range(0, len(archived), self.batch_size):
+                yield archived[first:first + self.batch_size]
+
+        async with self.engine.connect() as connection:
+            result = await connection.stream(self.export_query(status_filter, start, end))
+            async for batch in result.partitions(self.batch_size):
+                yield batch
+
+    def parse_export_args(self, request):
+        status_filter = request.args.get('status')
+        if status_filter and status_filter not in PERFORMANCE_STATUSES:
+            raise ValueError(f'Invalid status: {status_filter}')
+        start, end = parse_dates(request.args)
+        return status_filter, start, end
+
+    async def export_powerbi_data(self, request):
+        try:
+            status_filter, start, end = self.parse_export_args(request)
+        except ValueError as e:
+            return json_response({'success': False, 'error': str(e)}, 400)
+
+        async def chunks():
+            # Same document as the Flask view (keys sorted), written as rows arrive
+            count = 0
+            yield b'{"data":['
+            async for batch in self.export_batches(status_filter, start, end):
+                records = b','.join(dumps(export_record(row)) for row in batch)
+                yield (b',' if count else b'') + records
+                count += len(batch)
+            yield f'],"record_count":{count},"success":true}}\n'.encode()
+
+        return StreamingResponse(chunks())
+
+    async def export_csv(self, request):
+        try:
+            status_filter, start, end = self.parse_export_args(request)
+        except ValueError as e:
+            return Response(f'Error exporting CSV: {str(e)}', 400, content_type='text/html; charset=utf-8')
+
+        async def chunks():
+            output = StringIO()
+            writer = csv.DictWriter(output, fieldnames=EXPORT_FIELDS)
+            writer.writeheader()
+            async for batch in self.export_batches(status_filter, start, end):
+                writer.writerows(export_record(row, blank_missing=True) for row in batch)
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+            yield output.getvalue()
+
+        return StreamingResponse(chunks(), content_type='text/csv',
+                                 headers={'Content-Disposition': 'attachment; filename=kpi_data.csv'})
+
+def create_asgi_app(flask_app):
+    """ASGI app serving the read endpoints of `flask_app` with an async engine"""
+    if flask_app.config.get('KPI_DATA_PARTITIONING'):
+        raise RuntimeError('The async read API does not read kpi_data partitions; '
+                           'serve the read endpoints from the WSGI app instead')
+
+    engine = create_read_engine(flask_app.config)
+    api = ReadAPI(flask_app, engine)
+    compression = None
+    if flask_app.config.get('COMPRESSION_ENABLED', True):
+        compression = {key: flask_app.config[key] for key in (
+            'COMPRESSION_MIN_SIZE', 'COMPRESSION_GZIP_LEVEL', 'COMPRESSION_BROTLI_QUALITY'
+        )}
+    rate_limits = RateLimits(flask_app.config) if flask_app.config.get('RATE_LIMIT_ENABLED', True) else None
+    return ASGIApp(api.routes(), on_shutdown=engine.dispose, compression=compression,
+                   rate_limits=rate_limits, client_header=flask_app.config.get('RATE_LIMIT_CLIENT_HEADER'))
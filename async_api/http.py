@@ -0,0 +1,189 @@
+import logging
+import math
+import re
+from urllib.parse import parse_qs
+
+from web import dumps
+from web.compression import COMPRESSIBLE_MIMETYPES, Compressor, negotiate
+
+stream_log = logging.getLogger('kpi.async_api')
+
+class Request:
+    def __init__(self, scope):
+        self.scope = scope
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = {key: values[0] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+        self.headers = {name.decode().lower(): value.decode() for name, value in scope.get('headers', [])}
+
+class Response:
+    def __init__(self, body=b'', status=200, content_type='application/json', headers=None):
+        self.body = body.encode() if isinstance(body, str) else body
+        self.status = status
+        self.content_type = content_type
+        self.headers = [(b'content-type', content_type.encode())]
+        for name, value in (headers or {}).items():
+            self.headers.append((name.lower().encode(), value.encode()))
+
+    def compressible(self):
+        mimetype = self.content_type.split(';')[0].strip()
+        return mimetype in COMPRESSIBLE_MIMETYPES and 200 <= self.status < 300 and self.status != 204
+
+    def compress(self, accept_encoding, settings):
+        """Encode the body as the client accepts, like web.compression does for Flask"""
+        if not self.compressible():
+            return
+        self.headers.append((b'vary', b'Accept-Encoding'))
+        encoding = negotiate(accept_encoding)
+        if encoding is None or len(self.body) < settings['COMPRESSION_MIN_SIZE']:
+            return
+        compressor = Compressor(encoding, settings['COMPRESSION_GZIP_LEVEL'], settings['COMPRESSION_BROTLI_QUALITY'])
+        self.body = compressor.compress(self.body) + compressor.finish()
+        self.headers.append((b'content-encoding', encoding.encode()))
+
+    async def __call__(self, send, head=False):
+        await send({
+            'type': 'http.response.start',
+            'status': self.status,
+            'headers': self.headers + [(b'content-length', str(len(self.body)).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': b'' if head else self.body})
+
+class StreamingResponse(Response):
+    """Sends the chunks of an async iterator as they are produced"""
+
+    def __init__(self, chunks, status=200, content_type='application/json', headers=None):
+        super().__init__(status=status, content_type=content_type, headers=headers)
+        self.chunks = chunks
+
+    def compress(self, accept_encoding, settings):
+        if not self.compressible():
+            return
+        self.headers.append((b'vary', b'Accept-Encoding'))
+        encoding = negotiate(accept_encoding)
+        if encoding is None:
+            return
+        compressor = Compressor(encoding, settings['COMPRESSION_GZIP_LEVEL'], settings['COMPRESSION_BROTLI_QUALITY'])
+        self.chunks = self.compressed(self.chunks, compressor)
+        self.headers.append((b'content-encoding', encoding.encode()))
+
+    @staticmethod
+    async def compressed(chunks, compressor):
+        async for chunk in chunks:
+            data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+    async def __call__(self, send, head=False):
+        await send({'type': 'http.response.start', 'status': self.status, 'headers': self.headers})
+        if head:
+            await self.chunks.aclose()
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        try:
+            async for chunk in self.chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        except Exception:
+            # The status is already sent: leave the response incomplete so
+            # the server drops the connection instead of ending a 200 that
+            # is missing rows
+            stream_log.exception('Streamed response failed after its headers were sent')
+            return
+        await send({'type': 'http.response.body', 'body': b''})
+
+def json_response(data, status=200):
+    """JSON the way Flask's jsonify writes it: compact, sorted keys, newline"""
+    return Response(dumps(data) + b'\n', status)
+
+class Router:
+    """Maps GET paths to handlers; '<int:name>' segments become int arguments"""
+
+    def __init__(self):
+        self.routes = []
+
+    def add(self, pattern, handler):
+        regex = re.sub(r'<int:(\w+)>', r'(?P<\1>\\d+)', pattern)
+        self.routes.append((re.compile(f'^{regex}$'), pattern, handler))
+
+    def match(self, path):
+        """(pattern, handler, arguments) of the route for a path"""
+        for regex, pattern, handler in self.routes:
+            match = regex.match(path)
+            if match:
+                return pattern, handler, {key: int(value) for key, value in match.groupdict().items()}
+        return None, None, None
+
+def too_many_requests(retry_after, message):
+    return Response(dumps({'success': False, 'error': message}) + b'\n', 429,
+                    headers={'Retry-After': str(max(1, math.ceil(retry_after)))})
+
+class ASGIApp:
+    """Minimal ASGI application: GET routes, JSON errors, rate limits,
+    compression and lifespan hooks"""
+
+    def __init__(self, router, on_shutdown=None, compression=None, rate_limits=None, client_header=None):
+        self.router = router
+        self.on_shutdown = on_shutdown
+        self.compression = compression
+        self.rate_limits = rate_limits
+        self.client_header = client_header.lower() if client_header else None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        request = Request(scope)
+        pattern, handler, params = self.router.match(request.path)
+        slot = None
+        if handler is None:
+            response = json_response({'success': False, 'error': 'Not found'}, 404)
+        elif request.method not in ('GET', 'HEAD'):
+            response = Response(dumps({'success': False, 'error': 'Method not allowed'}) + b'\n', 405,
+                                headers={'Allow': 'GET, HEAD'})
+        else:
+            response, slot = self.admit(request, pattern)
+            if response is None:
+                try:
+                    response = await handler(request, **params)
+                except Exception as e:
+                    response = json_response({'success': False, 'error': str(e)}, 500)
+
+        if self.compression is not None:
+            response.compress(request.headers.get('accept-encoding'), self.compression)
+        try:
+            await response(send, head=request.method == 'HEAD')
+        finally:
+            if slot is not None:
+                self.rate_limits.release(slot)
+
+    def admit(self, request, pattern):
+        """(429 response or None, concurrency slot held) for a request, as the Flask app limits it"""
+        if self.rate_limits is None:
+            return None, None
+        client = request.headers.get(self.client_header) if self.client_header else None
+        client = client.split(',')[0].strip() if client else (request.scope.get('client') or ('unknown',))[0]
+
+        wait = self.rate_limits.check(client, pattern)
+        if wait:
+            return too_many_requests(wait, 'Rate limit exceeded'), None
+        acquired, slot = self.rate_limits.acquire(pattern)
+        if not acquired:
+            return too_many_requests(self.rate_limits.retry_after, 'Too many concurrent requests for this endpoint'), None
+        return None, slot
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.on_shutdown is not None:
+                    await self.on_shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,133 @@
+"""Concurrent readers against the sync (gunicorn) and async (uvicorn) servers.
+
+Starts each server on the same database with the same number of worker
+processes, then runs N concurrent clients for a fixed time. Every client
+loops over the read paths, one connection per request, and the run reports
+throughput, latency percentiles and failed requests (errors, timeouts and
+refused connections) per server and concurrency level.
+
+Usage:
+    python -m benchmarks.async_readers --db benchmarks/data/kpi_200000.db --workers 2 --concurrency 100,500,1000
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ['/api/departments/1', '/api/kpi/1/data?limit=100', '/api/kpi/2/data?limit=20&period=hourly']
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def server_command(server, port, workers):
+    if server == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py']
+    return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(workers), '--log-level', 'warning', '--no-access-log', '--backlog', '4096']
+
+def start_server(server, db_path, workers, tmp):
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f'sqlite:///{os.path.abspath(db_path)}',
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        WEB_CONCURRENCY=str(workers),
+        PROMETHEUS_MULTIPROC_DIR=tmp
+    )
+    process = subprocess.Popen(server_command(server, port, workers), cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    started = time.perf_counter()
+    while True:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}{PATHS[0]}', timeout=5).read()
+            return process, port
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError(f'{server} exited with status {process.returncode}')
+            if time.perf_counter() - started > 120:
+                process.terminate()
+                raise RuntimeError(f'{server} did not start within 120s')
+            time.sleep(0.1)
+
+async def get(port, path, timeout):
+    """Status of one GET on a fresh connection"""
+    async def fetch():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode())
+            await writer.drain()
+            response = await reader.read()
+            return int(response.split(b' ', 2)[1])
+        finally:
+            writer.close()
+    return await asyncio.wait_for(fetch(), timeout)
+
+async def load(port, concurrency, duration, timeout):
+    latencies = []
+    failures = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(offset):
+        nonlocal failures
+        i = offset
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status = await get(port, PATHS[i % len(PATHS)], timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                failures += 1
+            i += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float('nan')
+    return {
+        'requests_per_s': len(latencies) / elapsed,
+        'p50_ms': percentile(0.5),
+        'p99_ms': percentile(0.99),
+        'failed': failures
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', required=True, help='SQLite database to serve (see benchmarks.endpoints)')
+    parser.add_argument('--workers', type=int, default=2, help='Worker processes per server')
+    parser.add_argument('--concurrency', default='100,500,1000', help='Comma-separated client counts')
+    parser.add_argument('--duration', type=float, default=15, help='Seconds per run')
+    parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request counts as failed')
+    parser.add_argument('--servers', default='gunicorn,uvicorn')
+    args = parser.parse_args()
+
+    print(f"{'server':<9} {'clients':>8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'failed':>7}")
+    for server in args.servers.split(','):
+        tmp = tempfile.mkdtemp()
+        process, port = start_server(server, args.db, args.workers, tmp)
+        try:
+            for concurrency in map(int, args.concurrency.split(',')):
+                result = asyncio.run(load(port, concurrency, args.duration, args.timeout))
+                print(f"{server:<9} {concurrency:>8} {result['requests_per_s']:>9.1f} {result['p50_ms']:>9.1f} "
+                      f"{result['p99_ms']:>9.1f} {result['failed']:>7}")
+        finally:
+            process.terminate()
+            process.wait()
+            shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
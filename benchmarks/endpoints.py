@@ -0,0 +1,322 @@
+"""Endpoint latency, memory and query counts at production data scale.
+
+Seeds a SQLite database with a given number of kpi_data rows (cached under
+benchmarks/data/ and reused), then times each endpoint through the Flask
+test client. Every scenario runs in its own process so its peak RSS is its
+own.
+
+Usage:
+    python -m benchmarks.endpoints run --rows 1000000 --output baseline.json
+    python -m benchmarks.endpoints run --rows 1000000 --output current.json
+    python -m benchmarks.endpoints compare baseline.json current.json --threshold 0.2
+
+`compare` exits with status 1 when any scenario regressed past the
+threshold, so it can gate CI.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, 'benchmarks', 'data')
+
+DEPARTMENTS = 10
+KPIS = 200
+SEED_BATCH = 50000
+
+# name: (default repeat, description)
+SCENARIOS = {
+    'dashboard_data': (20, 'GET /api/dashboard-data'),
+    'kpi_data': (50, 'GET /api/kpi/<id>/data'),
+    'kpi_data_range': (50, 'GET /api/kpi/<id>/data?start=&end='),
+    'export_csv': (3, 'GET /export/csv'),
+    'export_powerbi': (3, 'GET /export/powerbi-data'),
+    'bulk_ingest': (20, 'POST /api/kpi/data/bulk (1000 points)')
+}
+
+def dataset_path(rows, data_dir=DATA_DIR):
+    return os.path.join(data_dir, f'kpi_{rows}.db')
+
+def seed(path, rows, seed_value=42):
+    """Create the schema and `rows` data points spread over two years"""
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(path)}'
+    from app import app, db
+    from models import Department, KPI, KPIData
+
+    with app.app_context():
+        db.create_all()
+        engine = db.engine
+
+    rng = random.Random(seed_value)
+    end = datetime(2024, 12, 31)
+    span = timedelta(days=730).total_seconds()
+    step = span / max(rows, 1)
+
+    with engine.begin() as connection:
+        connection.execute(Department.__table__.insert(), [
+            {'name': f'Department {d}', 'description': ''} for d in range(DEPARTMENTS)
+        ])
+        connection.execute(KPI.__table__.insert(), [
+            {
+                'name': f'KPI {k}', 'department_id': k % DEPARTMENTS + 1, 'unit': '%',
+                'target_type': 'lower_better' if k % 4 == 0 else 'higher_better'
+            }
+            for k in range(KPIS)
+        ])
+
+    start = end - timedelta(days=730)
+    for offset in range(0, rows, SEED_BATCH):
+        batch = [
+            {
+                'kpi_id': rng.randint(1, KPIS),
+                'value': rng.uniform(50, 150),
+                'target': 100.0,
+                'timestamp': start + timedelta(seconds=i * step),
+                'period': 'daily',
+                'notes': '',
+                'created_by': 'benchmark'
+            }
+            for i in range(offset, min(offset + SEED_BATCH, rows))
+        ]
+        with engine.begin() as connection:
+            connection.execute(KPIData.__table__.insert(), batch)
+        print(f'\rSeeded {offset + len(batch):,}/{rows:,} rows', end='', file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+
+def ensure_dataset(rows, data_dir=DATA_DIR):
+    """Path of a database holding exactly `rows` data points, seeding it if needed"""
+    path = dataset_path(rows, data_dir)
+    if os.path.exists(path):
+        try:
+            with sqlite3.connect(path) as connection:
+                if connection.execute('SELECT COUNT(*) FROM kpi_data').fetchone()[0] == rows:
+                    return path
+        except sqlite3.Error:
+            pass
+        os.remove(path)
+
+    os.makedirs(data_dir, exist_ok=True)
+    # Seed in a child process: the app binds its database at import time
+    subprocess.run([sys.executable, '-m', 'benchmarks.endpoints', 'seed', '--rows', str(rows),
+                    '--data-dir', data_dir], cwd=ROOT, check=True)
+    return path
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def run_scenario(name, path, repeat):
+    """Time one scenario in this process; returns its result dict"""
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(path)}'
+    from sqlalchemy import event, func
+    from app import app, db
+    from models import KPIData
+
+    client = app.test_client()
+    queries = [0]
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'after_cursor_execute', lambda *args: queries.__setitem__(0, queries[0] + 1))
+        max_id = db.session.query(func.max(KPIData.id)).scalar() or 0
+
+    rng = random.Random(1)
+
+    def request(i):
+        kpi_id = rng.randint(1, KPIS)
+        if name == 'dashboard_data':
+            return client.get('/api/dashboard-data')
+        if name == 'kpi_data':
+            return client.get(f'/api/kpi/{kpi_id}/data?limit=100')
+        if name == 'kpi_data_range':
+            return client.get(f'/api/kpi/{kpi_id}/data?limit=500&start=2024-06-01&end=2024-07-01')
+        if name == 'export_csv':
+            return client.get('/export/csv')
+        if name == 'export_powerbi':
+            return client.get('/export/powerbi-data')
+        if name == 'bulk_ingest':
+            return client.post('/api/kpi/data/bulk', json=[
+                {'kpi_id': rng.randint(1, KPIS), 'value': rng.uniform(50, 150), 'target': 100}
+                for _ in range(1000)
+            ])
+        raise ValueError(f'Unknown scenario: {name}')
+
+    request(-1).get_data()
+
+    durations = []
+    query_counts = []
+    statuses = set()
+    # Like timeit, collect between requests rather than during them, so a
+    # collection's pause isn't charged to whichever request triggered it.
+    gc.disable()
+    for i in range(repeat):
+        gc.collect()
+        queries[0] = 0
+        started = time.perf_counter()
+        response = request(i)
+        response.get_data()
+        durations.append(time.perf_counter() - started)
+        query_counts.append(queries[0])
+        statuses.add(response.status_code)
+    gc.enable()
+
+    if name == 'bulk_ingest':
+        with app.app_context():
+            KPIData.query.filter(KPIData.id > max_id).delete(synchronize_session=False)
+            db.session.commit()
+
+    return {
+        'repeat': repeat,
+        'statuses': sorted(statuses),
+        'p50_ms': percentile(durations, 0.50) * 1000,
+        'p95_ms': percentile(durations, 0.95) * 1000,
+        'p99_ms': percentile(durations, 0.99) * 1000,
+        'mean_ms': statistics.mean(durations) * 1000,
+        'queries_per_request': statistics.median(query_counts),
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(rows, scenarios, output, repeat=None, data_dir=DATA_DIR):
+    path = ensure_dataset(rows, data_dir)
+    results = {}
+
+    print(f"{'scenario':<16} {'status':>8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'queries':>8} {'RSS MB':>8}")
+    for name in scenarios:
+        count = repeat or SCENARIOS[name][0]
+        completed = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.endpoints', 'scenario', name, '--db', path, '--repeat', str(count)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        result = results[name] = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(f"{name:<16} {','.join(map(str, result['statuses'])):>8} {result['p50_ms']:>10.1f} "
+              f"{result['p95_ms']:>10.1f} {result['p99_ms']:>10.1f} {result['queries_per_request']:>8g} "
+              f"{result['peak_rss_mb']:>8.0f}")
+        failed = [status for status in result['statuses'] if not 200 <= status < 300]
+        if failed:
+            raise SystemExit(f"{name}: {','.join(map(str, failed))} responses, not timing an error path")
+
+    report = {
+        'meta': {
+            'rows': rows,
+            'revision': git_revision(),
+            'created_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.machine()
+        },
+        'scenarios': results
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+def compare(baseline, current, threshold=0.2, min_delta_ms=5.0, rss_threshold=None):
+    """Regressions of `current` against `baseline`, as printable strings.
+
+    Latency regresses when it grows by more than `threshold` (a fraction)
+    and by at least `min_delta_ms`, which keeps millisecond noise from
+    failing a run. Peak RSS uses `rss_threshold` (default: `threshold`).
+    Any increase in queries per request is a regression.
+    """
+    rss_threshold = threshold if rss_threshold is None else rss_threshold
+    regressions = []
+
+    if baseline['meta']['rows'] != current['meta']['rows']:
+        regressions.append(f"dataset size differs: {baseline['meta']['rows']} vs {current['meta']['rows']} rows")
+
+    for name, base in baseline['scenarios'].items():
+        result = current['scenarios'].get(name)
+        if result is None:
+            continue
+
+        for metric in ('p50_ms', 'p95_ms'):
+            if result[metric] > base[metric] * (1 + threshold) and result[metric] - base[metric] >= min_delta_ms:
+                regressions.append(f'{name} {metric}: {base[metric]:.1f} -> {result[metric]:.1f} '
+                                   f'(+{(result[metric] / base[metric] - 1) * 100:.0f}%)')
+
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + rss_threshold):
+            regressions.append(f"{name} peak_rss_mb: {base['peak_rss_mb']:.0f} -> {result['peak_rss_mb']:.0f}")
+
+        if result['queries_per_request'] > base['queries_per_request']:
+            regressions.append(f"{name} queries_per_request: {base['queries_per_request']:g} -> "
+                               f"{result['queries_per_request']:g}")
+
+        if result['statuses'] != base['statuses']:
+            regressions.append(f"{name} statuses: {base['statuses']} -> {result['statuses']}")
+
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Seed (if needed) and time the endpoints')
+    run_parser.add_argument('--rows', type=int, default=1000000, help='kpi_data rows: e.g. 1000000, 10000000, 50000000')
+    run_parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated scenarios')
+    run_parser.add_argument('--repeat', type=int, help='Requests per scenario (default: per scenario)')
+    run_parser.add_argument('--output', help='Write the results as JSON here')
+    run_parser.add_argument('--data-dir', default=DATA_DIR, help='Where seeded databases are cached')
+
+    compare_parser = commands.add_parser('compare', help='Fail if current regressed against baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.2, help='Allowed latency growth (0.2 = 20%%)')
+    compare_parser.add_argument('--min-delta-ms', type=float, default=5.0, help='Ignore latency changes below this')
+    compare_parser.add_argument('--rss-threshold', type=float, help='Allowed peak RSS growth (default: --threshold)')
+
+    seed_parser = commands.add_parser('seed', help=argparse.SUPPRESS)
+    seed_parser.add_argument('--rows', type=int, required=True)
+    seed_parser.add_argument('--data-dir', default=DATA_DIR)
+
+    scenario_parser = commands.add_parser('scenario', help=argparse.SUPPRESS)
+    scenario_parser.add_argument('name', choices=sorted(SCENARIOS))
+    scenario_parser.add_argument('--db', required=True)
+    scenario_parser.add_argument('--repeat', type=int, required=True)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+        run(args.rows, scenarios, args.output, args.repeat, args.data_dir)
+    elif args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold, args.min_delta_ms, args.rss_threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            return 1
+        print('No regressions')
+    elif args.command == 'seed':
+        seed(dataset_path(args.rows, args.data_dir), args.rows)
+    elif args.command == 'scenario':
+        print(json.dumps(run_scenario(args.name, args.db, args.repeat)))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
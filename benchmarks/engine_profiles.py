@@ -0,0 +1,118 @@
+"""Ingest and export throughput for each engine profile.
+
+Runs the same workload against a fresh database per profile:
+
+- single ingest: one INSERT + COMMIT per point, like POST /api/kpi/<id>/data
+- bulk ingest: executemany batches of 1000, like POST /api/kpi/data/bulk
+- export scan: the joined read behind /export/csv
+
+Usage:
+    python -m benchmarks.engine_profiles                      # SQLite temp files
+    python -m benchmarks.engine_profiles --url "mssql+pyodbc://..."
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, select
+
+from database.engines import ENGINE_PROFILES, configure_engine, engine_options, engine_profile
+from models import Department, KPI, KPIData
+
+def build_engine(url, profile):
+    engine = create_engine(url, **engine_options(url, profile))
+    configure_engine(engine, pragmas=engine_profile(url, profile).get('pragmas'))
+    return engine
+
+def create_schema(engine, kpi_count=20):
+    tables = [Department.__table__, KPI.__table__, KPIData.__table__]
+    for table in reversed(tables):
+        table.drop(engine, checkfirst=True)
+    for table in tables:
+        table.create(engine)
+
+    with engine.begin() as connection:
+        connection.execute(insert(Department.__table__), [{'name': 'Benchmark'}])
+        connection.execute(insert(KPI.__table__), [
+            {'name': f'KPI {i}', 'department_id': 1, 'target_type': 'higher_better'}
+            for i in range(kpi_count)
+        ])
+    return list(range(1, kpi_count + 1))
+
+def make_points(kpi_ids, count):
+    base = datetime.utcnow() - timedelta(days=365)
+    return [
+        {
+            'kpi_id': random.choice(kpi_ids),
+            'value': random.uniform(50, 150),
+            'target': 100.0,
+            'timestamp': base + timedelta(minutes=i),
+            'period': 'daily',
+            'notes': '',
+            'created_by': 'benchmark'
+        }
+        for i in range(count)
+    ]
+
+def bench_single_ingest(engine, kpi_ids, count):
+    points = make_points(kpi_ids, count)
+    started = time.perf_counter()
+    for point in points:
+        with engine.begin() as connection:
+            connection.execute(insert(KPIData.__table__), point)
+    return count / (time.perf_counter() - started)
+
+def bench_bulk_ingest(engine, kpi_ids, count, batch_size=1000):
+    points = make_points(kpi_ids, count)
+    started = time.perf_counter()
+    for i in range(0, count, batch_size):
+        with engine.begin() as connection:
+            connection.execute(insert(KPIData.__table__), points[i:i + batch_size])
+    return count / (time.perf_counter() - started)
+
+def bench_export(engine):
+    query = select(
+        KPIData.id, KPIData.value, KPIData.target, KPIData.timestamp,
+        KPI.name, KPI.unit, Department.name
+    ).select_from(KPIData)\
+     .join(KPI, KPIData.kpi_id == KPI.id)\
+     .join(Department, KPI.department_id == Department.id)
+
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        rows = len(connection.execute(query).fetchall())
+    return rows / (time.perf_counter() - started)
+
+def run(url, profile, single, bulk):
+    engine = build_engine(url, profile)
+    try:
+        kpi_ids = create_schema(engine)
+        return {
+            'single_ingest': bench_single_ingest(engine, kpi_ids, single),
+            'bulk_ingest': bench_bulk_ingest(engine, kpi_ids, bulk),
+            'export_scan': bench_export(engine)
+        }
+    finally:
+        engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='Database URL (default: a temporary SQLite file per profile)')
+    parser.add_argument('--single', type=int, default=2000, help='Points ingested one commit at a time')
+    parser.add_argument('--bulk', type=int, default=200000, help='Points ingested in batches')
+    args = parser.parse_args()
+
+    random.seed(42)
+    print(f"{'profile':<12} {'single rows/s':>14} {'bulk rows/s':>12} {'export rows/s':>14}")
+    for profile in ENGINE_PROFILES:
+        with tempfile.TemporaryDirectory() as tmp:
+            url = args.url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            result = run(url, profile, args.single, args.bulk)
+        print(f"{profile:<12} {result['single_ingest']:>14,.0f} {result['bulk_ingest']:>12,.0f} "
+              f"{result['export_scan']:>14,.0f}")
+
+if __name__ == '__main__':
+    main()
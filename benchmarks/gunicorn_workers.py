@@ -0,0 +1,121 @@
+"""Startup time and memory per worker under gunicorn, with and without preload.
+
+Starts gunicorn with gunicorn.conf.py for each worker class and preload
+setting, waits until every worker has loaded the app, sends some requests,
+then reads each worker's memory from /proc (Linux only):
+
+- RSS: resident memory, counting pages shared with the master
+- PSS: shared pages split evenly between the processes sharing them
+- USS: pages only this worker holds; what one more worker costs
+
+Usage:
+    python -m benchmarks.gunicorn_workers --db benchmarks/data/kpi_200000.db --workers 4
+"""
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ['/', '/api/departments/', '/api/kpi/1/data?limit=100', '/kpi-form']
+
+# Loads the real settings, then marks each worker ready once its app is loaded
+READY_HOOK = '''
+exec(open({config!r}).read())
+
+def post_worker_init(worker):
+    open(os.path.join({ready_dir!r}, str(worker.pid)), 'w').close()
+'''
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def memory(pid):
+    """(RSS, PSS, USS) of a process in MB"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return fields['Rss'], fields['Pss'], fields['Private_Clean'] + fields['Private_Dirty']
+
+def measure(db_path, workers, worker_class, preload, requests_per_path):
+    tmp = tempfile.mkdtemp()
+    ready_dir = os.path.join(tmp, 'ready')
+    os.makedirs(ready_dir)
+    config = os.path.join(tmp, 'gunicorn.conf.py')
+    with open(config, 'w') as f:
+        f.write(READY_HOOK.format(config=os.path.join(ROOT, 'gunicorn.conf.py'), ready_dir=ready_dir))
+
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f'sqlite:///{os.path.abspath(db_path)}',
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        WEB_CONCURRENCY=str(workers),
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_PRELOAD='true' if preload else 'false',
+        PROMETHEUS_MULTIPROC_DIR=os.path.join(tmp, 'metrics')
+    )
+    os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'])
+
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', config], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while len(os.listdir(ready_dir)) < workers:
+            if server.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with status {server.returncode}')
+            if time.perf_counter() - started > 120:
+                raise RuntimeError('workers did not start within 120s')
+            time.sleep(0.01)
+        startup = time.perf_counter() - started
+
+        for path in PATHS:
+            for _ in range(requests_per_path):
+                urllib.request.urlopen(f'http://127.0.0.1:{port}{path}').read()
+
+        worker_memory = [memory(int(pid)) for pid in os.listdir(ready_dir)]
+        master = memory(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    count = len(worker_memory)
+    return {
+        'startup_s': startup,
+        'master_rss_mb': master[0],
+        'worker_rss_mb': sum(m[0] for m in worker_memory) / count,
+        'worker_pss_mb': sum(m[1] for m in worker_memory) / count,
+        'worker_uss_mb': sum(m[2] for m in worker_memory) / count,
+        'total_pss_mb': master[1] + sum(m[1] for m in worker_memory)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', required=True, help='SQLite database to serve (see benchmarks.endpoints)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--worker-classes', default='sync,gthread', help='Comma-separated (gevent needs gevent)')
+    parser.add_argument('--requests', type=int, default=25, help='Requests per warm-up path before measuring')
+    args = parser.parse_args()
+
+    print(f"{'worker class':<13} {'preload':<8} {'startup s':>10} {'master RSS':>11} {'worker RSS':>11} "
+          f"{'worker PSS':>11} {'worker USS':>11} {'total PSS':>10}")
+    for worker_class in args.worker_classes.split(','):
+        for preload in (False, True):
+            result = measure(args.db, args.workers, worker_class, preload, args.requests)
+            print(f"{worker_class:<13} {'yes' if preload else 'no':<8} {result['startup_s']:>10.2f} "
+                  f"{result['master_rss_mb']:>11.1f} {result['worker_rss_mb']:>11.1f} "
+                  f"{result['worker_pss_mb']:>11.1f} {result['worker_uss_mb']:>11.1f} {result['total_pss_mb']:>10.1f}")
+
+if __name__ == '__main__':
+    main()
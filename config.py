@@ -8,12 +8,96 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///kpi_monitoring.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Backend tuning applied to every engine, see database/engines.py
+    DATABASE_ENGINE_PROFILE = os.environ.get('DATABASE_ENGINE_PROFILE', 'performance')
+
+    # Optional reader engine for heavy read endpoints (a replica, or the same
+    # SQLite file opened read-only in WAL mode)
+    DATABASE_READ_URL = os.environ.get('DATABASE_READ_URL')
+    READER_POOL_SIZE = int(os.environ.get('READER_POOL_SIZE', 5))
+    READER_STATEMENT_TIMEOUT = float(os.environ.get('READER_STATEMENT_TIMEOUT', 30))
+    # Async read API (asgi.py): connections held by its engine and rows per
+    # streamed export chunk
+    ASYNC_POOL_SIZE = int(os.environ.get('ASYNC_POOL_SIZE', 20))
+    ASYNC_EXPORT_BATCH_SIZE = int(os.environ.get('ASYNC_EXPORT_BATCH_SIZE', 1000))
+    SQLALCHEMY_BINDS = {
+        'reader': {'url': DATABASE_READ_URL, 'pool_size': READER_POOL_SIZE}
+    } if DATABASE_READ_URL else {}
+
     POWERBI_CLIENT_ID = os.environ.get('POWERBI_CLIENT_ID')
     POWERBI_CLIENT_SECRET = os.environ.get('POWERBI_CLIENT_SECRET')
     POWERBI_TENANT_ID = os.environ.get('POWERBI_TENANT_ID')
     POWERBI_WORKSPACE_ID = os.environ.get('POWERBI_WORKSPACE_ID')
+    POWERBI_DATASET_ID = os.environ.get('POWERBI_DATASET_ID')
+    POWERBI_SYNC_BATCH_SIZE = int(os.environ.get('POWERBI_SYNC_BATCH_SIZE', 50000))
+    POWERBI_API_URL = os.environ.get('POWERBI_API_URL', 'https://api.powerbi.com/v1.0/myorg')
+    POWERBI_TOKEN_CACHE_PATH = os.environ.get('POWERBI_TOKEN_CACHE_PATH')
+    POWERBI_TOKEN_REFRESH_MARGIN = int(os.environ.get('POWERBI_TOKEN_REFRESH_MARGIN', 300))
+    # Power BI push dataset limits: 10,000 rows per request, 120 requests per minute
+    POWERBI_MAX_ROWS_PER_REQUEST = 10000
+    POWERBI_REQUESTS_PER_MINUTE = 120
+    POWERBI_PUSH_WORKERS = int(os.environ.get('POWERBI_PUSH_WORKERS', 4))
+
+    KPI_DATA_RETENTION_DAYS = int(os.environ['KPI_DATA_RETENTION_DAYS']) if os.environ.get('KPI_DATA_RETENTION_DAYS') else None
+    KPI_DATA_RETENTION_BATCH_SIZE = 1000
+    KPI_DATA_ARCHIVE_DIR = os.environ.get('KPI_DATA_ARCHIVE_DIR')
+    KPI_DAILY_ROLLUP_DAYS = int(os.environ.get('KPI_DAILY_ROLLUP_DAYS', 2))
+
+    KPI_DATA_PARTITIONING = os.environ.get('KPI_DATA_PARTITIONING', '').lower() in ('1', 'true', 'monthly')
+    KPI_DATA_PARTITION_DIR = os.environ.get('KPI_DATA_PARTITION_DIR')
+
+    WORKER_PROCESSES = int(os.environ.get('WORKER_PROCESSES', 2))
+    WORKER_POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', 5))
 
-    API_RATE_LIMIT = '1000 per hour'
+    # Token buckets per client (API_RATE_LIMIT) and per client and route
+    # (RATE_LIMITS), plus caps on concurrent requests per route, shared by
+    # every worker through the RATE_LIMIT_STORAGE file (see web/ratelimit.py)
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    RATE_LIMIT_STORAGE = os.environ.get('RATE_LIMIT_STORAGE')
+    # Header naming the client behind a proxy, e.g. X-Forwarded-For
+    RATE_LIMIT_CLIENT_HEADER = os.environ.get('RATE_LIMIT_CLIENT_HEADER')
+    API_RATE_LIMIT = os.environ.get('API_RATE_LIMIT', '1000 per hour')
+    RATE_LIMITS = {
+        '/api/kpi/data/bulk': '60 per minute',
+        '/export/csv': '10 per minute',
+        '/export/powerbi-data': '10 per minute'
+    }
+    CONCURRENCY_LIMITS = {
+        '/api/catalog': 1,
+        '/api/kpi/data/bulk': 4,
+        '/export/csv': 2,
+        '/export/powerbi-data': 2
+    }
+
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    # Statements slower than this are logged to 'kpi.slow_query'; 0 disables
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 500))
+
+    # Brotli/gzip responses per Accept-Encoding, see web/compression.py
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_STREAM_MIN_SIZE = int(os.environ.get('COMPRESSION_STREAM_MIN_SIZE', 1024 * 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
 
     CACHE_TYPE = 'simple'
-    CACHE_DEFAULT_TIMEOUT = 300
\ No newline at end of file
+    CACHE_DEFAULT_TIMEOUT = 300
+
+    # Rendered page fragments, cached per worker until a write changes the
+    # tables they show (see web/fragments.py) or CACHE_DEFAULT_TIMEOUT passes.
+    # Point CLI and `flask worker` processes at the same versions file so
+    # their writes invalidate the web workers' fragments too.
+    FRAGMENT_CACHE_ENABLED = os.environ.get('FRAGMENT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 256))
+    FRAGMENT_CACHE_VERSIONS = os.environ.get('FRAGMENT_CACHE_VERSIONS')
+
+    # Serve the unfiltered /export/csv from files kept up to date on disk
+    # (see web/snapshots.py); the directory defaults to instance/export_snapshot
+    EXPORT_SNAPSHOT_ENABLED = os.environ.get('EXPORT_SNAPSHOT_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    EXPORT_SNAPSHOT_DIR = os.environ.get('EXPORT_SNAPSHOT_DIR')
+    EXPORT_SNAPSHOT_SEGMENT_ROWS = int(os.environ.get('EXPORT_SNAPSHOT_SEGMENT_ROWS', 100000))
+
+    # Memory-mapped per-KPI history columns for the analytics endpoints
+    # (see database/history.py); the directory defaults to instance/history
+    HISTORY_STORE_ENABLED = os.environ.get('HISTORY_STORE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    HISTORY_STORE_DIR = os.environ.get('HISTORY_STORE_DIR')
\ No newline at end of file
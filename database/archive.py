@@ -0,0 +1,78 @@
+import gzip
+import json
+import os
+from datetime import datetime
+
+ARCHIVE_FIELDS = ('id', 'kpi_id', 'value', 'target', 'timestamp', 'period', 'notes', 'created_by')
+
+def month_key(timestamp):
+    """Archive partition name for a timestamp, e.g. '2024-03'"""
+    return timestamp.strftime('%Y-%m')
+
+def write_archive(archive_dir, rows):
+    """Write raw kpi_data rows to gzip NDJSON files, one per month.
+
+    Files are named after the id range they hold, so re-archiving the same
+    batch after a failed delete overwrites the file instead of duplicating it.
+    Returns the list of files written.
+    """
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(month_key(row['timestamp']), []).append(row)
+
+    written = []
+    for month, month_rows in sorted(by_month.items()):
+        month_dir = os.path.join(archive_dir, month)
+        os.makedirs(month_dir, exist_ok=True)
+
+        ids = [row['id'] for row in month_rows]
+        path = os.path.join(month_dir, f'kpi_data-{min(ids)}-{max(ids)}.ndjson.gz')
+        tmp_path = path + '.tmp'
+
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for row in month_rows:
+                record = {field: row[field] for field in ARCHIVE_FIELDS}
+                record['timestamp'] = row['timestamp'].isoformat()
+                f.write(json.dumps(record))
+                f.write('\n')
+
+        os.replace(tmp_path, path)
+        written.append(path)
+
+    return written
+
+def archived_months(archive_dir):
+    """Months present in the archive, oldest first"""
+    if not archive_dir or not os.path.isdir(archive_dir):
+        return []
+    return sorted(name for name in os.listdir(archive_dir) if len(name) == 7 and name[4] == '-')
+
+def iter_archived_rows(archive_dir, start=None, end=None):
+    """Yield archived rows with start <= timestamp < end.
+
+    Only the month partitions overlapping the range are opened.
+    """
+    start_month = month_key(start) if start else None
+    end_month = month_key(end) if end else None
+
+    for month in archived_months(archive_dir):
+        if start_month and month < start_month:
+            continue
+        if end_month and month > end_month:
+            continue
+
+        month_dir = os.path.join(archive_dir, month)
+        for name in sorted(os.listdir(month_dir)):
+            if not name.endswith('.ndjson.gz'):
+                continue
+
+            with gzip.open(os.path.join(month_dir, name), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    row = json.loads(line)
+                    row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+
+                    if start and row['timestamp'] < start:
+                        continue
+                    if end and row['timestamp'] >= end:
+                        continue
+                    yield row
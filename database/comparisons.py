@@ -0,0 +1,184 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Date, Float, Integer, MetaData, Table, and_, cast, extract, func, insert, literal, \
+    select, true, union_all
+
+from .database import db
+from .partitions import partitioning_enabled, query_partitions
+from .rollup import as_date, day_expression
+from models import KPI, KPIData, KPIDataDaily
+
+# Periods per year for each grain
+GRAINS = {'month': 12, 'quarter': 4, 'year': 1}
+AGGREGATES = ('avg', 'sum', 'min', 'max', 'count')
+# Keeps the period series within SQL Server's default recursion limit (100)
+MAX_PERIODS = 60
+
+def period_index(grain, timestamp):
+    """Periods since year 0; consecutive periods differ by one"""
+    per_year = GRAINS[grain]
+    return timestamp.year * per_year + (timestamp.month - 1) // (12 // per_year)
+
+def period_expression(grain, column):
+    """SQL for period_index() of a date or timestamp column"""
+    per_year = GRAINS[grain]
+    return extract('year', column) * per_year + (extract('month', column) - 1) // (12 // per_year)
+
+def period_start(grain, index):
+    per_year = GRAINS[grain]
+    return datetime(index // per_year, index % per_year * (12 // per_year) + 1, 1)
+
+def period_label(grain, index):
+    start = period_start(grain, index)
+    if grain == 'month':
+        return start.strftime('%Y-%m')
+    if grain == 'quarter':
+        return f'{start.year}-Q{(start.month - 1) // 3 + 1}'
+    return str(start.year)
+
+# Raw day totals of kpi_data and its partitions, staged on the connection:
+# one statement cannot attach every partition a comparison spans
+staged_days = Table(
+    'compare_raw_days', MetaData(),
+    Column('kpi_id', Integer),
+    Column('day', Date),
+    Column('count', Integer),
+    Column('value_sum', Float),
+    Column('min_value', Float),
+    Column('max_value', Float),
+    prefixes=['TEMPORARY']
+)
+
+def change(value, base):
+    """Absolute and percent change of `value` over `base`, in SQL"""
+    return value - base, (value - base) * 100.0 / func.nullif(func.abs(base), 0)
+
+def raw_day_totals(entity, kpi_ids, start, stop):
+    """Per KPI and day totals of the raw points in [start, stop)"""
+    day = day_expression(entity.timestamp)
+    return db.session.query(
+        entity.kpi_id.label('kpi_id'),
+        day.label('day'),
+        func.count().label('count'),
+        func.sum(entity.value).label('value_sum'),
+        func.min(entity.value).label('min_value'),
+        func.max(entity.value).label('max_value')
+    ).filter(entity.kpi_id.in_(kpi_ids), entity.timestamp >= start, entity.timestamp < stop)\
+     .group_by(entity.kpi_id, day)
+
+def stage_raw_days(kpi_ids, start, stop):
+    """Stage the raw day totals of kpi_data and every partition in range.
+
+    A day split between kpi_data and a partition (a late point after a
+    roll) is staged twice and folded together by the returned select.
+    """
+    rows = query_partitions(lambda entity: raw_day_totals(entity, kpi_ids, start, stop), start, stop)
+    connection = db.session.connection()
+    staged_days.drop(connection, checkfirst=True)
+    staged_days.create(connection)
+    if rows:
+        connection.execute(insert(staged_days), [{**row._asdict(), 'day': as_date(row.day)} for row in rows])
+    return select(
+        staged_days.c.kpi_id,
+        staged_days.c.day,
+        func.sum(staged_days.c.count).label('count'),
+        func.sum(staged_days.c.value_sum).label('value_sum'),
+        func.min(staged_days.c.min_value).label('min_value'),
+        func.max(staged_days.c.max_value).label('max_value')
+    ).group_by(staged_days.c.kpi_id, staged_days.c.day)
+
+def period_comparisons(kpi_ids, grain='month', periods=12, aggregate='avg', end=None):
+    """Per KPI and period values, each compared with the previous period and
+    the same period a year earlier, in one statement.
+
+    A day is read from its raw points while any remain in kpi_data or its
+    partitions, and otherwise from its kpi_data_daily summary (days
+    compacted by retention). With partitioning on, the raw days are staged
+    in a temporary table first. Days are grouped into periods, the periods
+    are laid over a gapless series so that LAG counts periods rather than
+    rows, and the comparisons are two LAG windows over that series. The
+    last period is the one holding `end` (default now).
+    """
+    per_year = GRAINS[grain]
+    last = period_index(grain, end or datetime.utcnow())
+    first = last - periods + 1
+    # The year before the first period feeds its year-over-year comparison
+    scan_from = first - per_year
+    start, stop = period_start(grain, scan_from), period_start(grain, last + 1)
+
+    staged = partitioning_enabled()
+    if staged:
+        raw_days = stage_raw_days(kpi_ids, start, stop).cte('raw_days')
+    else:
+        raw_days = raw_day_totals(KPIData, kpi_ids, start, stop).cte('raw_days')
+
+    compacted_days = select(
+        KPIDataDaily.kpi_id, KPIDataDaily.day, KPIDataDaily.count, KPIDataDaily.value_sum,
+        KPIDataDaily.min_value, KPIDataDaily.max_value
+    ).outerjoin(raw_days, and_(raw_days.c.kpi_id == KPIDataDaily.kpi_id, raw_days.c.day == KPIDataDaily.day))\
+     .where(KPIDataDaily.kpi_id.in_(kpi_ids), KPIDataDaily.day >= start.date(), KPIDataDaily.day < stop.date(),
+            raw_days.c.kpi_id.is_(None))
+
+    days = union_all(select(raw_days), compacted_days).subquery('days')
+    period = period_expression(grain, days.c.day)
+    totals = select(
+        days.c.kpi_id,
+        period.label('period'),
+        func.sum(days.c.count).label('count'),
+        func.sum(days.c.value_sum).label('value_sum'),
+        func.min(days.c.min_value).label('min_value'),
+        func.max(days.c.max_value).label('max_value')
+    ).group_by(days.c.kpi_id, period).subquery('totals')
+
+    series = select(cast(literal(scan_from), Integer).label('period')).cte('series', recursive=True)
+    series = series.union_all(select(cast(series.c.period + 1, Integer)).where(series.c.period < last))
+
+    value = {
+        'avg': totals.c.value_sum / func.nullif(totals.c.count, 0),
+        'sum': totals.c.value_sum,
+        'min': totals.c.min_value,
+        'max': totals.c.max_value,
+        'count': totals.c.count
+    }[aggregate]
+    window = {'partition_by': KPI.id, 'order_by': series.c.period}
+    values = select(
+        KPI.id.label('kpi_id'),
+        KPI.name.label('kpi_name'),
+        KPI.unit.label('unit'),
+        series.c.period,
+        func.coalesce(totals.c.count, 0).label('count'),
+        value.label('value'),
+        func.lag(value, 1).over(**window).label('previous_value'),
+        func.lag(value, per_year).over(**window).label('year_ago_value')
+    ).select_from(KPI)\
+     .join(series, true())\
+     .outerjoin(totals, and_(totals.c.kpi_id == KPI.id, totals.c.period == series.c.period))\
+     .where(KPI.id.in_(kpi_ids))\
+     .subquery('compared_values')
+
+    period_change, period_percent = change(values.c.value, values.c.previous_value)
+    year_change, year_percent = change(values.c.value, values.c.year_ago_value)
+    query = select(
+        values,
+        period_change.label('change'),
+        period_percent.label('change_percent'),
+        year_change.label('year_over_year_change'),
+        year_percent.label('year_over_year_change_percent')
+    ).where(values.c.period >= first)\
+     .order_by(values.c.kpi_name, values.c.kpi_id, values.c.period)
+
+    try:
+        rows = db.session.execute(query).all()
+    finally:
+        if staged:
+            staged_days.drop(db.session.connection())
+
+    comparisons = {}
+    for row in rows:
+        fields = row._asdict()
+        kpi = {'kpi_id': fields.pop('kpi_id'), 'kpi_name': fields.pop('kpi_name'), 'unit': fields.pop('unit')}
+        index = fields.pop('period')
+        comparisons.setdefault(kpi['kpi_id'], {**kpi, 'periods': []})['periods'].append(
+            {'period': period_label(grain, index), 'start': period_start(grain, index), **fields}
+        )
+    return list(comparisons.values())
@@ -1,3 +1,33 @@
+from functools import wraps
+
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+
+READER_BIND = 'reader'
+
+class RoutingSession(Session):
+    """Session that sends reads to the reader engine when a view asks for it.
+
+    Flushes always go to the primary, so a view marked with `use_reader`
+    can still write safely.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('use_reader') and not self._flushing:
+            engines = self._db.engines
+            if READER_BIND in engines:
+                return engines[READER_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-db = SQLAlchemy()
\ No newline at end of file
+def use_reader(view):
+    """Run a view's queries on the reader engine, if one is configured"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        db.session.info['use_reader'] = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            db.session.info.pop('use_reader', None)
+    return wrapper
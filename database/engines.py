@@ -0,0 +1,161 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from .database import db, READER_BIND
+
+# Engine settings per profile and backend. 'pragmas' are applied to every new
+# SQLite connection; 'options' are create_engine() arguments, and
+# 'driver_options' more of them for one DBAPI driver only. The numbers
+# behind the 'performance' defaults come from benchmarks/engine_profiles.py.
+ENGINE_PROFILES = {
+    'default': {},
+    'performance': {
+        'sqlite': {
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'mmap_size': 256 * 1024 * 1024,
+                'cache_size': -64 * 1024,
+                'busy_timeout': 5000,
+                'temp_store': 'MEMORY'
+            }
+        },
+        'mssql': {
+            'options': {
+                'pool_size': 10,
+                'max_overflow': 20,
+                'pool_pre_ping': True,
+                'pool_recycle': 1800
+            },
+            # pymssql rejects it
+            'driver_options': {
+                'pyodbc': {'fast_executemany': True}
+            }
+        }
+    }
+}
+
+def engine_profile(uri, profile):
+    """Profile settings for the backend of a database URL"""
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f'Unknown engine profile: {profile}')
+    return ENGINE_PROFILES[profile].get(make_url(uri).get_backend_name(), {})
+
+def engine_options(uri, profile):
+    """create_engine() arguments a profile sets for a database URL"""
+    url = make_url(uri)
+    settings = engine_profile(uri, profile)
+    options = dict(settings.get('options', {}))
+    options.update(settings.get('driver_options', {}).get(url.get_driver_name(), {}))
+    # SQLite in-memory databases run on a StaticPool, which takes no sizing
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        for key in ('pool_size', 'max_overflow', 'pool_recycle'):
+            options.pop(key, None)
+    return options
+
+def configure_engine(engine, pragmas=None, read_only=False, statement_timeout=None, wal=False):
+    """Install the connect-time settings for one engine.
+
+    `statement_timeout` is in seconds. SQLite has no native statement
+    timeout, so a progress handler interrupts statements that run past it.
+    """
+    dialect = engine.dialect.name
+    pragmas = dict(pragmas or {})
+    if wal:
+        pragmas['journal_mode'] = 'WAL'
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        if dialect == 'sqlite':
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+            if read_only:
+                cursor.execute('PRAGMA query_only=ON')
+            cursor.close()
+
+            if statement_timeout:
+                deadline = connection_record.info['statement_deadline'] = [None]
+                dbapi_connection.set_progress_handler(
+                    lambda: int(deadline[0] is not None and time.monotonic() > deadline[0]), 1000
+                )
+        elif dialect == 'mssql':
+            if statement_timeout:
+                dbapi_connection.timeout = int(statement_timeout)
+        elif dialect == 'postgresql':
+            cursor = dbapi_connection.cursor()
+            if statement_timeout:
+                cursor.execute(f'SET statement_timeout = {int(statement_timeout * 1000)}')
+            if read_only:
+                cursor.execute('SET default_transaction_read_only = on')
+            cursor.close()
+
+    if dialect == 'sqlite' and statement_timeout:
+        @event.listens_for(engine, 'before_cursor_execute')
+        def start_deadline(conn, cursor, statement, parameters, context, executemany):
+            deadline = conn.info.get('statement_deadline')
+            if deadline is not None:
+                deadline[0] = time.monotonic() + statement_timeout
+
+        @event.listens_for(engine, 'checkin')
+        def clear_deadline(dbapi_connection, connection_record):
+            deadline = connection_record.info.get('statement_deadline')
+            if deadline is not None:
+                deadline[0] = None
+
+def apply_engine_profile(app):
+    """Merge the configured profile's engine options into the app config.
+
+    Must run before db.init_app(), which creates the engines.
+    """
+    profile = app.config.get('DATABASE_ENGINE_PROFILE', 'default')
+
+    options = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], profile)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    binds = dict(app.config.get('SQLALCHEMY_BINDS', {}))
+    for key, bind in binds.items():
+        bind = {'url': bind} if isinstance(bind, str) else dict(bind)
+        binds[key] = {**engine_options(bind['url'], profile), **bind}
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+def configure_engines(app):
+    """Configure the primary engine and, if bound, the reader engine.
+
+    With a SQLite reader both engines switch the database to WAL, so long
+    export scans on the reader no longer block ingest on the primary.
+    """
+    profile = app.config.get('DATABASE_ENGINE_PROFILE', 'default')
+
+    with app.app_context():
+        primary = db.engines[None]
+        reader = db.engines.get(READER_BIND)
+        wal = reader is not None and reader.dialect.name == 'sqlite'
+
+        configure_engine(
+            primary,
+            pragmas=engine_profile(primary.url, profile).get('pragmas'),
+            wal=wal
+        )
+        if reader is not None:
+            configure_engine(
+                reader,
+                pragmas=engine_profile(reader.url, profile).get('pragmas'),
+                read_only=True,
+                statement_timeout=app.config.get('READER_STATEMENT_TIMEOUT'),
+                wal=wal
+            )
+
+def dispose_engines(app):
+    """Drop pooled connections inherited from a parent process.
+
+    Call in a forked child before it touches the database: the parent's
+    connections are left open for the parent instead of being closed
+    underneath it.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -0,0 +1,455 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+import click
+import numpy as np
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect, select
+
+from .database import RoutingSession, db
+from .partitions import query_partitions
+from models import KPI, KPIData
+
+# Column files of a KPI: epoch microseconds, values and targets (NaN when unset)
+COLUMNS = (('timestamps', np.int64), ('values', np.float64), ('targets', np.float64))
+# Attributes a point's history depends on; changing any of them outdates its KPI
+HISTORY_ATTRIBUTES = ('kpi_id', 'timestamp', 'value', 'target')
+
+history_log = logging.getLogger('kpi.history')
+
+def to_epoch(timestamps):
+    """Epoch microseconds of naive UTC datetimes, as stored in the timestamps column"""
+    return np.array(timestamps, dtype='datetime64[us]').astype(np.int64)
+
+def empty_history():
+    return tuple(np.empty(0, dtype) for _, dtype in COLUMNS)
+
+class HistoryStore:
+    """Each KPI's history as sorted columns in memory-mapped files.
+
+    A KPI has one file per column plus a small header naming the file
+    generation and the number of rows. Readers map `rows` items of each
+    file, read-only, so every worker shares the same pages through the OS
+    page cache, and a time range is two binary searches and a slice.
+
+    Writers append past the rows in the header and then replace the
+    header, so readers never see half an append. A point older than the
+    KPI's newest one rewrites the KPI as a new generation, which keeps
+    the timestamps sorted; readers still mapping the old files keep them.
+
+    A rebuild records the highest point id it read (`through_id`). A
+    point appended later with an id up to it, whose commit the rebuild
+    had already seen, is not stored again.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _header_path(self, kpi_id):
+        return os.path.join(self.directory, f'{kpi_id}.json')
+
+    def _column_path(self, kpi_id, generation, column):
+        return os.path.join(self.directory, f'{kpi_id}.{generation}.{column}')
+
+    def _header(self, kpi_id):
+        try:
+            with open(self._header_path(kpi_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_header(self, kpi_id, header):
+        path = self._header_path(kpi_id)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(header, f)
+        os.replace(path + '.tmp', path)
+
+    def _map(self, kpi_id, header):
+        if not header['rows']:
+            return empty_history()
+        return tuple(
+            np.memmap(self._column_path(kpi_id, header['generation'], column), dtype=dtype, mode='r',
+                      shape=(header['rows'],))
+            for column, dtype in COLUMNS
+        )
+
+    def kpi_ids(self):
+        return sorted(int(name[:-5]) for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def read(self, kpi_id, start=None, end=None):
+        """(timestamps, values, targets) of a KPI in [start, end), without copying.
+
+        The arrays are read-only views of the mapped files. Returns None for
+        a KPI the store does not hold (it has not been compacted yet).
+        """
+        for _ in range(3):
+            header = self._header(kpi_id)
+            if header is None:
+                return None
+            try:
+                columns = self._map(kpi_id, header)
+                break
+            except FileNotFoundError:
+                # Rewritten between reading the header and opening its files
+                continue
+        else:
+            return None
+
+        timestamps = columns[0]
+        first = timestamps.searchsorted(to_epoch(start)) if start else 0
+        last = timestamps.searchsorted(to_epoch(end)) if end else len(timestamps)
+        return tuple(column[first:last] for column in columns)
+
+    def _locked(self, kpi_id):
+        """Hold the KPI's file lock; other workers wait rather than interleave writes"""
+        fd = os.open(os.path.join(self.directory, f'{kpi_id}.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(fd, fcntl.LOCK_EX)
+        return fd
+
+    def _write(self, kpi_id, columns, generation, through_id=None):
+        """Write columns as a new generation and point the header at it"""
+        for (column, dtype), data in zip(COLUMNS, columns):
+            with open(self._column_path(kpi_id, generation, column), 'wb') as f:
+                f.write(np.ascontiguousarray(data, dtype=dtype).tobytes())
+        self._save_header(kpi_id, {'generation': generation, 'rows': len(columns[0]), 'through_id': through_id})
+
+    def _remove_generations(self, kpi_id, keep=None):
+        for name in os.listdir(self.directory):
+            parts = name.split('.')
+            if len(parts) == 3 and parts[0] == str(kpi_id) and parts[1] != str(keep):
+                os.remove(os.path.join(self.directory, name))
+
+    def _replace(self, kpi_id, timestamps, values, targets, through_id=None):
+        order = np.argsort(timestamps, kind='stable')
+        columns = [np.asarray(column)[order] for column in (timestamps, values, targets)]
+        header = self._header(kpi_id)
+        generation = header['generation'] + 1 if header else 1
+        self._write(kpi_id, columns, generation, through_id)
+        self._remove_generations(kpi_id, keep=generation)
+
+    def replace(self, kpi_id, timestamps, values, targets):
+        """Replace a KPI's history (epoch microseconds, values, targets)"""
+        with self.lock:
+            fd = self._locked(kpi_id)
+            try:
+                self._replace(kpi_id, timestamps, values, targets)
+            finally:
+                os.close(fd)
+
+    def rebuild(self, kpi_id, load):
+        """Replace a KPI's history with `load()`'s (timestamps, values, targets,
+        highest id read), read while holding the KPI's lock so that no append
+        lands between the read and the write. Returns the number of points."""
+        with self.lock:
+            fd = self._locked(kpi_id)
+            try:
+                timestamps, values, targets, through_id = load()
+                self._replace(kpi_id, timestamps, values, targets, through_id)
+                return len(timestamps)
+            finally:
+                os.close(fd)
+
+    def _stored(self, columns, point):
+        """Whether an identical (timestamp, value, target) point is stored"""
+        timestamps, values, targets = columns
+        first, last = timestamps.searchsorted(point[0]), timestamps.searchsorted(point[0], side='right')
+        return any(
+            values[i] == point[1] and (targets[i] == point[2] or np.isnan(targets[i]) and np.isnan(point[2]))
+            for i in range(first, last)
+        )
+
+    def append(self, kpi_id, timestamps, values, targets, ids=None):
+        """Add points to a KPI the store holds; returns False if it does not.
+
+        With `ids`, points a rebuild already read are skipped.
+        """
+        order = np.argsort(timestamps, kind='stable')
+        new = [np.asarray(column, dtype=dtype)[order] for column, (_, dtype) in zip((timestamps, values, targets), COLUMNS)]
+        with self.lock:
+            fd = self._locked(kpi_id)
+            try:
+                header = self._header(kpi_id)
+                if header is None:
+                    return False
+
+                current = self._map(kpi_id, header)
+                through_id = header.get('through_id')
+                if ids is not None and through_id is not None:
+                    ids = np.asarray(ids)[order]
+                    keep = np.array([
+                        not (point_id <= through_id and self._stored(current, point))
+                        for point_id, point in zip(ids, zip(*new))
+                    ], dtype=bool)
+                    new = [column[keep] for column in new]
+                    if not len(new[0]):
+                        return True
+
+                if header['rows'] and new[0][0] < current[0][-1]:
+                    # A late point: merge it in as a new generation
+                    merged = [np.concatenate([old, added]) for old, added in zip(current, new)]
+                    order = np.argsort(merged[0], kind='stable')
+                    generation = header['generation'] + 1
+                    self._write(kpi_id, [column[order] for column in merged], generation, through_id)
+                    self._remove_generations(kpi_id, keep=generation)
+                    return True
+
+                for (column, _), data in zip(COLUMNS, new):
+                    path = self._column_path(kpi_id, header['generation'], column)
+                    with open(path, 'ab') as f:
+                        # Bytes past the header's rows are left from an append
+                        # that never updated the header; overwrite them
+                        f.truncate(header['rows'] * 8)
+                        f.write(data.tobytes())
+                self._save_header(kpi_id, {**header, 'rows': header['rows'] + len(new[0])})
+                return True
+            finally:
+                os.close(fd)
+
+    def remove(self, kpi_id):
+        with self.lock:
+            self._remove_generations(kpi_id)
+            for suffix in ('json', 'lock'):
+                path = os.path.join(self.directory, f'{kpi_id}.{suffix}')
+                if os.path.exists(path):
+                    os.remove(path)
+
+def read_database(kpi_id, start=None, end=None):
+    """A KPI's history in [start, end) read from kpi_data and its partitions,
+    and the highest point id read (None without points)"""
+    def build_query(entity):
+        query = db.session.query(entity.id, entity.timestamp, entity.value, entity.target)\
+            .filter(entity.kpi_id == kpi_id)
+        if start:
+            query = query.filter(entity.timestamp >= start)
+        if end:
+            query = query.filter(entity.timestamp < end)
+        return query
+
+    rows = query_partitions(build_query, start, end)
+    if not rows:
+        return empty_history(), None
+    ids, timestamps, values, targets = zip(*rows)
+    columns = (
+        to_epoch(timestamps),
+        np.array(values, dtype=np.float64),
+        np.array([np.nan if target is None else target for target in targets], dtype=np.float64)
+    )
+    order = np.argsort(columns[0], kind='stable')
+    return tuple(column[order] for column in columns), max(ids)
+
+def database_history(kpi_id, start=None, end=None):
+    """A KPI's history in [start, end) read from kpi_data and its partitions"""
+    return read_database(kpi_id, start, end)[0]
+
+def kpi_history(kpi_id, start=None, end=None):
+    """(timestamps, values, targets) arrays of a KPI in [start, end), from the
+    history store when it holds the KPI, else from the database"""
+    store = current_app.extensions.get('history_store')
+    history = store.read(kpi_id, start, end) if store else None
+    return history if history is not None else database_history(kpi_id, start, end)
+
+def downsample(timestamps, values, targets, points):
+    """Average a history into at most `points` equal time buckets, each
+    stamped with its first point's time; a chart needs no more"""
+    if len(timestamps) <= points:
+        return timestamps, values, targets
+
+    edges = np.linspace(timestamps[0], timestamps[-1] + 1, points + 1)[:-1].astype(np.int64)
+    # First index of every non-empty bucket
+    starts = np.unique(timestamps.searchsorted(edges))
+    counts = np.diff(np.append(starts, len(timestamps)))
+
+    has_target = ~np.isnan(targets)
+    target_sums = np.add.reduceat(np.where(has_target, targets, 0), starts)
+    target_counts = np.add.reduceat(has_target.astype(np.int64), starts)
+    return (
+        timestamps[starts],
+        np.add.reduceat(values, starts) / counts,
+        np.divide(target_sums, target_counts, out=np.full(len(starts), np.nan), where=target_counts > 0)
+    )
+
+def compact_history(store, kpi_ids=None):
+    """Rebuild the store's files from the database.
+
+    Drops points deleted since they were appended (retention) and KPIs
+    that no longer exist. Returns the number of points written.
+    """
+    known = {kpi_id for (kpi_id,) in db.session.query(KPI.id)}
+    if kpi_ids is None:
+        for kpi_id in set(store.kpi_ids()) - known:
+            store.remove(kpi_id)
+        kpi_ids = sorted(known)
+
+    written = 0
+    for kpi_id in kpi_ids:
+        if kpi_id not in known:
+            store.remove(kpi_id)
+            continue
+
+        def load():
+            # Read in a fresh transaction, begun under the KPI's lock: it sees
+            # every commit whose append has already run
+            db.session.rollback()
+            history, through_id = read_database(kpi_id)
+            return (*history, through_id)
+
+        written += store.rebuild(kpi_id, load)
+    db.session.rollback()
+    return written
+
+def invalidate_history(kpi_ids=None):
+    """Drop KPIs (default: all) from the store after writes it did not see.
+
+    They are read from the database until the next compaction.
+    """
+    store = current_app.extensions.get('history_store') if has_app_context() else None
+    if store is None:
+        return
+    for kpi_id in store.kpi_ids() if kpi_ids is None else kpi_ids:
+        store.remove(kpi_id)
+
+def history_pending(session):
+    """The session's store changes waiting for its commit, or None with the store off"""
+    if not (has_app_context() and 'history_store' in current_app.extensions):
+        return None
+    return session.info.setdefault('history_pending', {'kpis': set(), 'points': [], 'stale': set()})
+
+@event.listens_for(RoutingSession, 'after_flush')
+def track_history(session, flush_context):
+    """Remember the KPIs and points a flush inserted, and the KPIs whose
+    points it changed or deleted, for after the commit"""
+    pending = history_pending(session)
+    if pending is None:
+        return
+    for obj in session.new:
+        if isinstance(obj, KPI):
+            pending['kpis'].add(obj.id)
+        elif isinstance(obj, KPIData):
+            pending['points'].append((obj.kpi_id, obj.id, obj.timestamp, obj.value, obj.target))
+
+    for obj in session.dirty:
+        if not isinstance(obj, KPIData):
+            continue
+        state = inspect(obj)
+        if any(state.attrs[key].history.has_changes() for key in HISTORY_ATTRIBUTES):
+            pending['stale'].add(obj.kpi_id)
+            # A point moved to another KPI outdates the one it left too
+            pending['stale'].update(state.attrs.kpi_id.history.deleted)
+
+    for obj in session.deleted:
+        if isinstance(obj, KPI):
+            pending['stale'].add(obj.id)
+        elif isinstance(obj, KPIData):
+            pending['stale'].add(obj.kpi_id)
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def track_bulk_history(orm_execute_state):
+    """Outdate the KPIs an ORM bulk write to kpi_data changes, or a bulk
+    delete of KPIs removes (`session.execute(delete(KPIData)...)`,
+    `Query.delete()`). Updates to KPI columns leave histories as they are."""
+    mapper = orm_execute_state.bind_mapper
+    entity = mapper.class_ if mapper is not None else None
+    writes_points = entity is KPIData and (
+        orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete
+    )
+    if not (writes_points or entity is KPI and orm_execute_state.is_delete):
+        return
+    pending = history_pending(orm_execute_state.session)
+    if pending is None:
+        return
+
+    parameters = orm_execute_state.parameters
+    # Executemany: a bulk insert, or a bulk update of points by primary key
+    rows = parameters if isinstance(parameters, list) else None
+    stale = pending['stale']
+    if orm_execute_state.is_insert:
+        stale.update(row['kpi_id'] for row in rows or [parameters or {}] if 'kpi_id' in row)
+        return
+    if rows is not None:
+        # A point moved to another KPI outdates that one too
+        stale.update(row['kpi_id'] for row in rows if 'kpi_id' in row)
+        affected = select(KPIData.kpi_id).where(KPIData.id.in_([row['id'] for row in rows]))
+    else:
+        affected = select(KPI.id if entity is KPI else KPIData.kpi_id)
+        if orm_execute_state.statement.whereclause is not None:
+            affected = affected.where(orm_execute_state.statement.whereclause)
+    # Read before the statement runs, while the rows still match
+    stale.update(orm_execute_state.session.execute(affected.distinct()).scalars())
+
+@event.listens_for(RoutingSession, 'after_commit')
+def append_history(session):
+    """Append committed points to the store and drop the KPIs it no longer
+    matches; a new KPI starts with an empty history.
+
+    A KPI whose files cannot be written is dropped too, so it is read from
+    the database rather than served short of the points just committed.
+    """
+    pending = session.info.pop('history_pending', None)
+    if not pending or not has_app_context():
+        return
+    store = current_app.extensions.get('history_store')
+    if store is None:
+        return
+
+    def drop(kpi_id):
+        try:
+            store.remove(kpi_id)
+        except OSError:
+            history_log.exception('Could not drop KPI %s from the history store', kpi_id)
+
+    for kpi_id in pending['kpis']:
+        try:
+            if store.read(kpi_id) is None:
+                store.replace(kpi_id, *empty_history())
+        except OSError:
+            history_log.exception('Could not start the history of KPI %s', kpi_id)
+            drop(kpi_id)
+
+    by_kpi = {}
+    for kpi_id, point_id, timestamp, value, target in pending['points']:
+        by_kpi.setdefault(kpi_id, []).append((point_id, timestamp, value, np.nan if target is None else target))
+    for kpi_id, points in by_kpi.items():
+        if kpi_id in pending['stale']:
+            continue
+        ids, timestamps, values, targets = zip(*points)
+        try:
+            # KPIs not compacted yet are read from the database until they are
+            store.append(kpi_id, to_epoch(timestamps), values, targets, ids)
+        except OSError:
+            history_log.exception('Could not append to the history of KPI %s', kpi_id)
+            drop(kpi_id)
+
+    for kpi_id in pending['stale']:
+        drop(kpi_id)
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def discard_history(session):
+    session.info.pop('history_pending', None)
+
+def init_history_store(app):
+    """Keep KPI histories in a HistoryStore when HISTORY_STORE_ENABLED is set"""
+    if not app.config.get('HISTORY_STORE_ENABLED'):
+        return
+    app.extensions['history_store'] = HistoryStore(
+        app.config.get('HISTORY_STORE_DIR') or os.path.join(app.instance_path, 'history')
+    )
+
+@click.command('history-compact')
+@click.option('--kpi', 'kpi_ids', type=int, multiple=True, help='KPI to rebuild (repeatable; default all).')
+@with_appcontext
+def history_compact_command(kpi_ids):
+    """Rebuild the memory-mapped KPI history files from the database."""
+    store = current_app.extensions.get('history_store')
+    if store is None:
+        click.echo('The history store is disabled (HISTORY_STORE_ENABLED).')
+        return
+    started = time.perf_counter()
+    written = compact_history(store, list(kpi_ids) or None)
+    click.echo(f'Wrote {written:,} points in {time.perf_counter() - started:.1f}s')
@@ -0,0 +1,140 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, bindparam, event, exists, func, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from .database import RoutingSession, db
+from .partitions import query_partitions
+from models import KPIData, KPILatest
+
+LATEST_COLUMNS = ('kpi_id', 'data_id', 'value', 'target', 'timestamp', 'period')
+
+def newest_points(points):
+    """The newest of `points` per KPI; ties on timestamp go to the higher id"""
+    newest = {}
+    for point in points:
+        current = newest.get(point['kpi_id'])
+        if current is None or (point['timestamp'], point['data_id']) > (current['timestamp'], current['data_id']):
+            newest[point['kpi_id']] = point
+    return list(newest.values())
+
+def latest_statements():
+    """(insert if missing, update if older) over p_-prefixed parameters.
+
+    Both statements are plain SQL on every dialect and only ever move a
+    KPI's row forward in time, so late or out-of-order points and
+    concurrent writers cannot replace a newer value with an older one.
+    """
+    table = KPILatest.__table__
+    params = {name: bindparam(f'p_{name}', type_=table.c[name].type) for name in LATEST_COLUMNS}
+
+    insert_missing = table.insert().from_select(
+        LATEST_COLUMNS,
+        select(*params.values()).where(~exists().where(table.c.kpi_id == params['kpi_id']))
+    )
+    update_older = table.update().where(
+        table.c.kpi_id == params['kpi_id'],
+        or_(
+            table.c.timestamp < params['timestamp'],
+            and_(table.c.timestamp == params['timestamp'], table.c.data_id < params['data_id'])
+        )
+    ).values({name: params[name] for name in LATEST_COLUMNS[1:]})
+    return insert_missing, update_older
+
+def insert_missing_rows(connection, insert_missing, rows):
+    """Insert the rows of KPIs without one, tolerating rows another
+    transaction inserted first.
+
+    NOT EXISTS is not atomic on SQL Server: concurrent first points for a
+    KPI can both pass it, and the later insert violates the primary key.
+    Its savepoint undoes it, the rows are retried one by one, and the
+    update that follows applies the point if it is newer.
+    """
+    try:
+        with connection.begin_nested():
+            connection.execute(insert_missing, rows)
+    except IntegrityError:
+        for row in rows:
+            try:
+                with connection.begin_nested():
+                    connection.execute(insert_missing, row)
+            except IntegrityError:
+                pass
+
+def upsert_latest(connection, points):
+    """Record `points` (dicts with LATEST_COLUMNS) as their KPIs' latest values
+    where they are newer, on `connection` and so in its transaction.
+
+    Two executemany statements however many KPIs the points cover.
+    Returns the number of KPIs considered.
+    """
+    rows = [{f'p_{name}': point[name] for name in LATEST_COLUMNS} for point in newest_points(points)]
+    if not rows:
+        return 0
+    insert_missing, update_older = latest_statements()
+    insert_missing_rows(connection, insert_missing, rows)
+    connection.execute(update_older, rows)
+    return len(rows)
+
+def point_row(point):
+    return {
+        'kpi_id': point.kpi_id,
+        'data_id': point.id,
+        'value': point.value,
+        'target': point.target,
+        'timestamp': point.timestamp,
+        'period': point.period
+    }
+
+@event.listens_for(RoutingSession, 'after_flush')
+def track_latest(session, flush_context):
+    """Upsert kpi_latest for the points a flush inserted, before it commits.
+
+    Every ORM ingest path (API, bulk API, form, init_db) goes through a
+    flush, so none of them has to remember to do this itself.
+    """
+    points = [point_row(obj) for obj in session.new if isinstance(obj, KPIData)]
+    if points:
+        upsert_latest(session.connection(), points)
+
+def latest_since(connection, kpi_ids, since):
+    """Points of `kpi_ids` stamped at or after `since`, for Core bulk loads
+    that do not get their ids back"""
+    table = KPIData.__table__
+    query = select(
+        table.c.kpi_id, table.c.id.label('data_id'), table.c.value, table.c.target, table.c.timestamp, table.c.period
+    ).where(table.c.kpi_id.in_(kpi_ids), table.c.timestamp >= since)
+    return [row._asdict() for row in connection.execute(query)]
+
+def rebuild_latest():
+    """Recompute kpi_latest from kpi_data and its partitions.
+
+    For databases that had points before the table existed, or after
+    points were deleted. Returns the number of KPIs with a latest value.
+    """
+    def build_query(entity):
+        ranked = db.session.query(
+            entity.kpi_id.label('kpi_id'),
+            entity.id.label('data_id'),
+            entity.value.label('value'),
+            entity.target.label('target'),
+            entity.timestamp.label('timestamp'),
+            entity.period.label('period'),
+            func.row_number().over(
+                partition_by=entity.kpi_id,
+                order_by=(entity.timestamp.desc(), entity.id.desc())
+            ).label('newest')
+        ).subquery()
+        return db.session.query(*[ranked.c[name] for name in LATEST_COLUMNS]).filter(ranked.c.newest == 1)
+
+    points = newest_points(row._asdict() for row in query_partitions(build_query))
+    KPILatest.query.delete()
+    upsert_latest(db.session.connection(), points)
+    db.session.commit()
+    return len(points)
+
+@click.command('rebuild-latest')
+@with_appcontext
+def rebuild_latest_command():
+    """Recompute the latest value of every KPI from the raw data points."""
+    click.echo(f'Recorded the latest value of {rebuild_latest()} KPIs')
@@ -0,0 +1,317 @@
+import os
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import Column, Index, MetaData, Table, func, insert, select, text
+from sqlalchemy.orm import aliased
+
+from .database import db
+from models import KPIData, KPIDataPartition
+
+_partition_tables = {}
+
+def partitioning_enabled():
+    """Whether kpi_data is split into monthly partition files.
+
+    Only SQLite needs the router; SQL Server partitions natively and prunes
+    on the timestamp predicates the callers already apply.
+    """
+    return bool(current_app.config.get('KPI_DATA_PARTITIONING')) and db.engine.dialect.name == 'sqlite'
+
+def partition_dir():
+    """Directory holding the monthly partition database files"""
+    return current_app.config.get('KPI_DATA_PARTITION_DIR') or os.path.join(current_app.instance_path, 'partitions')
+
+def month_key(timestamp):
+    return timestamp.strftime('%Y-%m')
+
+def month_start(month):
+    """First instant of a 'YYYY-MM' month"""
+    return datetime.strptime(month, '%Y-%m')
+
+def next_month(timestamp):
+    if timestamp.month == 12:
+        return datetime(timestamp.year + 1, 1, 1)
+    return datetime(timestamp.year, timestamp.month + 1, 1)
+
+def previous_month(timestamp):
+    if timestamp.month == 1:
+        return datetime(timestamp.year - 1, 12, 1)
+    return datetime(timestamp.year, timestamp.month - 1, 1)
+
+def schema_name(month):
+    return 'p_' + month.replace('-', '_')
+
+def partition_path(month):
+    return os.path.join(partition_dir(), f"kpi_data_{month.replace('-', '_')}.db")
+
+def partition_table(month):
+    """The kpi_data table inside a month's attached partition"""
+    table = _partition_tables.get(month)
+    if table is None:
+        table = Table(
+            'kpi_data', MetaData(),
+            *[Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+              for column in KPIData.__table__.columns],
+            schema=schema_name(month)
+        )
+        Index('ix_kpi_data_kpi_id_timestamp', table.c.kpi_id, table.c.timestamp)
+        _partition_tables[month] = table
+    return table
+
+def attach(connection, month, create=False):
+    """Attach a month's partition file to a connection.
+
+    Partitions are attached only while they are queried: SQLite allows ten
+    attached databases per connection, far fewer than the months of history.
+    """
+    schema = schema_name(month)
+    attached = {row[1] for row in connection.exec_driver_sql('PRAGMA database_list')}
+    if schema in attached:
+        return
+
+    path = partition_path(month)
+    if create:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    elif not os.path.exists(path):
+        raise FileNotFoundError(f'Partition file missing: {path}')
+
+    connection.exec_driver_sql(f'ATTACH DATABASE ? AS {schema}', (path,))
+    if create:
+        partition_table(month).create(connection, checkfirst=True)
+
+def detach(connection, month):
+    connection.exec_driver_sql(f'DETACH DATABASE {schema_name(month)}')
+
+def partitions_in_range(start=None, end=None, after_id=None):
+    """Registered partitions overlapping [start, end), oldest first.
+
+    `after_id` skips partitions holding no id above it.
+    """
+    query = KPIDataPartition.query
+    if after_id is not None:
+        query = query.filter(KPIDataPartition.max_id > after_id)
+    if start:
+        query = query.filter(KPIDataPartition.month >= month_key(start))
+    if end:
+        query = query.filter(KPIDataPartition.month <= month_key(end - timedelta(microseconds=1)))
+    return query.order_by(KPIDataPartition.month).all()
+
+def query_partitions(build_query, start=None, end=None, limit=None, newest_first=False, sort_key=None,
+                     after_id=None):
+    """Run a query against kpi_data and every partition its range touches.
+
+    `build_query` receives the entity to query (KPIData itself, or KPIData
+    mapped onto a partition) and returns a Query. With `limit`, `sort_key`
+    and `newest_first`, partitions are visited newest first and the walk
+    stops as soon as older months can no longer make the cut. `after_id`
+    skips partitions whose rows all have lower ids.
+    """
+    results = build_query(KPIData).all()
+    if not partitioning_enabled():
+        return results
+
+    partitions = partitions_in_range(start, end, after_id)
+    if newest_first:
+        partitions.reverse()
+
+    connection = db.session.connection()
+    for partition in partitions:
+        if limit is not None and sort_key is not None and len(results) >= limit:
+            results.sort(key=sort_key, reverse=newest_first)
+            if newest_first and sort_key(results[limit - 1]) >= next_month(month_start(partition.month)):
+                break
+
+        attach(connection, partition.month)
+        try:
+            entity = aliased(KPIData, partition_table(partition.month), adapt_on_names=True)
+            results.extend(build_query(entity).all())
+        finally:
+            detach(connection, partition.month)
+
+    if sort_key is not None:
+        results.sort(key=sort_key, reverse=newest_first)
+    if limit is not None:
+        results = results[:limit]
+    return results
+
+def partitioned_row_count():
+    """Rows held in partitions, from the registry"""
+    if not partitioning_enabled():
+        return 0
+    return db.session.query(func.coalesce(func.sum(KPIDataPartition.row_count), 0)).scalar()
+
+def roll_partitions(keep_months=1, now=None):
+    """Move whole months older than the kept window into partition files.
+
+    New points always land in kpi_data and reads union it with the
+    partitions, so a late point for a rolled month is moved on the next roll.
+    The month holding the highest id is never rolled: SQLite hands out
+    max(id) + 1, and emptying kpi_data would let ids restart.
+    """
+    now = now or datetime.utcnow()
+    cutoff = datetime(now.year, now.month, 1)
+    for _ in range(keep_months - 1):
+        cutoff = previous_month(cutoff)
+
+    newest = db.session.query(KPIData.timestamp).order_by(KPIData.id.desc()).first()
+    if newest is None:
+        return []
+
+    months = sorted(
+        month for (month,) in db.session.query(func.strftime('%Y-%m', KPIData.timestamp))
+            .filter(KPIData.timestamp < cutoff)
+            .distinct()
+        if month != month_key(newest.timestamp)
+    )
+    db.session.commit()
+
+    columns = [column.name for column in KPIData.__table__.columns]
+    source = KPIData.__table__
+
+    rolled = []
+    for month in months:
+        start = month_start(month)
+        end = next_month(start)
+        in_month = (source.c.timestamp >= start) & (source.c.timestamp < end)
+
+        with db.engine.connect() as connection:
+            attach(connection, month, create=True)
+            try:
+                table = partition_table(month)
+                connection.execute(insert(table).from_select(
+                    columns, select(*[source.c[name] for name in columns]).where(in_month)
+                ))
+                connection.execute(source.delete().where(in_month))
+                row_count, min_id, max_id = connection.execute(
+                    select(func.count(), func.min(table.c.id), func.max(table.c.id))
+                ).one()
+                connection.commit()
+            finally:
+                detach(connection, month)
+
+        partition = db.session.get(KPIDataPartition, month) or KPIDataPartition(month=month)
+        partition.path = partition_path(month)
+        partition.row_count = row_count
+        partition.min_id = min_id
+        partition.max_id = max_id
+        db.session.add(partition)
+        db.session.commit()
+        rolled.append(partition)
+
+    return rolled
+
+def drop_partition(month):
+    """Drop a month of history: unregister the partition and delete its file"""
+    partition = db.session.get(KPIDataPartition, month)
+    if partition is None:
+        raise LookupError(f'No partition for {month}')
+
+    from .history import invalidate_history
+
+    kpi_ids = []
+    if partition.path and os.path.exists(partition.path):
+        connection = db.session.connection()
+        attach(connection, month)
+        try:
+            kpi_ids = connection.execute(select(partition_table(month).c.kpi_id).distinct()).scalars().all()
+        finally:
+            detach(connection, month)
+
+    db.session.delete(partition)
+    db.session.commit()
+
+    if partition.path and os.path.exists(partition.path):
+        os.remove(partition.path)
+    invalidate_history(kpi_ids)
+
+def mssql_partition_ddl(first_month, last_month):
+    """T-SQL converting kpi_data to a natively month-partitioned table.
+
+    The clustered index moves to (timestamp, id) on the partition scheme and
+    the primary key becomes (id, timestamp) so every index stays aligned,
+    which is what lets a month be truncated as a metadata-only operation.
+    """
+    boundaries = []
+    month = month_start(first_month)
+    while month <= month_start(last_month):
+        boundaries.append(f"'{month:%Y-%m-%d}'")
+        month = next_month(month)
+
+    return [
+        f"CREATE PARTITION FUNCTION pf_kpi_data_month (datetime) AS RANGE RIGHT FOR VALUES ({', '.join(boundaries)})",
+        "CREATE PARTITION SCHEME ps_kpi_data_month AS PARTITION pf_kpi_data_month ALL TO ([PRIMARY])",
+        "DECLARE @pk sysname = (SELECT name FROM sys.key_constraints "
+        "WHERE parent_object_id = OBJECT_ID('kpi_data') AND type = 'PK'); "
+        "EXEC('ALTER TABLE kpi_data DROP CONSTRAINT ' + QUOTENAME(@pk))",
+        "ALTER TABLE kpi_data ALTER COLUMN timestamp datetime NOT NULL",
+        "CREATE CLUSTERED INDEX cx_kpi_data_timestamp ON kpi_data (timestamp, id) ON ps_kpi_data_month (timestamp)",
+        "ALTER TABLE kpi_data ADD CONSTRAINT pk_kpi_data PRIMARY KEY NONCLUSTERED (id, timestamp) "
+        "ON ps_kpi_data_month (timestamp)",
+        "CREATE INDEX ix_kpi_data_timestamp ON kpi_data (timestamp) "
+        "WITH (DROP_EXISTING = ON) ON ps_kpi_data_month (timestamp)",
+        "CREATE INDEX ix_kpi_data_kpi_id_timestamp ON kpi_data (kpi_id, timestamp) "
+        "WITH (DROP_EXISTING = ON) ON ps_kpi_data_month (timestamp)"
+    ]
+
+def mssql_drop_month_ddl(month):
+    """T-SQL emptying one month partition and merging its boundary away"""
+    boundary = f'{month_start(month):%Y-%m-%d}'
+    return [
+        f"DECLARE @p int = $PARTITION.pf_kpi_data_month('{boundary}'); "
+        "EXEC('TRUNCATE TABLE kpi_data WITH (PARTITIONS (' + CAST(@p AS varchar(10)) + '))')",
+        f"ALTER PARTITION FUNCTION pf_kpi_data_month() MERGE RANGE ('{boundary}')"
+    ]
+
+@click.group('partitions')
+def partitions_cli():
+    """Manage monthly kpi_data partitions."""
+
+@partitions_cli.command('list')
+@with_appcontext
+def list_command():
+    """List partitioned months."""
+    for partition in KPIDataPartition.query.order_by(KPIDataPartition.month):
+        click.echo(f'{partition.month}: {partition.row_count} rows ({partition.path})')
+
+@partitions_cli.command('roll')
+@click.option('--keep-months', type=int, default=1, help='Recent months kept in the main table.')
+@with_appcontext
+def roll_command(keep_months):
+    """Move closed months out of kpi_data into partition files."""
+    if not partitioning_enabled():
+        click.echo('Partitioning is disabled (KPI_DATA_PARTITIONING) or not supported on this database.')
+        return
+
+    for partition in roll_partitions(keep_months):
+        click.echo(f'Rolled {partition.month}: {partition.row_count} rows')
+
+@partitions_cli.command('drop')
+@click.argument('month')
+@with_appcontext
+def drop_command(month):
+    """Drop a month of kpi_data history (YYYY-MM)."""
+    if db.engine.dialect.name == 'mssql':
+        from .history import invalidate_history
+
+        start = month_start(month)
+        kpi_ids = db.session.query(KPIData.kpi_id).filter(
+            KPIData.timestamp >= start, KPIData.timestamp < next_month(start)
+        ).distinct().all()
+        for statement in mssql_drop_month_ddl(month):
+            db.session.execute(text(statement))
+        db.session.commit()
+        invalidate_history([kpi_id for (kpi_id,) in kpi_ids])
+    else:
+        drop_partition(month)
+    click.echo(f'Dropped {month}')
+
+@partitions_cli.command('mssql-ddl')
+@click.argument('first_month')
+@click.argument('last_month')
+def mssql_ddl_command(first_month, last_month):
+    """Print T-SQL that partitions kpi_data by month on SQL Server."""
+    for statement in mssql_partition_ddl(first_month, last_month):
+        click.echo(statement + ';')
@@ -0,0 +1,210 @@
+import os
+from datetime import datetime, time, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+from .database import db
+from .archive import write_archive
+from models import KPI, KPIData, KPIDataDaily
+
+MET_TARGET_STATUSES = ('Above Target', 'On Target')
+
+def archive_dir():
+    """Directory holding the compressed kpi_data archive"""
+    return current_app.config.get('KPI_DATA_ARCHIVE_DIR') or os.path.join(current_app.instance_path, 'archive')
+
+def retention_cutoff(days, now=None):
+    """Start of the oldest day that is kept when retaining `days` days"""
+    now = now or datetime.utcnow()
+    return datetime.combine((now - timedelta(days=days)).date(), time.min)
+
+def plan_retention(default_days=None, period=None, now=None):
+    """Build the retention plan: one entry per distinct policy.
+
+    KPIs with their own `retention_days` get an entry each; every other KPI
+    falls under the default policy, if there is one.
+    """
+    overrides = db.session.query(KPI.id, KPI.retention_days)\
+        .filter(KPI.retention_days.isnot(None))\
+        .all()
+
+    plans = []
+    for kpi_id, days in overrides:
+        plans.append({
+            'policy': f'kpi {kpi_id}',
+            'days': days,
+            'cutoff': retention_cutoff(days, now),
+            'conditions': [KPIData.kpi_id == kpi_id]
+        })
+
+    if default_days is not None:
+        override_ids = [kpi_id for kpi_id, _ in overrides]
+        conditions = [KPIData.kpi_id.notin_(override_ids)] if override_ids else []
+        plans.append({
+            'policy': 'default',
+            'days': default_days,
+            'cutoff': retention_cutoff(default_days, now),
+            'conditions': conditions
+        })
+
+    for plan in plans:
+        plan['conditions'].append(KPIData.timestamp < plan['cutoff'])
+        if period:
+            plan['conditions'].append(KPIData.period == period)
+
+    return plans
+
+def estimate_row_bytes():
+    """Average on-disk bytes per kpi_data row including its indexes, if known"""
+    if db.engine.dialect.name != 'sqlite':
+        return None
+
+    try:
+        total_bytes = db.session.execute(text(
+            "SELECT SUM(pgsize) FROM dbstat "
+            "WHERE name = 'kpi_data' OR tbl_name = 'kpi_data'"
+        )).scalar()
+    except Exception:
+        # dbstat is an optional SQLite extension
+        db.session.rollback()
+        return None
+
+    total_rows = db.session.query(KPIData.id).count()
+    if not total_bytes or not total_rows:
+        return None
+    return total_bytes / total_rows
+
+def retention_report(plans):
+    """Rows, days and estimated bytes each plan would reclaim"""
+    row_bytes = estimate_row_bytes()
+
+    report = []
+    for plan in plans:
+        rows, oldest = db.session.query(
+            db.func.count(KPIData.id),
+            db.func.min(KPIData.timestamp)
+        ).filter(*plan['conditions']).one()
+
+        report.append({
+            'policy': plan['policy'],
+            'days': plan['days'],
+            'cutoff': plan['cutoff'],
+            'rows': rows,
+            'oldest': oldest,
+            'estimated_bytes': int(rows * row_bytes) if row_bytes else None
+        })
+
+    return report
+
+def summarize_days(rows):
+    """Make sure every day the rows fall on has its summary before they go.
+
+    A day's summary covers all of its points. The rollup writes it from the
+    raw points while the day is recent; a day without one is summarised here
+    from all of its raw points, so rows left for later batches are counted
+    already. A day that has a summary keeps it: adding the rows to it would
+    count them twice.
+    """
+    from .rollup import daily_aggregates, write_summary
+
+    keys = {(row['kpi_id'], row['timestamp'].date()) for row in rows}
+    existing = {
+        (kpi_id, day)
+        for kpi_id, day in db.session.query(KPIDataDaily.kpi_id, KPIDataDaily.day).filter(
+            KPIDataDaily.kpi_id.in_({kpi_id for kpi_id, _ in keys}),
+            KPIDataDaily.day.in_({day for _, day in keys})
+        )
+    }
+    missing = keys - existing
+    if not missing:
+        return
+
+    days = sorted(day for _, day in missing)
+    groups = daily_aggregates(
+        datetime.combine(days[0], time.min),
+        datetime.combine(days[-1] + timedelta(days=1), time.min)
+    )
+    for kpi_id, day in missing:
+        summary = KPIDataDaily(kpi_id=kpi_id, day=day)
+        write_summary(summary, groups[(kpi_id, day)])
+        db.session.add(summary)
+
+def apply_retention(plans, archive_path, batch_size=1000):
+    """Archive, compact and delete the rows selected by the plans.
+
+    Rows are processed in id order, `batch_size` at a time, and each batch is
+    committed on its own so no write lock is held for longer than one batch.
+    Returns the number of rows removed.
+    """
+    columns = (
+        KPIData.id, KPIData.kpi_id, KPIData.value, KPIData.target, KPIData.timestamp,
+        KPIData.period, KPIData.notes, KPIData.created_by,
+        KPIData.performance_status.label('status')
+    )
+
+    removed = 0
+    for plan in plans:
+        last_id = 0
+        while True:
+            batch = db.session.query(*columns)\
+                .filter(*plan['conditions'], KPIData.id > last_id)\
+                .order_by(KPIData.id)\
+                .limit(batch_size)\
+                .all()
+            if not batch:
+                break
+
+            rows = [row._asdict() for row in batch]
+            write_archive(archive_path, rows)
+
+            try:
+                summarize_days(rows)
+                KPIData.query.filter(KPIData.id.in_([row['id'] for row in rows]))\
+                    .delete(synchronize_session=False)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            removed += len(rows)
+            last_id = rows[-1]['id']
+
+    return removed
+
+@click.command('retention')
+@click.option('--days', type=int, default=None,
+              help='Default retention in days (overrides KPI_DATA_RETENTION_DAYS).')
+@click.option('--period', default=None, help='Only apply to data points of this period.')
+@click.option('--batch-size', type=int, default=None, help='Rows deleted per transaction.')
+@click.option('--dry-run', is_flag=True, help='Report what would be reclaimed without changing anything.')
+@with_appcontext
+def retention_command(days, period, batch_size, dry_run):
+    """Archive and compact KPI data older than the retention policy."""
+    if days is None:
+        days = current_app.config.get('KPI_DATA_RETENTION_DAYS')
+    batch_size = batch_size or current_app.config.get('KPI_DATA_RETENTION_BATCH_SIZE', 1000)
+
+    plans = plan_retention(days, period)
+    if not plans:
+        click.echo('No retention policy configured.')
+        return
+
+    total_rows = 0
+    total_bytes = 0
+    for entry in retention_report(plans):
+        size = f"~{entry['estimated_bytes'] / 1024 / 1024:.1f} MB" if entry['estimated_bytes'] is not None else 'unknown size'
+        click.echo(f"{entry['policy']}: keep {entry['days']} days (before {entry['cutoff']:%Y-%m-%d}), "
+                   f"{entry['rows']} rows, {size}")
+        total_rows += entry['rows']
+        total_bytes += entry['estimated_bytes'] or 0
+
+    click.echo(f'Total: {total_rows} rows, ~{total_bytes / 1024 / 1024:.1f} MB reclaimable')
+
+    if dry_run or not total_rows:
+        return
+
+    removed = apply_retention(plans, archive_dir(), batch_size)
+    click.echo(f'Archived and compacted {removed} rows into {archive_dir()}')
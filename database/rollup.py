@@ -0,0 +1,131 @@
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import Date, and_, case, cast, func
+
+from .database import db
+from .partitions import query_partitions
+from .retention import MET_TARGET_STATUSES
+from models import KPI, KPIData, KPIDataDaily, performance_status_case
+
+def day_expression(column):
+    """The calendar day of a timestamp column"""
+    if db.engine.dialect.name == 'sqlite':
+        # CAST(... AS DATE) on SQLite yields the year as a number
+        return func.date(column)
+    return cast(column, Date)
+
+def as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+def daily_aggregates(start, end):
+    """Per KPI and day aggregates of the raw points in [start, end).
+
+    One GROUP BY per table read: a window numbers each day's points newest
+    first, so the last value and target come out of the same pass as the
+    counts and extremes.
+    """
+    def build_query(entity):
+        status = performance_status_case(entity.value, entity.target, KPI.target_type, KPI.id.is_not(None))
+        day = day_expression(entity.timestamp)
+        points = db.session.query(
+            entity.kpi_id.label('kpi_id'),
+            day.label('day'),
+            entity.value.label('value'),
+            entity.target.label('target'),
+            entity.timestamp.label('timestamp'),
+            case((status.in_(MET_TARGET_STATUSES), 1), else_=0).label('met'),
+            func.row_number().over(
+                partition_by=(entity.kpi_id, day),
+                order_by=(entity.timestamp.desc(), entity.id.desc())
+            ).label('newest')
+        ).select_from(entity)\
+         .outerjoin(KPI, entity.kpi_id == KPI.id)\
+         .filter(entity.timestamp >= start, entity.timestamp < end)\
+         .subquery()
+
+        return db.session.query(
+            points.c.kpi_id,
+            points.c.day,
+            func.count().label('count'),
+            func.sum(points.c.value).label('value_sum'),
+            func.min(points.c.value).label('min_value'),
+            func.max(points.c.value).label('max_value'),
+            func.max(case((points.c.newest == 1, points.c.value))).label('last_value'),
+            func.max(case((points.c.newest == 1, points.c.target))).label('last_target'),
+            func.max(points.c.timestamp).label('last_timestamp'),
+            func.sum(points.c.met).label('above_target_count')
+        ).group_by(points.c.kpi_id, points.c.day)
+
+    # A day split between kpi_data and a partition (a late point after a
+    # roll) comes back as two groups; fold them together.
+    groups = {}
+    for row in query_partitions(build_query, start, end):
+        key = (row.kpi_id, as_date(row.day))
+        group = row._asdict()
+        if key in groups:
+            group = combine(groups[key], group)
+        groups[key] = group
+    return groups
+
+def combine(a, b):
+    newer, older = (a, b) if a['last_timestamp'] >= b['last_timestamp'] else (b, a)
+    return {
+        **newer,
+        'count': a['count'] + b['count'],
+        'value_sum': a['value_sum'] + b['value_sum'],
+        'min_value': min(a['min_value'], b['min_value']),
+        'max_value': max(a['max_value'], b['max_value']),
+        'above_target_count': a['above_target_count'] + b['above_target_count']
+    }
+
+def write_summary(summary, group):
+    """Set a daily summary from one of daily_aggregates()' groups"""
+    summary.count = group['count']
+    summary.value_sum = group['value_sum']
+    summary.min_value = group['min_value']
+    summary.max_value = group['max_value']
+    summary.last_value = group['last_value']
+    summary.last_target = group['last_target']
+    summary.last_timestamp = group['last_timestamp']
+    summary.above_target_count = group['above_target_count']
+
+def rollup_daily_summaries(days=2, now=None):
+    """Recompute the daily summaries of the last `days` days from raw points.
+
+    Each (KPI, day) summary is replaced, not added to, so running this any
+    number of times leaves the same table. Only recent days belong here:
+    days already compacted by retention no longer have their raw points.
+    Returns the number of summaries written.
+    """
+    now = now or datetime.utcnow()
+    first_day = now.date() - timedelta(days=days - 1)
+    start = datetime.combine(first_day, datetime.min.time())
+    end = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+
+    groups = daily_aggregates(start, end)
+    existing = {
+        (summary.kpi_id, summary.day): summary
+        for summary in KPIDataDaily.query.filter(and_(KPIDataDaily.day >= first_day, KPIDataDaily.day <= now.date()))
+    }
+
+    for (kpi_id, day), group in groups.items():
+        summary = existing.get((kpi_id, day))
+        if summary is None:
+            summary = KPIDataDaily(kpi_id=kpi_id, day=day)
+            db.session.add(summary)
+
+        write_summary(summary, group)
+
+    db.session.commit()
+    return len(groups)
+
+@click.command('rollup')
+@click.option('--days', type=int, default=None, help='Recent days to recompute (KPI_DAILY_ROLLUP_DAYS).')
+@with_appcontext
+def rollup_command(days):
+    """Recompute daily KPI summaries from the raw data points."""
+    days = days or current_app.config.get('KPI_DAILY_ROLLUP_DAYS', 2)
+    click.echo(f'Wrote {rollup_daily_summaries(days)} daily summaries for the last {days} days')
@@ -0,0 +1,222 @@
+import re
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import DateTime, Float, Integer, String, Text, event, text
+
+from .database import db
+
+# Searchable tables: the columns indexed, and the index named after them
+SEARCH_INDEXES = {
+    'kpi': ('kpi_search', 'kpis', ('name', 'description')),
+    'department': ('department_search', 'departments', ('name', 'description')),
+    'note': ('note_search', 'kpi_data', ('notes',))
+}
+SEARCH_KINDS = tuple(SEARCH_INDEXES)
+MSSQL_CATALOG = 'kpi_search_catalog'
+MAX_TERMS = 10
+# Shortest last word matched as a prefix; shorter prefixes match too many words
+MIN_PREFIX = 3
+# Notes matching a common word are ranked among the newest this many matches
+NOTE_RANK_WINDOW = 10000
+
+def sqlite_search_ddl(kind):
+    """FTS5 table over a base table's columns, kept in sync by triggers.
+
+    The index is external content: it stores only the tokens and reads the
+    text back from the base table, so the notes are not held twice. Empty
+    notes (most bulk-loaded points) are never indexed.
+    """
+    index, table, columns = SEARCH_INDEXES[kind]
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    indexed_new = ' OR '.join(f"coalesce(new.{column}, '') != ''" for column in columns)
+    indexed_old = ' OR '.join(f"coalesce(old.{column}, '') != ''" for column in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5({names}, content='{table}', content_rowid='id', "
+        f"prefix='{MIN_PREFIX} {MIN_PREFIX + 1}')",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {table} WHEN {indexed_new} BEGIN "
+        f"INSERT INTO {index} (rowid, {names}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {table} WHEN {indexed_old} BEGIN "
+        f"INSERT INTO {index} ({index}, rowid, {names}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF {names} ON {table} BEGIN "
+        f"INSERT INTO {index} ({index}, rowid, {names}) SELECT 'delete', old.id, {old} WHERE {indexed_old}; "
+        f"INSERT INTO {index} (rowid, {names}) SELECT new.id, {new} WHERE {indexed_new}; END"
+    ]
+
+def mssql_search_ddl():
+    """T-SQL creating SQL Server full-text indexes equivalent to the FTS5 tables.
+
+    SQL Server keeps them in sync itself (CHANGE_TRACKING AUTO). A full-text
+    index needs a unique single-column key, so kpi_data is skipped once it
+    has been month-partitioned (its primary key is then (id, timestamp)).
+    These statements cannot run inside a transaction.
+    """
+    statements = [
+        f"IF NOT EXISTS (SELECT 1 FROM sys.fulltext_catalogs WHERE name = '{MSSQL_CATALOG}') "
+        f"CREATE FULLTEXT CATALOG {MSSQL_CATALOG}"
+    ]
+    for index, table, columns in SEARCH_INDEXES.values():
+        statements.append(
+            "DECLARE @key sysname = (SELECT i.name FROM sys.indexes i "
+            f"WHERE i.object_id = OBJECT_ID('{table}') AND i.is_primary_key = 1 "
+            "AND (SELECT COUNT(*) FROM sys.index_columns c WHERE c.object_id = i.object_id AND c.index_id = i.index_id) = 1); "
+            f"IF @key IS NOT NULL AND NOT EXISTS (SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('{table}')) "
+            f"EXEC('CREATE FULLTEXT INDEX ON {table} ({', '.join(columns)}) KEY INDEX ' + QUOTENAME(@key) + "
+            f"' ON {MSSQL_CATALOG} WITH CHANGE_TRACKING AUTO')"
+        )
+    return statements
+
+def create_sqlite_search(connection, rebuild=False):
+    """Create the FTS5 tables and triggers that are missing.
+
+    A table created over existing rows is filled from them ('rebuild');
+    `rebuild` refills every table.
+    """
+    existing = {row[0] for row in connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for kind, (index, table, columns) in SEARCH_INDEXES.items():
+        for statement in sqlite_search_ddl(kind):
+            connection.exec_driver_sql(statement)
+        if rebuild or index not in existing:
+            connection.exec_driver_sql(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+
+@event.listens_for(db.metadata, 'after_create')
+def create_search_index(target, connection, **kw):
+    """Set up search on SQLite whenever db.create_all() runs"""
+    if connection.dialect.name == 'sqlite':
+        create_sqlite_search(connection)
+
+@event.listens_for(db.metadata, 'before_drop')
+def drop_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        for index, _, _ in SEARCH_INDEXES.values():
+            connection.exec_driver_sql(f'DROP TABLE IF EXISTS {index}')
+
+def match_terms(query):
+    """Words of a user query; the last one may be a prefix (search as you type)"""
+    return re.findall(r'\w+', query)[:MAX_TERMS]
+
+def fts5_query(terms):
+    # Quoting each word keeps FTS5 operators and punctuation out of the query
+    return ' '.join(f'"{term}"' for term in terms) + ('*' if len(terms[-1]) >= MIN_PREFIX else '')
+
+def mssql_query(terms):
+    last = f'"{terms[-1]}*"' if len(terms[-1]) >= MIN_PREFIX else f'"{terms[-1]}"'
+    return ' AND '.join([f'"{term}"' for term in terms[:-1]] + [last])
+
+# Every search query returns these columns, whatever the kind
+RESULT_COLUMNS = {
+    'id': Integer, 'score': Float, 'name': String, 'text': Text,
+    'kpi_id': Integer, 'department_id': Integer, 'department_name': String, 'timestamp': DateTime
+}
+
+SQLITE_SEARCHES = {
+    'kpi': """
+        SELECT kpis.id AS id, -hits.rank AS score, kpis.name AS name, kpis.description AS text,
+               kpis.id AS kpi_id, kpis.department_id AS department_id, departments.name AS department_name,
+               NULL AS timestamp
+        FROM (SELECT rowid, bm25(kpi_search, 10.0, 1.0) AS rank FROM kpi_search
+              WHERE kpi_search MATCH :query ORDER BY rank LIMIT :limit) AS hits
+        JOIN kpis ON kpis.id = hits.rowid
+        JOIN departments ON departments.id = kpis.department_id
+        ORDER BY hits.rank""",
+    'department': """
+        SELECT departments.id AS id, -hits.rank AS score, departments.name AS name, departments.description AS text,
+               NULL AS kpi_id, departments.id AS department_id, departments.name AS department_name,
+               NULL AS timestamp
+        FROM (SELECT rowid, bm25(department_search, 10.0, 1.0) AS rank FROM department_search
+              WHERE department_search MATCH :query ORDER BY rank LIMIT :limit) AS hits
+        JOIN departments ON departments.id = hits.rowid
+        ORDER BY hits.rank""",
+    'note': """
+        SELECT kpi_data.id AS id, -hits.rank AS score, kpis.name AS name, kpi_data.notes AS text,
+               kpi_data.kpi_id AS kpi_id, kpis.department_id AS department_id, departments.name AS department_name,
+               kpi_data.timestamp AS timestamp
+        FROM (SELECT rowid, bm25(note_search) AS rank FROM note_search
+              WHERE note_search MATCH :query
+              AND rowid >= coalesce((SELECT rowid FROM note_search WHERE note_search MATCH :query
+                                     ORDER BY rowid DESC LIMIT 1 OFFSET :window), 0)
+              ORDER BY rank LIMIT :limit) AS hits
+        JOIN kpi_data ON kpi_data.id = hits.rowid
+        JOIN kpis ON kpis.id = kpi_data.kpi_id
+        JOIN departments ON departments.id = kpis.department_id
+        ORDER BY hits.rank"""
+}
+
+MSSQL_SEARCHES = {
+    'kpi': """
+        SELECT kpis.id AS id, hits.[RANK] AS score, kpis.name AS name, kpis.description AS text,
+               kpis.id AS kpi_id, kpis.department_id AS department_id, departments.name AS department_name,
+               NULL AS timestamp
+        FROM CONTAINSTABLE(kpis, (name, description), :query, :limit) AS hits
+        JOIN kpis ON kpis.id = hits.[KEY]
+        JOIN departments ON departments.id = kpis.department_id
+        ORDER BY hits.[RANK] DESC""",
+    'department': """
+        SELECT departments.id AS id, hits.[RANK] AS score, departments.name AS name, departments.description AS text,
+               NULL AS kpi_id, departments.id AS department_id, departments.name AS department_name,
+               NULL AS timestamp
+        FROM CONTAINSTABLE(departments, (name, description), :query, :limit) AS hits
+        JOIN departments ON departments.id = hits.[KEY]
+        ORDER BY hits.[RANK] DESC""",
+    'note': """
+        SELECT kpi_data.id AS id, hits.[RANK] AS score, kpis.name AS name, kpi_data.notes AS text,
+               kpi_data.kpi_id AS kpi_id, kpis.department_id AS department_id, departments.name AS department_name,
+               kpi_data.timestamp AS timestamp
+        FROM CONTAINSTABLE(kpi_data, notes, :query, :limit) AS hits
+        JOIN kpi_data ON kpi_data.id = hits.[KEY]
+        JOIN kpis ON kpis.id = kpi_data.kpi_id
+        JOIN departments ON departments.id = kpis.department_id
+        ORDER BY hits.[RANK] DESC"""
+}
+
+def search(query, kinds=SEARCH_KINDS, limit=20, offset=0):
+    """Ranked matches for `query` across the given kinds, best first.
+
+    Each kind's index returns its own top `offset + limit` hits, which are
+    merged by score; scores compare within one database engine only. On
+    SQLite, notes are ranked among their newest NOTE_RANK_WINDOW matches,
+    so a word found in millions of notes still costs milliseconds.
+    Raises NotImplementedError on databases without a full-text index here.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        searches, match = SQLITE_SEARCHES, fts5_query
+    elif dialect == 'mssql':
+        searches, match = MSSQL_SEARCHES, mssql_query
+    else:
+        raise NotImplementedError(f'Full-text search is not available on {dialect}')
+
+    terms = match_terms(query)
+    if not terms:
+        return []
+
+    results = []
+    for kind in kinds:
+        statement = text(searches[kind]).columns(**RESULT_COLUMNS)
+        params = {'query': match(terms), 'limit': offset + limit, 'window': NOTE_RANK_WINDOW - 1}
+        for row in db.session.execute(statement, params):
+            results.append({'type': kind, **row._asdict()})
+
+    results.sort(key=lambda result: result['score'], reverse=True)
+    return results[offset:offset + limit]
+
+@click.command('search-index')
+@click.option('--rebuild', is_flag=True, help='Refill the SQLite indexes from their tables.')
+@with_appcontext
+def search_index_command(rebuild):
+    """Create the full-text search indexes (SQLite FTS5 or SQL Server)."""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        with db.engine.begin() as connection:
+            create_sqlite_search(connection, rebuild)
+    elif dialect == 'mssql':
+        # Full-text DDL is refused inside a transaction
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            for statement in mssql_search_ddl():
+                connection.exec_driver_sql(statement)
+    else:
+        click.echo(f'Full-text search is not available on {dialect}.')
+        return
+    click.echo('Search indexes are in place')
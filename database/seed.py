@@ -0,0 +1,169 @@
+import time
+from datetime import datetime, timedelta
+
+import click
+import numpy as np
+from flask.cli import with_appcontext
+from sqlalchemy import insert
+
+from .database import db
+from .history import invalidate_history
+from .init_db import SAMPLE_DEPARTMENTS, SAMPLE_KPIS, seed_rule
+from .latest import latest_since, upsert_latest
+from models import Department, KPI, KPIData
+
+# --resolution: seconds between points and the period stored on them
+RESOLUTIONS = {
+    'minute': (60, 'minute'),
+    'hourly': (3600, 'hourly'),
+    'daily': (86400, 'daily')
+}
+
+SECONDS_PER_YEAR = 365.25 * 86400
+
+def build_catalog(departments, kpis_per_department, first_number=1):
+    """Department and KPI rows modelled on the sample catalog.
+
+    Department names get a running number (they are unique); each
+    department's KPIs cycle through its sample template's KPIs.
+    """
+    department_rows = []
+    kpi_rows = []
+    for d in range(departments):
+        template = d % len(SAMPLE_DEPARTMENTS)
+        department_rows.append({
+            'name': f"{SAMPLE_DEPARTMENTS[template]['name']} {first_number + d}",
+            'description': SAMPLE_DEPARTMENTS[template]['description']
+        })
+
+        kpi_templates = [kpi for kpi in SAMPLE_KPIS if kpi['department_id'] == template + 1]
+        for k in range(kpis_per_department):
+            kpi = dict(kpi_templates[k % len(kpi_templates)], department_id=d)
+            if k >= len(kpi_templates):
+                kpi['name'] = f"{kpi['name']} {k // len(kpi_templates) + 1}"
+            kpi_rows.append(kpi)
+    return department_rows, kpi_rows
+
+class SeriesModel:
+    """Per-KPI level, trend, seasonality and noise for generated values.
+
+    Values stay within the KPI's seed rule range: yearly, weekly and (for
+    sub-daily points) daily cycles plus a linear trend around a level near
+    the middle of the range, with Gaussian noise on top.
+    """
+
+    def __init__(self, names, rng):
+        count = len(names)
+        self.low, self.high, self.target = np.array([seed_rule(name) for name in names], dtype=float).T
+        span = self.high - self.low
+
+        self.level = (self.low + self.high) / 2 + rng.uniform(-0.1, 0.1, count) * span
+        self.trend = rng.normal(0, 0.1, count) * span
+        self.cycles = [
+            # (period in seconds, amplitude, phase)
+            (SECONDS_PER_YEAR, rng.uniform(0.05, 0.15, count) * span, rng.uniform(0, 2 * np.pi, count)),
+            (7 * 86400, rng.uniform(0, 0.05, count) * span, rng.uniform(0, 2 * np.pi, count)),
+            (86400, rng.uniform(0, 0.1, count) * span, rng.uniform(0, 2 * np.pi, count))
+        ]
+        self.noise = rng.uniform(0.02, 0.06, count) * span
+
+    def values(self, seconds, rng):
+        """Values at `seconds` since the start, shaped (kpis, len(seconds))"""
+        seconds = seconds[np.newaxis, :]
+        values = self.level[:, np.newaxis] + self.trend[:, np.newaxis] * (seconds / SECONDS_PER_YEAR)
+        for period, amplitude, phase in self.cycles:
+            values += amplitude[:, np.newaxis] * np.sin(2 * np.pi * seconds / period + phase[:, np.newaxis])
+        values += rng.standard_normal(values.shape) * self.noise[:, np.newaxis]
+        return np.round(np.clip(values, self.low[:, np.newaxis], self.high[:, np.newaxis]), 2)
+
+def seed_data(departments=10, kpis_per_department=10, days=365, resolution='hourly', seed=42,
+              chunk_size=50000, end=None, progress=None):
+    """Insert a synthetic catalog and `days` of points per KPI up to `end`.
+
+    Values come from a NumPy generator seeded with `seed`, so the same
+    arguments always produce the same data. Points are written in time
+    order with bulk inserts of about `chunk_size` rows, one transaction
+    each. Returns (departments, kpis, points) inserted.
+    """
+    step, period = RESOLUTIONS[resolution]
+    end = end or datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    start = end - timedelta(days=days)
+    rng = np.random.default_rng(seed)
+
+    first_number = db.session.query(Department).count() + 1
+    department_rows, kpi_rows = build_catalog(departments, kpis_per_department, first_number)
+
+    with db.engine.begin() as connection:
+        department_ids = connection.execute(
+            insert(Department).returning(Department.id, sort_by_parameter_order=True), department_rows
+        ).scalars().all()
+        for kpi in kpi_rows:
+            kpi['department_id'] = department_ids[kpi['department_id']]
+        kpi_ids = connection.execute(
+            insert(KPI).returning(KPI.id, sort_by_parameter_order=True), kpi_rows
+        ).scalars().all()
+    # Points go in past the session: the history store must not hold these KPIs
+    invalidate_history(kpi_ids)
+
+    model = SeriesModel([kpi['name'] for kpi in kpi_rows], rng)
+    targets = model.target.tolist()
+    steps = int(days * 86400 // step)
+    steps_per_chunk = max(1, chunk_size // max(len(kpi_ids), 1))
+    # Rows go to the driver as tuples through one precompiled statement:
+    # per-row SQLAlchemy parameter handling would cost more than the insert.
+    # Timestamps are converted once per step with the column's own bind
+    # processor, so they are stored exactly as the ORM would store them.
+    table = KPIData.__table__
+    dialect = db.engine.dialect
+    columns = ['kpi_id', 'value', 'target', 'timestamp', 'period', 'notes', 'created_by']
+    compiled = table.insert().compile(dialect=dialect, column_keys=columns)
+    order = [columns.index(key) for key in compiled.positiontup]
+    process_timestamp = table.c.timestamp.type.dialect_impl(dialect).bind_processor(dialect) or (lambda value: value)
+    written = 0
+
+    for first in range(0, steps, steps_per_chunk):
+        seconds = np.arange(first, min(first + steps_per_chunk, steps), dtype=np.int64) * step
+        stamps = (np.datetime64(start, 's') + seconds.astype('timedelta64[s]')).astype('datetime64[us]').tolist()
+        # (kpis, steps) -> one row per step and KPI, oldest step first
+        values = model.values(seconds.astype(float), rng).T.tolist()
+
+        rows = [
+            (kpi_id, value, target, stamp, period, '', 'seed')
+            for stamp, step_values in zip(map(process_timestamp, stamps), values)
+            for kpi_id, value, target in zip(kpi_ids, step_values, targets)
+        ]
+        if order != list(range(len(columns))):
+            rows = [tuple(row[i] for i in order) for row in rows]
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql(compiled.string, rows)
+            # The chunk's last step holds every KPI's newest point
+            upsert_latest(connection, latest_since(connection, kpi_ids, stamps[-1]))
+        written += len(rows)
+        if progress:
+            progress(written, steps * len(kpi_ids))
+
+    return len(department_ids), len(kpi_ids), written
+
+@click.command('seed')
+@click.option('--departments', type=int, default=10, show_default=True, help='Departments to create.')
+@click.option('--kpis-per-department', type=int, default=10, show_default=True, help='KPIs per department.')
+@click.option('--days', type=int, default=365, show_default=True, help='Days of history per KPI.')
+@click.option('--resolution', type=click.Choice(list(RESOLUTIONS)), default='hourly', show_default=True,
+              help='Time between data points.')
+@click.option('--seed', 'seed_value', type=int, default=42, show_default=True, help='Random seed.')
+@click.option('--chunk-size', type=int, default=50000, show_default=True, help='Rows per bulk insert.')
+@click.option('--end', type=click.DateTime(), default=None, help='Time of the last point (default: today 00:00 UTC).')
+@with_appcontext
+def seed_command(departments, kpis_per_department, days, resolution, seed_value, chunk_size, end):
+    """Generate a synthetic catalog and history for load testing."""
+    db.create_all()
+
+    def progress(written, total):
+        click.echo(f'\rInserted {written:,}/{total:,} data points', nl=False, err=True)
+
+    started = time.perf_counter()
+    counts = seed_data(departments, kpis_per_department, days, resolution, seed_value, chunk_size, end, progress)
+    elapsed = time.perf_counter() - started
+    click.echo(err=True)
+    click.echo(f'Seeded {counts[0]} departments, {counts[1]} KPIs and {counts[2]:,} data points '
+               f'in {elapsed:.1f}s ({counts[2] / elapsed * 60:,.0f} rows/min)')
@@ -0,0 +1,52 @@
+"""Gunicorn settings: gunicorn -c gunicorn.conf.py
+
+The app is preloaded in the master (see app.preload) and forked into
+workers, so code and read-only caches are built once and shared
+copy-on-write. Each worker drops the inherited connection pools before
+serving.
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# sync, gthread (threads per worker) or gevent (greenlets per worker)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# More than one thread turns sync workers into gthread ones
+threads = int(os.environ.get('GUNICORN_THREADS', 4 if worker_class == 'gthread' else 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+if worker_class == 'gevent':
+    # Patch before the app and its drivers are imported into the master;
+    # the worker patching again after fork is too late for preloaded code.
+    from gevent import monkey
+    monkey.patch_all()
+
+# Metrics are summed across workers from files in this directory, which must
+# be set before prometheus_client is first imported (by the preloaded app).
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='kpi-metrics-'))
+
+# Rate limit buckets, concurrency slots and page fragment versions shared by
+# all workers
+_shared_dir = tempfile.mkdtemp(prefix='kpi-shared-')
+os.environ.setdefault('RATE_LIMIT_STORAGE', os.path.join(_shared_dir, 'limits'))
+os.environ.setdefault('FRAGMENT_CACHE_VERSIONS', os.path.join(_shared_dir, 'fragment-versions'))
+
+def post_fork(server, worker):
+    # Without preload the app isn't loaded yet and there is nothing to drop
+    wsgi = sys.modules.get('wsgi')
+    if wsgi is not None:
+        from database.engines import dispose_engines
+        dispose_engines(wsgi.app)
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges
+    from monitoring.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
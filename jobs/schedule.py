@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+# minute, hour, day of month, month, day of week (0 = Sunday; 7 is accepted too)
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+class CronExpression:
+    """A five-field cron expression: `*`, lists, ranges and `/step`"""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'Cron expression needs 5 fields: {expression!r}')
+
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            parse_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELDS)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        # Like cron: if both day fields are restricted, either may match
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def day_matches(self, moment):
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.isoweekday() % 7) in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment):
+        """First matching minute strictly after `moment`"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+
+        while candidate < limit:
+            if candidate.month not in self.months:
+                year, month = divmod(candidate.month, 12)
+                candidate = datetime(candidate.year + year, month + 1, 1)
+            elif not self.day_matches(candidate):
+                candidate = datetime(candidate.year, candidate.month, candidate.day) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+
+        raise ValueError(f'Cron expression never matches: {self.expression!r}')
+
+def parse_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+            if step < 1:
+                raise ValueError(f'Invalid cron step: {field!r}')
+
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(bound) for bound in part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+
+        if not low <= start <= end <= high:
+            raise ValueError(f'Cron field out of range: {field!r}')
+        values.update(range(start, end + 1, step))
+    return values
+
+def next_run(job, after):
+    """When a job is next due, given it last became due at `after`"""
+    if job.cron:
+        return CronExpression(job.cron).next_after(after)
+    if job.interval_seconds:
+        return after + timedelta(seconds=job.interval_seconds)
+    raise ValueError(f'Job {job.name} has neither an interval nor a cron schedule')
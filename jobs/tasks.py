@@ -0,0 +1,71 @@
+from flask import current_app
+
+TASKS = {}
+
+def task(name):
+    """Register a function as a job task; it runs inside an app context"""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+@task('powerbi_sync')
+def powerbi_sync():
+    from powerbi.integration import sync_kpi_data_to_powerbi
+    return f'{sync_kpi_data_to_powerbi()} rows pushed'
+
+@task('daily_rollup')
+def daily_rollup():
+    from database.rollup import rollup_daily_summaries
+    from powerbi.integration import sync_daily_summaries_to_powerbi
+
+    written = rollup_daily_summaries(current_app.config.get('KPI_DAILY_ROLLUP_DAYS', 2))
+    return f'{written} summaries recomputed, {sync_daily_summaries_to_powerbi()} pushed'
+
+@task('retention')
+def retention():
+    from database.retention import apply_retention, archive_dir, plan_retention
+
+    plans = plan_retention(current_app.config.get('KPI_DATA_RETENTION_DAYS'))
+    if not plans:
+        return 'no retention policy configured'
+
+    removed = apply_retention(plans, archive_dir(), current_app.config.get('KPI_DATA_RETENTION_BATCH_SIZE', 1000))
+    return f'{removed} rows archived'
+
+@task('partition_roll')
+def partition_roll():
+    from database.partitions import partitioning_enabled, roll_partitions
+
+    if not partitioning_enabled():
+        return 'partitioning disabled'
+    return f'{len(roll_partitions())} months rolled'
+
+@task('export_snapshot')
+def export_snapshot():
+    """Append new rows to the CSV export snapshot and rewrite segments that changed"""
+    snapshot = current_app.extensions.get('export_snapshot')
+    if snapshot is None:
+        return 'export snapshot disabled'
+    return f'{snapshot.refresh(verify=True)} rows written'
+
+@task('history_compact')
+def history_compact():
+    """Rebuild the KPI history files, dropping points retention has deleted"""
+    from database.history import compact_history
+
+    store = current_app.extensions.get('history_store')
+    if store is None:
+        return 'history store disabled'
+    return f'{compact_history(store)} points written'
+
+# Jobs created by `flask worker` when missing. Edits made to a job's row
+# afterwards (schedule, timeout, enabled) are kept across restarts.
+DEFAULT_JOBS = [
+    {'name': 'powerbi_sync', 'task': 'powerbi_sync', 'interval_seconds': 300, 'timeout_seconds': 1800},
+    {'name': 'daily_rollup', 'task': 'daily_rollup', 'interval_seconds': 900, 'timeout_seconds': 1800},
+    {'name': 'retention', 'task': 'retention', 'cron': '30 2 * * *', 'timeout_seconds': 3 * 3600},
+    {'name': 'partition_roll', 'task': 'partition_roll', 'cron': '15 3 1 * *', 'timeout_seconds': 3 * 3600},
+    {'name': 'export_snapshot', 'task': 'export_snapshot', 'interval_seconds': 900, 'timeout_seconds': 1800},
+    {'name': 'history_compact', 'task': 'history_compact', 'cron': '0 4 * * *', 'timeout_seconds': 3 * 3600}
+]
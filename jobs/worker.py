@@ -0,0 +1,286 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import or_, update
+
+from database.database import db
+from database.engines import dispose_engines
+from models import Job, JobRun
+from .schedule import next_run
+from .tasks import DEFAULT_JOBS, TASKS
+
+# How long a lease outlives its job's timeout. Past this, a worker that died
+# mid-run no longer blocks the job.
+LEASE_GRACE_SECONDS = 60
+
+# The app the pool processes run tasks in. Forked processes inherit it;
+# spawned ones import the module-level app.
+_worker_app = None
+
+class JobTimeout(Exception):
+    """Raised inside a pool process when a job runs past its timeout"""
+
+def _raise_timeout(signum, frame):
+    raise JobTimeout()
+
+def _init_process():
+    """Drop database connections inherited from the scheduler process"""
+    dispose_engines(_get_app())
+
+def _get_app():
+    global _worker_app
+    if _worker_app is None:
+        from app import app
+        _worker_app = app
+    return _worker_app
+
+def execute(task_name, timeout):
+    """Run one task in a pool process; returns (status, result, error)"""
+    use_alarm = bool(timeout) and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    try:
+        with _get_app().app_context():
+            result = TASKS[task_name]()
+        return 'succeeded', None if result is None else str(result), None
+    except JobTimeout:
+        return 'timeout', None, f'Timed out after {timeout}s'
+    except Exception:
+        return 'failed', None, traceback.format_exc()
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+def ensure_default_jobs(now=None):
+    """Create the built-in jobs that are missing from the jobs table"""
+    now = now or datetime.utcnow()
+    existing = {name for (name,) in db.session.query(Job.name)}
+
+    created = []
+    for spec in DEFAULT_JOBS:
+        if spec['name'] not in existing:
+            job = Job(next_run_at=now, **spec)
+            db.session.add(job)
+            created.append(job)
+    db.session.commit()
+    return created
+
+def claim(job, owner, now):
+    """Take a due job's lease and schedule its next run.
+
+    The conditional UPDATE is the lock: of several workers racing for the
+    same job, only one sees a row updated.
+    """
+    following = next_run(job, job.next_run_at or now)
+    if following <= now:
+        following = next_run(job, now)
+
+    result = db.session.execute(
+        update(Job)
+        .where(
+            Job.id == job.id,
+            Job.enabled.is_(True),
+            Job.next_run_at <= now,
+            or_(Job.lease_owner.is_(None), Job.lease_expires_at < now)
+        )
+        .values(
+            lease_owner=owner,
+            lease_expires_at=now + timedelta(seconds=job.timeout_seconds + LEASE_GRACE_SECONDS),
+            next_run_at=following
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        return None
+
+    # A run still marked running lost its worker: its lease had expired.
+    JobRun.query.filter_by(job_id=job.id, status='running')\
+        .update({'status': 'abandoned', 'finished_at': now}, synchronize_session=False)
+
+    run = JobRun(job_id=job.id, worker=owner, status='running', started_at=now)
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+class Worker:
+    """Runs due jobs in a process pool, one instance per job across workers"""
+
+    def __init__(self, app, processes=2, poll_interval=5.0):
+        self.app = app
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.running = {}
+        self.executor = None
+        self.stopping = False
+
+    def start(self):
+        global _worker_app
+        _worker_app = self.app
+
+        context = None
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+        self.executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=context,
+                                            initializer=_init_process)
+
+    def tick(self, now=None, due_by=None):
+        """Record finished runs and start the jobs due by `due_by` (default now)"""
+        now = now or datetime.utcnow()
+        due_by = min(due_by or now, now)
+        self.collect()
+
+        started = []
+        due = Job.query\
+            .filter(Job.enabled.is_(True), Job.next_run_at <= due_by)\
+            .order_by(Job.next_run_at)\
+            .all()
+        busy = {job_id for job_id, _, _ in self.running.values()}
+
+        for job in due:
+            # Jobs only leave the table once a process is free, so a queued
+            # job never sits holding a lease.
+            if len(self.running) >= self.processes:
+                break
+            if job.id in busy or job.task not in TASKS:
+                continue
+
+            run = claim(job, self.owner, now)
+            if run is None:
+                continue
+
+            future = self.executor.submit(execute, job.task, job.timeout_seconds)
+            deadline = time.monotonic() + job.timeout_seconds + LEASE_GRACE_SECONDS
+            self.running[run.id] = (job.id, future, deadline)
+            started.append(run)
+
+        db.session.commit()
+        return started
+
+    def collect(self):
+        """Store the outcome of runs whose process has finished"""
+        for run_id, (job_id, future, deadline) in list(self.running.items()):
+            if future.done():
+                try:
+                    status, result, error = future.result()
+                except Exception:
+                    status, result, error = 'failed', None, traceback.format_exc()
+                self.finish(run_id, status, result, error, release=True)
+            elif time.monotonic() > deadline:
+                # The process ignored its timeout (stuck outside Python code).
+                # Keep the lease so the job is not started twice; it expires
+                # on its own once the grace period is over.
+                self.finish(run_id, 'timeout', None, 'No result within the job timeout', release=False)
+            else:
+                continue
+            del self.running[run_id]
+
+    def finish(self, run_id, status, result, error, release):
+        run = db.session.get(JobRun, run_id)
+        run.status = status
+        run.result = result
+        run.error = error
+        run.finished_at = datetime.utcnow()
+
+        job = run.job
+        job.last_run_at = run.started_at
+        job.last_status = status
+        if release and job.lease_owner == self.owner:
+            job.lease_owner = None
+            job.lease_expires_at = None
+        db.session.commit()
+
+        click.echo(f'{run.finished_at:%Y-%m-%d %H:%M:%S} {job.name}: {status}' + (f' ({result})' if result else ''))
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def run(self, once=False):
+        """Schedule until stopped; with `once`, run the jobs due now and return"""
+        self.start()
+        handlers = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+        due_by = datetime.utcnow() if once else None
+
+        try:
+            while not self.stopping:
+                started = self.tick(due_by=due_by)
+                if once and not started and not self.running:
+                    break
+                time.sleep(0.1 if once else self.poll_interval)
+        finally:
+            self.executor.shutdown(wait=True)
+            self.collect()
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+@click.command('worker')
+@click.option('--processes', type=int, default=None, help='Jobs run at the same time (WORKER_PROCESSES).')
+@click.option('--poll-interval', type=float, default=None, help='Seconds between schedule checks.')
+@click.option('--once', is_flag=True, help='Run the jobs that are due now, wait for them and exit.')
+@with_appcontext
+def worker_command(processes, poll_interval, once):
+    """Run scheduled background jobs."""
+    processes = processes or current_app.config.get('WORKER_PROCESSES', 2)
+    poll_interval = poll_interval or current_app.config.get('WORKER_POLL_INTERVAL', 5)
+
+    for job in ensure_default_jobs():
+        click.echo(f'Created job {job.name} ({job.schedule})')
+
+    worker = Worker(current_app._get_current_object(), processes, poll_interval)
+    click.echo(f'Worker {worker.owner} running {processes} processes')
+    worker.run(once=once)
+
+@click.group('jobs')
+def jobs_cli():
+    """Inspect and trigger background jobs."""
+
+@jobs_cli.command('list')
+@with_appcontext
+def list_command():
+    """List jobs with their schedule and last outcome."""
+    for job in Job.query.order_by(Job.name):
+        state = 'enabled' if job.enabled else 'disabled'
+        click.echo(f'{job.name}: {job.schedule}, {state}, next {job.next_run_at:%Y-%m-%d %H:%M:%S}, '
+                   f'last {job.last_status or "never run"}')
+
+@jobs_cli.command('history')
+@click.argument('name')
+@click.option('--limit', type=int, default=20, help='Runs to show.')
+@with_appcontext
+def history_command(name, limit):
+    """Show the latest runs of a job."""
+    job = Job.query.filter_by(name=name).first()
+    if job is None:
+        raise click.ClickException(f'Unknown job: {name}')
+
+    for run in job.runs.order_by(JobRun.id.desc()).limit(limit):
+        duration = f'{run.duration:.1f}s' if run.duration is not None else '-'
+        click.echo(f'{run.started_at:%Y-%m-%d %H:%M:%S} {run.status} {duration} {run.result or ""}')
+        if run.error:
+            click.echo(run.error.rstrip().splitlines()[-1])
+
+@jobs_cli.command('trigger')
+@click.argument('name')
+@with_appcontext
+def trigger_command(name):
+    """Make a job due now."""
+    job = Job.query.filter_by(name=name).first()
+    if job is None:
+        raise click.ClickException(f'Unknown job: {name}')
+
+    job.next_run_at = datetime.utcnow()
+    db.session.commit()
+    click.echo(f'{name} will run on the next worker tick')
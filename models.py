@@ -1,5 +1,12 @@
 from database.database import db
 from datetime import datetime
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.ext.hybrid import hybrid_property
+
+PERFORMANCE_STATUSES = (
+    'Above Target', 'Below Target', 'On Target', 'Off Target', 'No Target Set', 'Unknown'
+)
+TARGET_TYPES = ('higher_better', 'lower_better')
 
 class Department(db.Model):
     """Department model"""
@@ -17,7 +24,7 @@ class Department(db.Model):
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'created_at': self.created_at,
             'kpi_count': len(self.kpis)
         }
 
@@ -33,8 +40,11 @@ class KPI(db.Model):
     department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    retention_days = db.Column(db.Integer)
 
     kpi_data = db.relationship('KPIData', backref='kpi', lazy=True, cascade='all, delete-orphan')
+    daily_summaries = db.relationship('KPIDataDaily', backref='kpi', lazy=True, cascade='all, delete-orphan')
+    latest = db.relationship('KPILatest', backref='kpi', uselist=False, lazy=True, cascade='all, delete-orphan')
     
     def to_dict(self):
         return {
@@ -45,7 +55,7 @@ class KPI(db.Model):
             'target_type': self.target_type,
             'department_id': self.department_id,
             'department_name': self.department.name if self.department else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'created_at': self.created_at,
             'is_active': self.is_active,
             'data_points': len(self.kpi_data)
         }
@@ -53,12 +63,15 @@ class KPI(db.Model):
 class KPIData(db.Model):
     """KPI data points model"""
     __tablename__ = 'kpi_data'
+    __table_args__ = (
+        db.Index('ix_kpi_data_kpi_id_timestamp', 'kpi_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     kpi_id = db.Column(db.Integer, db.ForeignKey('kpis.id'), nullable=False)
     value = db.Column(db.Float, nullable=False)
     target = db.Column(db.Float)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     period = db.Column(db.String(20), default='daily')
     notes = db.Column(db.Text)
     created_by = db.Column(db.String(100))
@@ -71,13 +84,29 @@ class KPIData(db.Model):
             'department_name': self.kpi.department.name if self.kpi and self.kpi.department else None,
             'value': self.value,
             'target': self.target,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'timestamp': self.timestamp,
             'period': self.period,
             'notes': self.notes,
             'created_by': self.created_by,
             'performance_status': self.get_performance_status()
         }
     
+    @hybrid_property
+    def performance_status(self):
+        """Performance status, usable both on instances and in queries"""
+        return self.get_performance_status()
+    
+    @performance_status.expression
+    def performance_status(cls):
+        # Correlate against kpi_data only, so the lookup still works in queries
+        # that already join kpis (the exports do).
+        target_type = select(func.coalesce(KPI.target_type, ''))\
+            .where(KPI.id == cls.kpi_id)\
+            .correlate_except(KPI)\
+            .scalar_subquery()
+        
+        return performance_status_case(cls.value, cls.target, target_type, target_type.is_not(None))
+    
     def get_performance_status(self):
         """Calculate performance status based on value vs target"""
         if not self.target:
@@ -85,16 +114,204 @@ class KPIData(db.Model):
         
         if not self.kpi:
             return 'Unknown'
-            
-        if self.kpi.target_type == 'higher_better':
-            if self.value >= self.target:
-                return 'Above Target'
-            else:
-                return 'Below Target'
-        elif self.kpi.target_type == 'lower_better':
-            if self.value <= self.target:
-                return 'Above Target'
-            else:
-                return 'Below Target'
+        
+        return performance_status_for(self.value, self.target, self.kpi.target_type)
+
+class KPIDataDaily(db.Model):
+    """Per-day summary of KPI data points"""
+    __tablename__ = 'kpi_data_daily'
+    __table_args__ = (
+        db.UniqueConstraint('kpi_id', 'day', name='uq_kpi_data_daily_kpi_day'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kpi_id = db.Column(db.Integer, db.ForeignKey('kpis.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    value_sum = db.Column(db.Float, nullable=False, default=0)
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+    last_value = db.Column(db.Float)
+    last_target = db.Column(db.Float)
+    last_timestamp = db.Column(db.DateTime)
+    above_target_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    @property
+    def avg_value(self):
+        return self.value_sum / self.count if self.count else None
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kpi_id': self.kpi_id,
+            'day': self.day,
+            'count': self.count,
+            'avg_value': self.avg_value,
+            'min_value': self.min_value,
+            'max_value': self.max_value,
+            'last_value': self.last_value,
+            'last_target': self.last_target,
+            'above_target_share': self.above_target_count / self.count if self.count else None
+        }
+
+class KPILatest(db.Model):
+    """Newest data point of each KPI, upserted whenever points are inserted"""
+    __tablename__ = 'kpi_latest'
+    
+    kpi_id = db.Column(db.Integer, db.ForeignKey('kpis.id'), primary_key=True)
+    data_id = db.Column(db.Integer, nullable=False)
+    value = db.Column(db.Float, nullable=False)
+    target = db.Column(db.Float)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    period = db.Column(db.String(20))
+    
+    def to_dict(self):
+        return {
+            'kpi_id': self.kpi_id,
+            'data_id': self.data_id,
+            'value': self.value,
+            'target': self.target,
+            'timestamp': self.timestamp,
+            'period': self.period
+        }
+
+class KPIDataPartition(db.Model):
+    """A month of kpi_data moved out of the main table into its own partition"""
+    __tablename__ = 'kpi_data_partitions'
+    
+    month = db.Column(db.String(7), primary_key=True)
+    path = db.Column(db.String(500))
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    min_id = db.Column(db.Integer)
+    max_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'month': self.month,
+            'path': self.path,
+            'row_count': self.row_count,
+            'min_id': self.min_id,
+            'max_id': self.max_id,
+            'created_at': self.created_at
+        }
+
+class PowerBISyncCheckpoint(db.Model):
+    """Highest KPIData id (or, for daily tables, day) pushed to a Power BI dataset table"""
+    __tablename__ = 'powerbi_sync_checkpoints'
+    __table_args__ = (
+        db.UniqueConstraint('dataset_id', 'table_name', name='uq_powerbi_sync_checkpoint_target'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.String(100), nullable=False)
+    table_name = db.Column(db.String(100), nullable=False)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    last_day = db.Column(db.Date)
+    rows_pushed = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Job(db.Model):
+    """A periodic background job run by `flask worker`"""
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+    task = db.Column(db.String(100), nullable=False)
+    interval_seconds = db.Column(db.Integer)
+    cron = db.Column(db.String(100))
+    timeout_seconds = db.Column(db.Integer, nullable=False, default=3600)
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    next_run_at = db.Column(db.DateTime, index=True)
+    lease_owner = db.Column(db.String(200))
+    lease_expires_at = db.Column(db.DateTime)
+    last_run_at = db.Column(db.DateTime)
+    last_status = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    runs = db.relationship('JobRun', backref='job', lazy='dynamic', cascade='all, delete-orphan')
+    
+    @property
+    def schedule(self):
+        return f'cron {self.cron}' if self.cron else f'every {self.interval_seconds}s'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'task': self.task,
+            'schedule': self.schedule,
+            'timeout_seconds': self.timeout_seconds,
+            'enabled': self.enabled,
+            'next_run_at': self.next_run_at,
+            'lease_owner': self.lease_owner,
+            'last_run_at': self.last_run_at,
+            'last_status': self.last_status
+        }
+
+class JobRun(db.Model):
+    """One execution of a background job"""
+    __tablename__ = 'job_runs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('jobs.id'), nullable=False, index=True)
+    worker = db.Column(db.String(200))
+    status = db.Column(db.String(20), nullable=False, default='running')
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    
+    @property
+    def duration(self):
+        if self.started_at and self.finished_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_id': self.job_id,
+            'worker': self.worker,
+            'status': self.status,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'duration': self.duration,
+            'result': self.result,
+            'error': self.error
+        }
+
+def performance_status_case(value, target, target_type, kpi_exists):
+    """SQL CASE mirroring performance_status_for over column expressions
+    
+    Queries that already join kpis pass KPI.target_type and a KPI.id check
+    instead of the correlated lookup the hybrid property uses.
+    """
+    return case(
+        (or_(target.is_(None), target == 0), 'No Target Set'),
+        (~kpi_exists, 'Unknown'),
+        (and_(target_type == 'higher_better', value >= target), 'Above Target'),
+        (target_type == 'higher_better', 'Below Target'),
+        (and_(target_type == 'lower_better', value <= target), 'Above Target'),
+        (target_type == 'lower_better', 'Below Target'),
+        (value == target, 'On Target'),
+        else_='Off Target'
+    )
+
+def performance_status_for(value, target, target_type):
+    """Performance status for a value/target pair under a KPI target type"""
+    if not target:
+        return 'No Target Set'
+    
+    if target_type == 'higher_better':
+        if value >= target:
+            return 'Above Target'
+        else:
+            return 'Below Target'
+    elif target_type == 'lower_better':
+        if value <= target:
+            return 'Above Target'
         else:
-            return 'On Target' if self.value == self.target else 'Off Target'
\ No newline at end of file
+            return 'Below Target'
+    else:
+        return 'On Target' if value == target else 'Off Target'
\ No newline at end of file
@@ -0,0 +1,159 @@
+import logging
+import os
+import time
+import weakref
+
+from flask import Response, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+
+from database.database import db
+
+slow_query_log = logging.getLogger('kpi.slow_query')
+
+# With PROMETHEUS_MULTIPROC_DIR set (gunicorn), every worker writes its
+# samples to files in that directory and /metrics adds them up.
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+REQUEST_COUNT = Counter(
+    'kpi_http_requests_total', 'HTTP requests by route and status',
+    ['method', 'route', 'status']
+)
+REQUEST_LATENCY = Histogram(
+    'kpi_http_request_duration_seconds', 'HTTP request latency',
+    ['method', 'route'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    'kpi_http_requests_in_progress', 'HTTP requests being served',
+    ['method', 'route'],
+    multiprocess_mode='livesum'
+)
+REQUEST_QUERIES = Histogram(
+    'kpi_sql_queries_per_request', 'SQL statements executed per HTTP request',
+    ['route'],
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+)
+REQUEST_SQL_TIME = Histogram(
+    'kpi_sql_seconds_per_request', 'Time spent in SQL per HTTP request',
+    ['route'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+QUERY_LATENCY = Histogram(
+    'kpi_sql_statement_duration_seconds', 'SQL statement latency by operation',
+    ['operation'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+
+# Per-request timings live in the WSGI environ, which lasts exactly as long
+# as the request, teardown included.
+REQUEST_STATE = 'kpi.metrics'
+
+def route_label():
+    """The matched URL rule, so /api/kpi/1 and /api/kpi/2 share a series"""
+    if request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unmatched'
+
+def record_statement(statement, elapsed, slow_query_seconds):
+    operation = statement.split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+    QUERY_LATENCY.labels(operation).observe(elapsed)
+
+    route = None
+    state = request.environ.get(REQUEST_STATE) if has_request_context() else None
+    if state is not None:
+        state['sql_count'] += 1
+        state['sql_time'] += elapsed
+        route = state['route']
+
+    if slow_query_seconds is not None and elapsed >= slow_query_seconds:
+        slow_query_log.warning(
+            'Slow query (%.1f ms) on %s: %s',
+            elapsed * 1000, route or 'no request', ' '.join(statement.split())[:2000]
+        )
+
+_instrumented = weakref.WeakSet()
+
+def instrument_engine(engine, slow_query_ms=None):
+    """Time every statement run on an engine; log those over `slow_query_ms`"""
+    if engine in _instrumented:
+        return
+    _instrumented.add(engine)
+    slow_query_seconds = slow_query_ms / 1000 if slow_query_ms else None
+
+    # The start time lives on the statement's execution context, so a
+    # statement that raises leaves nothing behind on the pooled connection
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.kpi_query_started = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'kpi_query_started', None)
+        if started is not None:
+            record_statement(statement, time.perf_counter() - started, slow_query_seconds)
+
+    @event.listens_for(engine, 'handle_error')
+    def stop_failed_timer(exception_context):
+        # Failed statements (timeouts among them) are timed too
+        context = exception_context.execution_context
+        started = getattr(context, 'kpi_query_started', None)
+        if started is not None and exception_context.statement:
+            del context.kpi_query_started
+            record_statement(exception_context.statement, time.perf_counter() - started, slow_query_seconds)
+
+def start_request():
+    if request.path == '/metrics':
+        return
+    state = request.environ[REQUEST_STATE] = {
+        'route': route_label(),
+        'started': time.perf_counter(),
+        'sql_count': 0,
+        'sql_time': 0.0
+    }
+    REQUESTS_IN_PROGRESS.labels(request.method, state['route']).inc()
+
+def record_response(response):
+    state = request.environ.get(REQUEST_STATE)
+    if state is not None:
+        route = state['route']
+        REQUEST_COUNT.labels(request.method, route, response.status_code).inc()
+        REQUEST_LATENCY.labels(request.method, route).observe(time.perf_counter() - state['started'])
+        REQUEST_QUERIES.labels(route).observe(state['sql_count'])
+        REQUEST_SQL_TIME.labels(route).observe(state['sql_time'])
+    return response
+
+def end_request(exc=None):
+    state = request.environ.pop(REQUEST_STATE, None)
+    if state is not None:
+        REQUESTS_IN_PROGRESS.labels(request.method, state['route']).dec()
+
+def metrics_view():
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+def init_metrics(app):
+    """Collect request and SQL metrics for an app and serve them at /metrics"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    with app.app_context():
+        for engine in db.engines.values():
+            instrument_engine(engine, app.config.get('SLOW_QUERY_THRESHOLD_MS'))
+
+    app.before_request(start_request)
+    app.after_request(record_response)
+    app.teardown_request(end_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+def mark_process_dead(pid):
+    """Drop a finished gunicorn worker's live gauges (call from child_exit)"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
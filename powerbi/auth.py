@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+
+import msal
+
+from config import Config
+
+class TokenError(Exception):
+    """Raised when Azure AD does not issue a token"""
+
+class TokenProvider:
+    """Client-credential tokens for one app registration.
+
+    Holds one msal ConfidentialClientApplication and a SerializableTokenCache,
+    optionally persisted to `cache_path` so a restarted process reuses a
+    still-valid token. Tokens are renewed `refresh_margin` seconds before
+    they expire, and `refresh()` replaces a token the API has rejected.
+    """
+
+    def __init__(self, client_id, client_secret, authority, scope, cache_path=None,
+                 refresh_margin=300, http_client=None, clock=time.time):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.authority = authority
+        self.scope = scope
+        self.cache_path = cache_path
+        self.refresh_margin = refresh_margin
+        self.http_client = http_client
+        self.clock = clock
+        self.access_token = None
+        self.expires_at = 0
+        self.lock = threading.Lock()
+        self.cache = msal.SerializableTokenCache()
+        self._app = None
+
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                self.cache.deserialize(f.read())
+
+    @property
+    def app(self):
+        # Built on first use: msal fetches the tenant's OpenID configuration
+        # when the application is constructed.
+        if self._app is None:
+            self._app = msal.ConfidentialClientApplication(
+                self.client_id,
+                authority=self.authority,
+                client_credential=self.client_secret,
+                token_cache=self.cache,
+                http_client=self.http_client
+            )
+        return self._app
+
+    def fresh(self):
+        return self.access_token is not None and self.clock() < self.expires_at - self.refresh_margin
+
+    def token(self):
+        """A token valid for at least `refresh_margin` more seconds"""
+        with self.lock:
+            if not self.fresh():
+                # A token we were holding is about to expire; don't let msal
+                # hand the same one back from its cache.
+                self.acquire(force=self.access_token is not None)
+            return self.access_token
+
+    def refresh(self, rejected_token):
+        """Replace a token the API answered 401 to, once per rejected token"""
+        with self.lock:
+            if self.access_token == rejected_token or not self.fresh():
+                self.acquire(force=True)
+            return self.access_token
+
+    def acquire(self, force=False):
+        if force:
+            self.drop_cached_tokens()
+
+        result = self.app.acquire_token_for_client(scopes=self.scope)
+        if "access_token" in result and not force and result.get("expires_in", 0) <= self.refresh_margin:
+            self.drop_cached_tokens()
+            result = self.app.acquire_token_for_client(scopes=self.scope)
+
+        if "access_token" not in result:
+            raise TokenError(result.get("error_description", "Unknown error"))
+
+        self.access_token = result["access_token"]
+        self.expires_at = self.clock() + int(result.get("expires_in", 0))
+        self.save()
+
+    def drop_cached_tokens(self):
+        for token in self.cache.find(msal.TokenCache.CredentialType.ACCESS_TOKEN):
+            self.cache.remove_at(token)
+
+    def save(self):
+        if not self.cache_path or not self.cache.has_state_changed:
+            return
+
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.cache_path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.cache.serialize())
+        os.replace(tmp_path, self.cache_path)
+        self.cache.has_state_changed = False
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+def get_token_provider(http_client=None):
+    """The process-wide token provider for the configured app registration"""
+    key = (Config.POWERBI_CLIENT_ID, Config.POWERBI_TENANT_ID, Config.POWERBI_TOKEN_CACHE_PATH)
+
+    with _providers_lock:
+        if key not in _providers:
+            _providers[key] = TokenProvider(
+                Config.POWERBI_CLIENT_ID,
+                Config.POWERBI_CLIENT_SECRET,
+                f"https://login.microsoftonline.com/{Config.POWERBI_TENANT_ID}",
+                ["https://analysis.windows.net/powerbi/api/.default"],
+                cache_path=Config.POWERBI_TOKEN_CACHE_PATH,
+                refresh_margin=Config.POWERBI_TOKEN_REFRESH_MARGIN,
+                http_client=http_client
+            )
+        return _providers[key]
@@ -1,55 +1,50 @@
-import requests
-import msal
 from config import Config
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
+from powerbi.auth import get_token_provider
+from powerbi.push import PushPipeline
 
 class PowerBIIntegration:
     """Power BI integration for pushing KPI data"""
     
-    def __init__(self):
-        self.client_id = Config.POWERBI_CLIENT_ID
-        self.client_secret = Config.POWERBI_CLIENT_SECRET
-        self.tenant_id = Config.POWERBI_TENANT_ID
+    def __init__(self, token_provider=None):
         self.workspace_id = Config.POWERBI_WORKSPACE_ID
-        self.authority = f"https://login.microsoftonline.com/{self.tenant_id}"
-        self.scope = ["https://analysis.windows.net/powerbi/api/.default"]
+        self.api_url = Config.POWERBI_API_URL
+        self.tokens = token_provider or get_token_provider()
         self.access_token = None
+        self.pipeline = PushPipeline(
+            max_rows_per_request=Config.POWERBI_MAX_ROWS_PER_REQUEST,
+            requests_per_minute=Config.POWERBI_REQUESTS_PER_MINUTE,
+            max_workers=Config.POWERBI_PUSH_WORKERS
+        )
     
     def get_access_token(self):
         """Get access token for Power BI API"""
         try:
-            app = msal.ConfidentialClientApplication(
-                self.client_id,
-                authority=self.authority,
-                client_credential=self.client_secret
-            )
-            
-            result = app.acquire_token_for_client(scopes=self.scope)
-            
-            if "access_token" in result:
-                self.access_token = result["access_token"]
-                return True
-            else:
-                print(f"Error acquiring token: {result.get('error_description', 'Unknown error')}")
-                return False
-        
+            self.access_token = self.tokens.token()
+            return True
         except Exception as e:
             print(f"Exception in get_access_token: {str(e)}")
             return False
     
-    def create_dataset(self, dataset_name, table_schema):
-        """Create a dataset in Power BI"""
-        if not self.access_token:
-            if not self.get_access_token():
-                return None
-        
-        url = f"https://api.powerbi.com/v1.0/myorg/groups/{self.workspace_id}/datasets"
-        
-        headers = {
+    def headers(self):
+        """Request headers carrying a token that is not about to expire"""
+        self.access_token = self.tokens.token()
+        return {
             "Authorization": f"Bearer {self.access_token}",
             "Content-Type": "application/json"
         }
+    
+    def refresh_rejected_token(self, sent_headers):
+        """Replace the token a request was rejected with"""
+        self.access_token = self.tokens.refresh(sent_headers["Authorization"].split(" ", 1)[1])
+    
+    def create_dataset(self, dataset_name, table_schema):
+        """Create a dataset in Power BI"""
+        if not self.get_access_token():
+            return None
+        
+        url = f"{self.api_url}/groups/{self.workspace_id}/datasets"
         
         dataset_definition = {
             "name": dataset_name,
@@ -57,7 +52,12 @@ class PowerBIIntegration:
         }
         
         try:
-            response = requests.post(url, headers=headers, json=dataset_definition)
+            headers = self.headers()
+            response = self.pipeline.session.post(url, headers=headers, json=dataset_definition)
+            
+            if response.status_code == 401:
+                self.refresh_rejected_token(headers)
+                response = self.pipeline.session.post(url, headers=self.headers(), json=dataset_definition)
             
             if response.status_code == 201:
                 return response.json()
@@ -71,31 +71,28 @@ class PowerBIIntegration:
     
     def push_data_to_powerbi(self, dataset_id, table_name, data):
         """Push data to Power BI dataset"""
-        if not self.access_token:
-            if not self.get_access_token():
-                return False
-        
-        url = f"https://api.powerbi.com/v1.0/myorg/groups/{self.workspace_id}/datasets/{dataset_id}/tables/{table_name}/rows"
-        
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json"
-        }
+        result = self.push_rows(dataset_id, table_name, data)
+        return result is not None and result.ok
+    
+    def push_rows(self, dataset_id, table_name, data, in_order=False):
+        """Push rows in API-sized chunks and return the PushResult"""
+        if not self.get_access_token():
+            return None
         
-        payload = {"rows": data}
+        url = f"{self.api_url}/groups/{self.workspace_id}/datasets/{dataset_id}/tables/{table_name}/rows"
         
         try:
-            response = requests.post(url, headers=headers, json=payload)
-            
-            if response.status_code == 200:
-                return True
-            else:
-                print(f"Error pushing data: {response.status_code} - {response.text}")
-                return False
-        
+            result = self.pipeline.push(url, data, self.headers, on_unauthorized=self.refresh_rejected_token,
+                                        in_order=in_order)
         except Exception as e:
-            print(f"Exception in push_data_to_powerbi: {str(e)}")
-            return False
+            print(f"Exception in push_rows: {str(e)}")
+            return None
+        
+        print(f"Power BI push: {result.summary()}")
+        for index, error in sorted(result.failed_chunks.items()):
+            print(f"Error pushing chunk {index}: {error}")
+        
+        return result
     
     def get_kpi_table_schema(self):
         """Get table schema for KPI data"""
@@ -114,46 +111,245 @@ class PowerBIIntegration:
             ]
         }
     
-    def format_kpi_data_for_powerbi(self, kpi_data_list):
-        """Format KPI data for Power BI consumption"""
-        formatted_data = []
-        
-        for kpi_data in kpi_data_list:
-            formatted_data.append({
-                "ID": kpi_data.id,
-                "KPIName": kpi_data.kpi.name if kpi_data.kpi else "Unknown",
-                "Department": kpi_data.kpi.department.name if kpi_data.kpi and kpi_data.kpi.department else "Unknown",
-                "Value": kpi_data.value,
-                "Target": kpi_data.target or 0,
-                "Timestamp": kpi_data.timestamp.isoformat() if kpi_data.timestamp else datetime.utcnow().isoformat(),
-                "Period": kpi_data.period,
-                "PerformanceStatus": kpi_data.get_performance_status(),
-                "Unit": kpi_data.kpi.unit if kpi_data.kpi else ""
-            })
+    def get_daily_table_schema(self):
+        """Get table schema for daily KPI summaries"""
+        return {
+            "name": "KPIDaily",
+            "columns": [
+                {"name": "KPIId", "dataType": "Int64"},
+                {"name": "KPIName", "dataType": "string"},
+                {"name": "Department", "dataType": "string"},
+                {"name": "Date", "dataType": "DateTime"},
+                {"name": "Count", "dataType": "Int64"},
+                {"name": "Average", "dataType": "Double"},
+                {"name": "Minimum", "dataType": "Double"},
+                {"name": "Maximum", "dataType": "Double"},
+                {"name": "Last", "dataType": "Double"},
+                {"name": "AboveTargetShare", "dataType": "Double"},
+                {"name": "Unit", "dataType": "string"}
+            ]
+        }
+    
+    def format_kpi_data_for_powerbi(self, rows):
+        """Format KPI data rows from powerbi_rows_query for Power BI consumption"""
+        now = datetime.utcnow().isoformat()
         
-        return formatted_data
+        return [
+            {
+                "ID": data_id,
+                "KPIName": kpi_name if kpi_name is not None else "Unknown",
+                "Department": department_name if department_name is not None else "Unknown",
+                "Value": value,
+                "Target": target or 0,
+                "Timestamp": timestamp.isoformat() if timestamp else now,
+                "Period": period,
+                "PerformanceStatus": status,
+                "Unit": unit if kpi_name is not None else ""
+            }
+            for data_id, kpi_name, department_name, value, target, timestamp, period, status, unit in rows
+        ]
+
+    def format_daily_summaries_for_powerbi(self, rows):
+        """Format daily summary rows from daily_rows_query for Power BI consumption"""
+        return [
+            {
+                "KPIId": kpi_id,
+                "KPIName": kpi_name if kpi_name is not None else "Unknown",
+                "Department": department_name if department_name is not None else "Unknown",
+                "Date": day.isoformat() + "T00:00:00",
+                "Count": count,
+                "Average": value_sum / count if count else None,
+                "Minimum": min_value,
+                "Maximum": max_value,
+                "Last": last_value,
+                "AboveTargetShare": above_target_count / count if count else None,
+                "Unit": unit if kpi_name is not None else ""
+            }
+            for kpi_id, kpi_name, department_name, day, count, value_sum, min_value, max_value, last_value,
+                above_target_count, unit in rows
+        ]
 
-def sync_kpi_data_to_powerbi():
-    """Sync KPI data to Power BI"""
-    from models import KPIData
+def powerbi_rows_query(entity, after_id, limit):
+    """The next `limit` rows after `after_id` as one joined column projection
+    
+    The performance status is computed in SQL from the joined KPI, so no
+    KPI or Department objects are loaded per row.
+    """
+    from models import KPI, Department, performance_status_case
+    from database import db
+    
+    return db.session.query(
+        entity.id,
+        KPI.name.label('kpi_name'),
+        Department.name.label('department_name'),
+        entity.value,
+        entity.target,
+        entity.timestamp,
+        entity.period,
+        performance_status_case(entity.value, entity.target, KPI.target_type, KPI.id.is_not(None)).label('status'),
+        KPI.unit.label('unit')
+    ).select_from(entity)\
+     .outerjoin(KPI, entity.kpi_id == KPI.id)\
+     .outerjoin(Department, KPI.department_id == Department.id)\
+     .filter(entity.id > after_id)\
+     .order_by(entity.id)\
+     .limit(limit)
+
+def sync_kpi_data_to_powerbi(dataset_id=None, table_name="KPIData", batch_size=None):
+    """Push KPI data added since the last successful sync to Power BI
+    
+    Rows are walked in id order, `batch_size` at a time, starting after the
+    checkpoint stored for the dataset table. The checkpoint only advances
+    past chunks Power BI has accepted, so a failed run is resumed by the
+    next one. Returns the number of rows pushed.
+    """
+    from models import KPIData, PowerBISyncCheckpoint
+    from database import db
+    from database.partitions import query_partitions
+    
+    dataset_id = dataset_id or Config.POWERBI_DATASET_ID
+    batch_size = batch_size or Config.POWERBI_SYNC_BATCH_SIZE
+    
+    if not dataset_id:
+        print("No Power BI dataset configured (POWERBI_DATASET_ID)")
+        return 0
+    
+    checkpoint = PowerBISyncCheckpoint.query.filter_by(dataset_id=dataset_id, table_name=table_name).first()
+    if checkpoint is None:
+        checkpoint = PowerBISyncCheckpoint(dataset_id=dataset_id, table_name=table_name, last_id=0, rows_pushed=0)
+        db.session.add(checkpoint)
+        db.session.commit()
     
     powerbi = PowerBIIntegration()
+    pushed = 0
     
-    recent_kpi_data = KPIData.query.order_by(KPIData.timestamp.desc()).limit(1000).all()
+    while True:
+        last_id = checkpoint.last_id
+        batch = query_partitions(
+            lambda entity: powerbi_rows_query(entity, last_id, batch_size),
+            limit=batch_size, sort_key=lambda point: point.id, after_id=last_id
+        )
+        
+        if not batch:
+            break
+        
+        formatted_data = powerbi.format_kpi_data_for_powerbi(batch)
+        # In order, stopping at the first failed chunk: a chunk accepted past
+        # the checkpoint would be appended again by the next run
+        result = powerbi.push_rows(dataset_id, table_name, formatted_data, in_order=True)
+        
+        confirmed = result.confirmed_rows if result is not None else 0
+        if confirmed:
+            checkpoint.last_id = batch[confirmed - 1].id
+            checkpoint.rows_pushed += confirmed
+            db.session.commit()
+            pushed += confirmed
+        
+        if result is None or not result.ok:
+            print(f"Failed to sync data to Power BI after {pushed} data points")
+            return pushed
     
-    if not recent_kpi_data:
+    if pushed:
+        print(f"Successfully synced {pushed} KPI data points to Power BI")
+    else:
         print("No KPI data to sync")
-        return
     
-    formatted_data = powerbi.format_kpi_data_for_powerbi(recent_kpi_data)
+    return pushed
+
+def daily_rows_query(after_day, before_day):
+    """Daily summaries for the days after `after_day` and before `before_day`"""
+    from models import KPI, Department, KPIDataDaily
+    from database import db
     
-    dataset_name = "Enterprise_KPI_Data"
-    table_schema = powerbi.get_kpi_table_schema()
+    query = db.session.query(
+        KPIDataDaily.kpi_id,
+        KPI.name.label('kpi_name'),
+        Department.name.label('department_name'),
+        KPIDataDaily.day,
+        KPIDataDaily.count,
+        KPIDataDaily.value_sum,
+        KPIDataDaily.min_value,
+        KPIDataDaily.max_value,
+        KPIDataDaily.last_value,
+        KPIDataDaily.above_target_count,
+        KPI.unit.label('unit')
+    ).outerjoin(KPI, KPIDataDaily.kpi_id == KPI.id)\
+     .outerjoin(Department, KPI.department_id == Department.id)\
+     .filter(KPIDataDaily.day < before_day)
     
-    dataset_id = "your-dataset-id-here"
-    success = powerbi.push_data_to_powerbi(dataset_id, "KPIData", formatted_data)
+    if after_day is not None:
+        query = query.filter(KPIDataDaily.day > after_day)
     
-    if success:
-        print(f"Successfully synced {len(formatted_data)} KPI data points to Power BI")
-    else:
-        print("Failed to sync data to Power BI")
\ No newline at end of file
+    return query.order_by(KPIDataDaily.day, KPIDataDaily.kpi_id)
+
+def sync_daily_summaries_to_powerbi(dataset_id=None, table_name="KPIDaily", today=None):
+    """Push each settled day's KPI summaries to Power BI once
+    
+    Push tables only take appends, so a day is sent once the rollup no
+    longer recomputes it: KPI_DAILY_ROLLUP_DAYS days after it began (UTC),
+    by which time late points within the rollup window are in its summary.
+    The checkpoint records the last day sent. Requests carry whole days
+    only, so a failure never leaves half a day behind the checkpoint.
+    Points arriving later than the rollup window miss both kpi_data_daily
+    and Power BI. Returns the number of rows pushed.
+    """
+    from models import PowerBISyncCheckpoint
+    from database import db
+    
+    dataset_id = dataset_id or Config.POWERBI_DATASET_ID
+    today = today or datetime.utcnow().date()
+    
+    if not dataset_id:
+        print("No Power BI dataset configured (POWERBI_DATASET_ID)")
+        return 0
+    
+    checkpoint = PowerBISyncCheckpoint.query.filter_by(dataset_id=dataset_id, table_name=table_name).first()
+    if checkpoint is None:
+        checkpoint = PowerBISyncCheckpoint(dataset_id=dataset_id, table_name=table_name, last_id=0, rows_pushed=0)
+        db.session.add(checkpoint)
+        db.session.commit()
+    
+    # Days the rollup may still rewrite are held back
+    settled_before = today - timedelta(days=max(Config.KPI_DAILY_ROLLUP_DAYS, 1) - 1)
+    rows = daily_rows_query(checkpoint.last_day, settled_before).all()
+    if not rows:
+        print("No settled days to sync")
+        return 0
+    
+    powerbi = PowerBIIntegration()
+    pushed = 0
+    
+    for batch in batches_of_whole_days(rows, Config.POWERBI_MAX_ROWS_PER_REQUEST):
+        result = powerbi.push_rows(dataset_id, table_name, powerbi.format_daily_summaries_for_powerbi(batch),
+                                   in_order=True)
+        if result is None or not result.ok:
+            print(f"Failed to sync daily summaries to Power BI after {pushed} rows")
+            return pushed
+        
+        checkpoint.last_day = batch[-1].day
+        checkpoint.rows_pushed += len(batch)
+        db.session.commit()
+        pushed += len(batch)
+    
+    print(f"Successfully synced {pushed} daily summaries to Power BI")
+    return pushed
+
+def batches_of_whole_days(rows, max_rows):
+    """Group day-ordered rows into batches of at most `max_rows`, never splitting a day"""
+    batch = []
+    day_rows = []
+    for row in rows:
+        if day_rows and row.day != day_rows[0].day:
+            if batch and len(batch) + len(day_rows) > max_rows:
+                yield batch
+                batch = []
+            batch.extend(day_rows)
+            day_rows = []
+        day_rows.append(row)
+    
+    if batch and len(batch) + len(day_rows) > max_rows:
+        yield batch
+        batch = []
+    batch.extend(day_rows)
+    if batch:
+        yield batch
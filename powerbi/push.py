@@ -0,0 +1,185 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests per `per` seconds"""
+
+    def __init__(self, rate, per=60.0, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = float(rate)
+        self.tokens = float(rate)
+        self.fill_rate = rate / per
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, waiting until one is available"""
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.fill_rate
+            self.sleep(wait)
+
+class PushResult:
+    """Outcome of pushing a row list in chunks"""
+
+    def __init__(self, chunk_sizes):
+        self.chunk_sizes = chunk_sizes
+        self.succeeded = set()
+        self.failed_chunks = {}
+        self.retries = 0
+        self.elapsed = 0.0
+
+    @property
+    def ok(self):
+        return not self.failed_chunks
+
+    @property
+    def rows_pushed(self):
+        return sum(self.chunk_sizes[index] for index in self.succeeded)
+
+    @property
+    def confirmed_rows(self):
+        """Rows in the leading run of accepted chunks, safe to checkpoint"""
+        confirmed = 0
+        for index, size in enumerate(self.chunk_sizes):
+            if index not in self.succeeded:
+                break
+            confirmed += size
+        return confirmed
+
+    @property
+    def rows_per_second(self):
+        return self.rows_pushed / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f"{self.rows_pushed} rows in {len(self.succeeded)}/{len(self.chunk_sizes)} chunks, "
+                f"{self.rows_per_second:.0f} rows/s, {self.retries} retries, "
+                f"{len(self.failed_chunks)} failed chunks")
+
+class PushPipeline:
+    """Pushes rows to a Power BI table in API-sized chunks.
+
+    Chunks go out concurrently over one pooled session, paced by a token
+    bucket shared by all workers. 429 and 5xx responses are retried with
+    jittered exponential backoff, or after the server's Retry-After.
+    """
+
+    def __init__(self, session=None, max_rows_per_request=10000, requests_per_minute=120,
+                 max_workers=4, max_retries=5, backoff_base=0.5, backoff_max=30.0, timeout=60,
+                 sleep=time.sleep):
+        self.max_rows_per_request = max_rows_per_request
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.sleep = sleep
+        self.bucket = TokenBucket(requests_per_minute, 60.0, sleep=sleep)
+        self.session = session or self.make_session(max_workers)
+
+    @staticmethod
+    def make_session(pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def chunks(self, rows):
+        size = self.max_rows_per_request
+        return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+    def push(self, url, rows, headers, on_unauthorized=None, in_order=False):
+        """Push all rows to `url`.
+
+        `headers` is called before every request so a renewed token is picked
+        up mid-push. On a 401, `on_unauthorized(sent_headers)` is called once
+        per chunk to replace the rejected token, and the chunk is resent.
+
+        With `in_order`, chunks are sent one at a time and the push stops at
+        the first failed chunk, so the accepted rows are exactly a prefix of
+        `rows`. Callers that checkpoint need this: push tables only append,
+        and a chunk accepted after a failed one would be sent again.
+        """
+        chunks = self.chunks(rows)
+        result = PushResult([len(chunk) for chunk in chunks])
+        lock = threading.Lock()
+        started = time.perf_counter()
+
+        def send(index):
+            error, retries = self.send_chunk(url, chunks[index], headers, on_unauthorized)
+            with lock:
+                result.retries += retries
+                if error is None:
+                    result.succeeded.add(index)
+                else:
+                    result.failed_chunks[index] = error
+
+        if in_order or len(chunks) == 1:
+            for index in range(len(chunks)):
+                send(index)
+                if index in result.failed_chunks:
+                    break
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as executor:
+                list(executor.map(send, range(len(chunks))))
+
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    def send_chunk(self, url, chunk, headers, on_unauthorized=None):
+        """POST one chunk with retries; returns (error or None, retries used)"""
+        attempt = 0
+        refreshed = False
+        while True:
+            self.bucket.acquire()
+            sent_headers = headers()
+
+            try:
+                response = self.session.post(url, headers=sent_headers, json={"rows": chunk}, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = str(e)
+                retry_after = None
+            else:
+                if response.status_code in (200, 201):
+                    return None, attempt
+
+                error = f"{response.status_code} - {response.text[:200]}"
+                if response.status_code == 401 and on_unauthorized and not refreshed:
+                    refreshed = True
+                    on_unauthorized(sent_headers)
+                    continue
+                if response.status_code not in RETRY_STATUSES:
+                    return error, attempt
+                retry_after = response.headers.get('Retry-After')
+
+            if attempt >= self.max_retries:
+                return error, attempt
+
+            self.sleep(self.backoff(attempt, retry_after))
+            attempt += 1
+
+    def backoff(self, attempt, retry_after=None):
+        """Delay before the next attempt: Retry-After if given, else full jitter"""
+        if retry_after is not None:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
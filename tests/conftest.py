@@ -0,0 +1,52 @@
+import os
+import pytest
+
+# Point the app at an in-memory database before it is imported, so the test
+# suite never touches the instance database files.
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+
+from app import app, db
+from models import Department, KPI
+
+@pytest.fixture
+def client():
+    """Test client fixture"""
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+@pytest.fixture
+def sample_data():
+    """Create sample test data"""
+    # Create department
+    dept = Department(name='Test Department', description='Test Description')
+    db.session.add(dept)
+    db.session.commit()
+    
+    # Create KPI
+    kpi = KPI(
+        name='Test KPI',
+        description='Test KPI Description',
+        unit='%',
+        target_type='higher_better',
+        department_id=dept.id
+    )
+    db.session.add(kpi)
+    db.session.commit()
+    
+    return {'department': dept, 'kpi': kpi}
+
+@pytest.fixture
+def partitioned(client, tmp_path):
+    """Enable monthly partitioning with partition files in a temp directory"""
+    app.config['KPI_DATA_PARTITIONING'] = True
+    app.config['KPI_DATA_PARTITION_DIR'] = str(tmp_path)
+    yield tmp_path
+    app.config['KPI_DATA_PARTITIONING'] = False
+    app.config['KPI_DATA_PARTITION_DIR'] = None
@@ -3,38 +3,6 @@ import json
 from app import app, db
 from models import Department, KPI, KPIData
 
-@pytest.fixture
-def client():
-    """Test client fixture"""
-    app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-    
-    with app.test_client() as client:
-        with app.app_context():
-            db.create_all()
-            yield client
-
-@pytest.fixture
-def sample_data():
-    """Create sample test data"""
-    # Create department
-    dept = Department(name='Test Department', description='Test Description')
-    db.session.add(dept)
-    db.session.commit()
-    
-    # Create KPI
-    kpi = KPI(
-        name='Test KPI',
-        description='Test KPI Description',
-        unit='%',
-        target_type='higher_better',
-        department_id=dept.id
-    )
-    db.session.add(kpi)
-    db.session.commit()
-    
-    return {'department': dept, 'kpi': kpi}
-
 class TestDepartmentAPI:
     def test_get_departments(self, client, sample_data):
         """Test getting all departments"""
@@ -424,5 +392,55 @@ class TestPerformanceStatus:
         data = json.loads(response.data)
         assert data['data']['performance_status'] == 'Above Target'
 
+class TestPerformanceStatusFilter:
+    def _add_points(self, sample_data):
+        """Add one above-target and two below-target points"""
+        for value in (95.0, 70.0, 60.0):
+            db.session.add(KPIData(
+                kpi_id=sample_data['kpi'].id,
+                value=value,
+                target=90.0,
+                period='daily',
+                created_by='test_user'
+            ))
+        db.session.commit()
+
+    def test_status_expression_matches_python(self, client, sample_data):
+        """Test the SQL status expression agrees with get_performance_status"""
+        self._add_points(sample_data)
+        rows = db.session.query(KPIData, KPIData.performance_status).all()
+        for kpi_data, status in rows:
+            assert status == kpi_data.get_performance_status()
+
+    def test_filter_kpi_data_by_status(self, client, sample_data):
+        """Test filtering KPI data points by performance status"""
+        self._add_points(sample_data)
+        kpi_id = sample_data['kpi'].id
+
+        response = client.get(f'/api/kpi/{kpi_id}/data?status=Below Target')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['count'] == 2
+        assert all(d['performance_status'] == 'Below Target' for d in data['data'])
+
+    def test_filter_kpi_data_invalid_status(self, client, sample_data):
+        """Test an unknown status is rejected"""
+        response = client.get(f'/api/kpi/{sample_data["kpi"].id}/data?status=Great')
+        assert response.status_code == 400
+
+    def test_export_filter_by_status(self, client, sample_data):
+        """Test the Power BI export honours the status filter"""
+        self._add_points(sample_data)
+
+        response = client.get('/export/powerbi-data?status=Above Target')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['record_count'] == 1
+        assert data['data'][0]['Status'] == 'Above Target'
+
+        response = client.get('/export/csv?status=Below Target')
+        assert response.status_code == 200
+        assert len(response.data.decode().strip().splitlines()) == 3
+
 if __name__ == '__main__':
     pytest.main(['-v', __file__])
\ No newline at end of file
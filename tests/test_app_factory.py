@@ -0,0 +1,63 @@
+import gc
+import os
+from flask import url_for
+from app import create_app, db, preload
+from config import Config
+
+class FactoryConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    METRICS_ENABLED = False
+
+class TestAppFactory:
+    def test_create_app_builds_independent_apps(self):
+        """Test each call returns a separate, fully registered app"""
+        first = create_app(FactoryConfig)
+        second = create_app(FactoryConfig)
+        assert first is not second
+
+        with first.app_context():
+            db.create_all()
+            assert first.test_client().get('/api/departments/').status_code == 200
+        with first.test_request_context():
+            assert url_for('main.dashboard') == '/'
+            assert url_for('main.export_csv') == '/export/csv'
+        assert 'seed' in first.cli.commands
+
+    def test_preload_compiles_templates_and_freezes_gc(self):
+        """Test preloading caches every template and moves objects out of the collector's reach"""
+        app = create_app(FactoryConfig)
+        try:
+            preload(app)
+            assert gc.get_freeze_count() > 0
+            assert len(app.jinja_env.cache) == len(app.jinja_env.list_templates())
+        finally:
+            gc.unfreeze()
+
+    def test_forked_child_uses_its_own_connections(self, tmp_path):
+        """Test a child forked after the parent queried gets fresh connections"""
+        from database.engines import dispose_engines
+
+        class FileConfig(FactoryConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'kpi.db'}"
+
+        app = create_app(FileConfig)
+        with app.app_context():
+            db.create_all()
+            db.session.execute(db.text('SELECT 1'))
+            db.session.remove()
+            parent_connection = db.engine.pool._pool.queue[0].dbapi_connection
+
+        pid = os.fork()
+        if pid == 0:
+            dispose_engines(app)
+            with app.app_context():
+                connection = db.engine.raw_connection()
+                fresh = connection.dbapi_connection is not parent_connection
+                connection.close()
+            os._exit(0 if fresh else 1)
+
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+        with app.app_context():
+            assert db.session.execute(db.text('SELECT 1')).scalar() == 1
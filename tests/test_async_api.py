@@ -0,0 +1,187 @@
+import asyncio
+import csv
+import gzip
+import json
+from datetime import datetime
+from io import StringIO
+
+import pytest
+
+from app import create_app, db
+from async_api import create_asgi_app
+from async_api.app import async_database_url
+from async_api.http import StreamingResponse
+from config import Config
+from models import Department, KPI, KPIData
+
+class AsyncConfig(Config):
+    TESTING = True
+    METRICS_ENABLED = False
+    ASYNC_EXPORT_BATCH_SIZE = 2
+
+@pytest.fixture
+def apps(tmp_path):
+    """A Flask app on a file database with sample rows, and its ASGI read API"""
+    class FileConfig(AsyncConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'kpi.db'}"
+
+    flask_app = create_app(FileConfig)
+    with flask_app.app_context():
+        db.create_all()
+        dept = Department(name='Operations', description='Ops')
+        db.session.add(dept)
+        db.session.flush()
+        kpis = [KPI(name='Uptime', unit='%', target_type='higher_better', department_id=dept.id),
+                KPI(name='Incidents', target_type='lower_better', department_id=dept.id)]
+        db.session.add_all(kpis)
+        db.session.flush()
+        for day in range(1, 6):
+            db.session.add(KPIData(kpi_id=kpis[0].id, value=95 + day, target=98, period='daily',
+                                   timestamp=datetime(2024, 1, day), created_by='test'))
+            db.session.add(KPIData(kpi_id=kpis[1].id, value=day, target=3, period='daily',
+                                   timestamp=datetime(2024, 1, day, 12)))
+        db.session.commit()
+    return flask_app, create_asgi_app(flask_app)
+
+def request(asgi_app, *paths, method='GET', headers=None):
+    """(status, headers, body) for each path, then shut the app down"""
+    async def call(path):
+        path, _, query = path.partition('?')
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+                 'headers': [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]}
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            messages.append(message)
+
+        await asgi_app(scope, receive, send)
+        response_headers = dict((name.decode(), value.decode()) for name, value in messages[0]['headers'])
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        return messages[0]['status'], response_headers, body
+
+    async def run():
+        responses = [await call(path) for path in paths]
+
+        lifespan = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+
+        async def receive():
+            return next(lifespan)
+
+        async def send(message):
+            pass
+
+        await asgi_app({'type': 'lifespan'}, receive, send)
+        return responses
+
+    return asyncio.run(run())
+
+class TestAsyncReadAPI:
+    def test_json_endpoints_match_flask(self, apps):
+        """Test the async department and KPI data endpoints return what the Flask views do"""
+        flask_app, asgi_app = apps
+        paths = ['/api/departments/', '/api/departments/1', '/api/departments/1/kpis',
+                 '/api/kpi/1/data?limit=3', '/api/kpi/2/data?status=Off%20Target&start=2024-01-02&end=2024-01-05']
+
+        responses = request(asgi_app, *paths)
+        client = flask_app.test_client()
+        for path, (status, headers, body) in zip(paths, responses):
+            expected = client.get(path)
+            assert status == expected.status_code == 200
+            assert headers['content-type'] == 'application/json'
+            assert json.loads(body) == expected.get_json()
+
+        assert [point['value'] for point in json.loads(responses[3][2])['data']] == [100, 99, 98]
+
+    def test_dashboard_data(self, apps):
+        """Test the dashboard summary counts and recent points"""
+        _, asgi_app = apps
+        [(status, _, body)] = request(asgi_app, '/api/dashboard-data')
+
+        data = json.loads(body)
+        assert status == 200
+        assert data['summary'] == {'total_departments': 1, 'total_kpis': 2, 'total_data_points': 10}
+        assert data['recent_kpis'][0]['kpi_name'] == 'Incidents'
+        assert data['recent_kpis'][0]['performance'] == 'Above Target'
+
+    def test_streamed_exports_match_flask(self, apps):
+        """Test the streamed exports carry the same records as the buffered Flask ones"""
+        flask_app, asgi_app = apps
+        (powerbi_status, _, powerbi), (csv_status, csv_headers, csv_body) = request(
+            asgi_app, '/export/powerbi-data?start=2024-01-02', '/export/csv'
+        )
+
+        client = flask_app.test_client()
+        assert powerbi_status == 200
+        assert json.loads(powerbi) == client.get('/export/powerbi-data?start=2024-01-02').get_json()
+        assert json.loads(powerbi)['record_count'] == 8
+
+        assert csv_status == 200
+        assert csv_headers['content-type'] == 'text/csv'
+        expected = client.get('/export/csv').get_data(as_text=True)
+        assert list(csv.DictReader(StringIO(csv_body.decode()))) == list(csv.DictReader(StringIO(expected)))
+
+    def test_compressed_export(self, apps):
+        """Test streamed exports are gzip-encoded when the client accepts it"""
+        _, asgi_app = apps
+        [(status, headers, body)] = request(asgi_app, '/export/powerbi-data', headers={'Accept-Encoding': 'gzip'})
+
+        assert status == 200
+        assert headers['content-encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(body))['record_count'] == 10
+
+    def test_errors(self, apps):
+        """Test bad arguments, missing rows and unknown routes"""
+        _, asgi_app = apps
+        responses = request(asgi_app, '/api/kpi/1/data?status=Great', '/api/kpi/99/data',
+                            '/api/departments/99', '/export/csv?start=yesterday', '/api/kpi/')
+
+        assert [status for status, _, _ in responses] == [400, 404, 404, 400, 404]
+        assert json.loads(responses[0][2])['error'] == 'Invalid status: Great'
+        assert request(asgi_app, '/api/departments/', method='POST')[0][0] == 405
+
+    def test_head_sends_headers_only(self, apps):
+        """Test HEAD gets the GET status and headers with an empty body"""
+        _, asgi_app = apps
+        (json_status, json_headers, json_body), (csv_status, csv_headers, csv_body) = request(
+            asgi_app, '/api/departments/', '/export/csv', method='HEAD'
+        )
+
+        assert json_status == csv_status == 200
+        assert json_body == csv_body == b''
+        assert int(json_headers['content-length']) > 0
+        assert csv_headers['content-type'] == 'text/csv'
+
+    def test_failed_stream_is_left_incomplete(self):
+        """Test an error mid-stream never sends the closing body message"""
+        async def chunks():
+            yield b'{"data":['
+            raise RuntimeError('connection lost')
+
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(StreamingResponse(chunks())(send))
+
+        assert messages[0]['status'] == 200
+        assert [message.get('more_body') for message in messages[1:]] == [True]
+
+    def test_async_database_url(self):
+        """Test sync URLs map to their async drivers"""
+        assert str(async_database_url('sqlite:///kpi.db')) == 'sqlite+aiosqlite:///kpi.db'
+        assert async_database_url('mssql+pyodbc://u:p@dsn').drivername == 'mssql+aioodbc'
+        with pytest.raises(ValueError):
+            async_database_url('oracle://u:p@host/db')
+
+    def test_refuses_partitioned_data(self):
+        """Test the async API does not start when kpi_data is partitioned"""
+        class PartitionedConfig(AsyncConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+            KPI_DATA_PARTITIONING = True
+
+        with pytest.raises(RuntimeError):
+            create_asgi_app(create_app(PartitionedConfig))
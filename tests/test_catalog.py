@@ -0,0 +1,113 @@
+from sqlalchemy import event
+
+from app import db
+from models import Department, KPI
+
+def catalog(*departments):
+    return {'departments': list(departments)}
+
+def operations(*kpis, **fields):
+    return {'name': 'Operations', **fields, 'kpis': list(kpis)}
+
+class TestCatalogUpsert:
+    def test_creates_departments_and_kpis(self, client, sample_data):
+        """Test new departments and KPIs are inserted with the usual defaults"""
+        response = client.put('/api/catalog', json=catalog(
+            operations({'name': 'Uptime', 'unit': '%'}, {'name': 'Incidents', 'target_type': 'lower_better'},
+                       description='Ops'),
+            {'name': 'Test Department', 'kpis': [{'name': 'Test KPI'}]}
+        ))
+
+        assert response.status_code == 200
+        assert response.get_json()['summary'] == {
+            'departments': {'created': 1, 'updated': 0, 'unchanged': 1},
+            'kpis': {'created': 2, 'updated': 0, 'deactivated': 0, 'unchanged': 1}
+        }
+        department = Department.query.filter_by(name='Operations').one()
+        assert department.description == 'Ops'
+        kpis = {kpi.name: kpi for kpi in department.kpis}
+        assert (kpis['Uptime'].unit, kpis['Uptime'].target_type, kpis['Uptime'].is_active) == ('%', 'higher_better', True)
+        assert kpis['Incidents'].target_type == 'lower_better'
+        assert KPI.query.count() == 3
+
+    def test_updates_and_deactivates(self, client, sample_data):
+        """Test changed fields are updated and unlisted KPIs of a listed department deactivated"""
+        client.put('/api/catalog', json=catalog(operations({'name': 'Uptime'}, {'name': 'Incidents'}, {'name': 'Cost'})))
+
+        response = client.put('/api/catalog', json=catalog(
+            operations({'name': 'Uptime', 'unit': 'hours'}, {'name': 'Cost'}, description='Changed')
+        ))
+
+        assert response.get_json()['summary'] == {
+            'departments': {'created': 0, 'updated': 1, 'unchanged': 0},
+            'kpis': {'created': 0, 'updated': 1, 'deactivated': 1, 'unchanged': 1}
+        }
+        db.session.expire_all()
+        kpis = {kpi.name: kpi for kpi in KPI.query}
+        assert kpis['Uptime'].unit == 'hours'
+        assert kpis['Incidents'].is_active is False
+        assert kpis['Cost'].is_active is True
+        assert kpis['Test KPI'].is_active is True
+
+        client.put('/api/catalog', json=catalog(operations({'name': 'Uptime'}, {'name': 'Incidents'}, {'name': 'Cost'})))
+        db.session.expire_all()
+        assert KPI.query.filter_by(name='Incidents').one().is_active is True
+
+    def test_query_count_does_not_grow(self, client):
+        """Test a large catalog is applied in a fixed number of statements"""
+        document = catalog(*[
+            {'name': f'Department {d}', 'kpis': [{'name': f'KPI {k}'} for k in range(100)]} for d in range(20)
+        ])
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            assert client.put('/api/catalog', json=document).get_json()['summary']['kpis']['created'] == 2000
+            created = len(statements)
+            document['departments'][0]['kpis'] = document['departments'][0]['kpis'][:50]
+            assert client.put('/api/catalog', json=document).get_json()['summary']['kpis']['deactivated'] == 50
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        assert created <= 5
+        assert len(statements) - created <= 5
+        assert KPI.query.filter_by(is_active=True).count() == 1950
+
+    def test_invalid_documents(self, client, sample_data):
+        """Test a document with any error is rejected without changing anything"""
+        response = client.put('/api/catalog', json=catalog(
+            operations({'name': 'Uptime'}, {'name': 'Uptime'}, {'unit': '%'}, {'name': 'Cost', 'is_active': 'no'}),
+            {'description': 'No name'}
+        ))
+
+        assert response.status_code == 400
+        assert response.get_json()['errors'] == [
+            'Department 0, KPI 1: Duplicate KPI Uptime',
+            'Department 0, KPI 2: Missing required field: name',
+            'Department 0, KPI 3: is_active must be true or false',
+            'Department 1: Missing required field: name'
+        ]
+        assert Department.query.count() == 1
+        assert client.put('/api/catalog', data='not json').status_code == 400
+
+    def test_invalid_field_types(self, client, sample_data):
+        """Test KPI fields must have their column's type and target types must be known"""
+        response = client.put('/api/catalog', json=catalog(operations(
+            {'name': 'Uptime', 'target_type': 'sideways'},
+            {'name': 'Cost', 'unit': 5, 'description': ['cheap']},
+            {'name': 'Incidents', 'retention_days': True},
+            description=7
+        )))
+
+        assert response.status_code == 400
+        assert response.get_json()['errors'] == [
+            'Department 0: description must be a string',
+            'Department 0, KPI 0: target_type must be one of higher_better, lower_better',
+            'Department 0, KPI 1: description must be a string',
+            'Department 0, KPI 1: unit must be a string',
+            'Department 0, KPI 2: retention_days must be a positive integer'
+        ]
+        assert KPI.query.count() == 1
@@ -0,0 +1,112 @@
+from datetime import date, datetime
+
+from app import db
+from database.partitions import roll_partitions
+from models import KPI, KPIData, KPIDataDaily
+
+def compare(client, **args):
+    response = client.get('/api/kpi/compare', query_string=args)
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+def add_months(kpi, months, year=2024):
+    for month in months:
+        db.session.add(KPIData(kpi_id=kpi.id, value=month * 10, timestamp=datetime(year, month, 3)))
+        db.session.add(KPIData(kpi_id=kpi.id, value=month * 10 + 2, timestamp=datetime(year, month, 20)))
+    db.session.commit()
+
+class TestPeriodComparison:
+    def test_month_over_month_and_year_over_year(self, client, sample_data):
+        """Test each month is compared with the one before and the same month a year earlier"""
+        kpi = sample_data['kpi']
+        add_months(kpi, range(1, 13), year=2023)
+        add_months(kpi, range(1, 4))
+
+        [result] = compare(client, kpi_ids=kpi.id, periods=3, end='2024-03-31')
+
+        assert result['kpi_name'] == 'Test KPI'
+        assert [p['period'] for p in result['periods']] == ['2024-01', '2024-02', '2024-03']
+        january, february, _ = result['periods']
+        assert (january['count'], january['value'], january['previous_value']) == (2, 11, 121)
+        assert (january['change'], round(january['change_percent'], 2)) == (-110, -90.91)
+        assert (february['change'], february['change_percent']) == (10, 100 * 10 / 11)
+        assert (february['year_ago_value'], february['year_over_year_change']) == (21, 0)
+        assert february['year_over_year_change_percent'] == 0
+
+    def test_missing_periods_are_not_skipped(self, client, sample_data):
+        """Test a month without data stays in the series, so LAG never reaches past it"""
+        kpi = sample_data['kpi']
+        add_months(kpi, (1, 3, 4))
+
+        months = compare(client, kpi_ids=kpi.id, periods=4, end='2024-04-01')[0]['periods']
+
+        assert [(m['period'], m['count'], m['value']) for m in months] == [
+            ('2024-01', 2, 11), ('2024-02', 0, None), ('2024-03', 2, 31), ('2024-04', 2, 41)
+        ]
+        assert months[2]['previous_value'] is None
+        assert months[2]['change'] is None
+        assert months[3]['change'] == 10
+
+    def test_compacted_days_come_from_summaries(self, client, sample_data):
+        """Test days without raw points are read from kpi_data_daily, and only those"""
+        kpi = sample_data['kpi']
+        add_months(kpi, (4,))
+        db.session.add(KPIDataDaily(kpi_id=kpi.id, day=date(2023, 4, 9), count=4, value_sum=100, min_value=5,
+                                    max_value=45, above_target_count=0))
+        # Already counted from the raw points
+        db.session.add(KPIDataDaily(kpi_id=kpi.id, day=date(2024, 4, 3), count=1, value_sum=999,
+                                    above_target_count=0))
+        db.session.commit()
+
+        [quarter] = compare(client, kpi_ids=kpi.id, grain='quarter', periods=1, end='2024-05-01')[0]['periods']
+        assert (quarter['period'], quarter['value'], quarter['year_ago_value']) == ('2024-Q2', 41, 25)
+
+        [year] = compare(client, kpi_ids=kpi.id, grain='year', periods=1, aggregate='max', end='2024-12-31')[0]['periods']
+        assert (year['period'], year['value'], year['previous_value'], year['year_ago_value']) == ('2024', 42, 45, 45)
+
+    def test_rolled_months_are_compared(self, client, sample_data, partitioned):
+        """Test months rolled into partitions still count, and so do late points for them"""
+        kpi = sample_data['kpi']
+        add_months(kpi, range(1, 13), year=2023)
+        add_months(kpi, range(1, 4))
+        # More partitions than SQLite attaches to one connection
+        assert len(roll_partitions(now=datetime(2024, 4, 1))) == 14
+        db.session.add(KPIData(kpi_id=kpi.id, value=15, timestamp=datetime(2024, 2, 20, 12)))
+        db.session.commit()
+
+        months = compare(client, kpi_ids=kpi.id, periods=3, aggregate='sum', end='2024-03-31')[0]['periods']
+
+        assert [(m['period'], m['count'], m['value']) for m in months] == [
+            ('2024-01', 2, 22), ('2024-02', 3, 57), ('2024-03', 2, 62)
+        ]
+        assert (months[0]['previous_value'], months[1]['year_ago_value']) == (242, 42)
+
+    def test_many_kpis_in_one_query(self, client, sample_data):
+        """Test every requested KPI comes back, each compared only with itself"""
+        other = KPI(name='Another KPI', department_id=sample_data['department'].id)
+        db.session.add(other)
+        db.session.commit()
+        add_months(sample_data['kpi'], (1, 2))
+        add_months(other, (2,))
+
+        results = compare(client, kpi_ids=f"{sample_data['kpi'].id},{other.id}", periods=2, aggregate='sum',
+                          end='2024-02-01')
+
+        assert [(r['kpi_name'], [p['value'] for p in r['periods']]) for r in results] == [
+            ('Another KPI', [None, 42]), ('Test KPI', [22, 42])
+        ]
+        assert results[0]['periods'][1]['previous_value'] is None
+
+    def test_bad_requests(self, client):
+        """Test invalid parameters are rejected"""
+        for args, error in (
+            ({}, 'Missing required parameter: kpi_ids'),
+            ({'kpi_ids': '1,x'}, 'kpi_ids must be a comma-separated list of ids'),
+            ({'kpi_ids': 1, 'grain': 'week'}, 'Invalid grain: week'),
+            ({'kpi_ids': 1, 'aggregate': 'median'}, 'Invalid aggregate: median'),
+            ({'kpi_ids': 1, 'periods': 61}, 'periods must be between 1 and 60'),
+            ({'kpi_ids': 1, 'end': 'soon'}, 'end must be an ISO date')
+        ):
+            response = client.get('/api/kpi/compare', query_string=args)
+            assert response.status_code == 400
+            assert response.get_json()['error'] == error
@@ -0,0 +1,129 @@
+import threading
+import time
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.exc import OperationalError
+from api.kpi_routes import kpi_bp
+from database.database import db, use_reader, READER_BIND
+from database.engines import configure_engines, engine_options
+from models import Department, KPI, KPIData
+
+@pytest.fixture
+def split_app(tmp_path):
+    """An app on a SQLite file with a separate read-only reader engine"""
+    url = f"sqlite:///{tmp_path / 'kpi.db'}"
+    split_app = Flask(__name__)
+    split_app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=url,
+        SQLALCHEMY_BINDS={READER_BIND: url},
+        READER_STATEMENT_TIMEOUT=0.5
+    )
+    db.init_app(split_app)
+    configure_engines(split_app)
+    split_app.register_blueprint(kpi_bp, url_prefix='/api/kpi')
+
+    with split_app.app_context():
+        db.create_all()
+        dept = Department(name='Ops')
+        db.session.add(dept)
+        db.session.commit()
+        kpi = KPI(name='Throughput', department_id=dept.id)
+        db.session.add(kpi)
+        db.session.commit()
+        db.session.add_all([KPIData(kpi_id=kpi.id, value=i, target=100) for i in range(5000)])
+        db.session.commit()
+        kpi_id = kpi.id
+
+    yield split_app, kpi_id
+
+    with split_app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    # The reader metadata is shared by every app on `db`; drop it again so
+    # create_all() on the main test app does not look for a reader bind.
+    db.metadatas.pop(READER_BIND, None)
+
+class TestReadWriteSplit:
+    def test_reads_route_to_reader(self, split_app):
+        """Test use_reader sends queries to the reader and flushes to the primary"""
+        split_app, kpi_id = split_app
+
+        @use_reader
+        def view():
+            assert db.session.get_bind() is db.engines[READER_BIND]
+            db.session.add(KPIData(kpi_id=kpi_id, value=1.0, target=1.0))
+            db.session.commit()
+            return db.session.get_bind()
+
+        with split_app.app_context():
+            assert view() is db.engines[READER_BIND]
+            assert db.session.get_bind() is db.engines[None]
+            assert KPIData.query.count() == 5001
+
+    def test_reader_is_read_only(self, split_app):
+        """Test the reader engine refuses writes"""
+        split_app, _ = split_app
+        with split_app.app_context():
+            with db.engines[READER_BIND].connect() as connection:
+                with pytest.raises(OperationalError):
+                    connection.execute(text('DELETE FROM kpi_data'))
+
+    def test_reader_statement_timeout(self, split_app):
+        """Test long statements on the reader are interrupted"""
+        split_app, _ = split_app
+        with split_app.app_context():
+            with db.engines[READER_BIND].connect() as connection:
+                with pytest.raises(OperationalError, match='interrupted'):
+                    connection.execute(text(
+                        'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) '
+                        'SELECT COUNT(*) FROM n'
+                    ))
+
+    def test_ingest_latency_during_export_scan(self, split_app):
+        """Test ingest stays fast while an export scan holds a read snapshot"""
+        split_app, kpi_id = split_app
+        scanning = threading.Event()
+
+        @use_reader
+        def slow_export():
+            result = db.session.execute(select(KPIData.id, KPIData.value).execution_options(yield_per=500))
+            while result.fetchmany(500):
+                scanning.set()
+                time.sleep(0.1)
+            return jsonify({'success': True})
+
+        def run_export():
+            with split_app.test_request_context():
+                slow_export()
+
+        exporter = threading.Thread(target=run_export)
+        exporter.start()
+        scanning.wait(5)
+
+        client = split_app.test_client()
+        latencies = []
+        for i in range(10):
+            started = time.perf_counter()
+            response = client.post(f'/api/kpi/{kpi_id}/data', json={'value': i, 'target': 100})
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 201
+
+        still_scanning = exporter.is_alive()
+        exporter.join()
+
+        assert still_scanning
+        assert max(latencies) < 0.25
+
+class TestEngineProfiles:
+    def test_driver_options_follow_the_driver(self):
+        """Test pyodbc's fast_executemany is not passed to other SQL Server drivers"""
+        pyodbc = engine_options('mssql+pyodbc://user:secret@db/kpi?driver=ODBC+Driver+18', 'performance')
+        assert pyodbc['fast_executemany'] is True
+
+        url = 'mssql+pymssql://user:secret@db/kpi'
+        options = engine_options(url, 'performance')
+        assert 'fast_executemany' not in options
+        assert options['pool_size'] == 10
+        create_engine(url, **options).dispose()
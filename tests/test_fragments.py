@@ -0,0 +1,112 @@
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.dialects import sqlite
+
+from app import db
+from database.partitions import partition_table
+from models import KPI, KPIData
+from web.fragments import FragmentCache, SharedVersions, written_kinds
+
+@contextmanager
+def recorded_statements():
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+class TestFragmentCache:
+    def test_written_kinds(self):
+        """Test writes map to the versions of the tables they touch"""
+        assert written_kinds('INSERT INTO kpi_data (kpi_id, value) VALUES (?, ?)') == ('data',)
+        assert written_kinds('UPDATE "kpis" SET name=? WHERE kpis.id = ?') == ('catalog',)
+        assert written_kinds('DELETE FROM departments WHERE id = ?') == ('catalog',)
+        assert written_kinds('DELETE FROM "p_2024_01".kpi_data WHERE id = ?') == ('data',)
+        assert written_kinds('UPDATE [dbo].[kpis] SET name=? WHERE id = ?') == ('catalog',)
+        assert written_kinds('DROP TABLE IF EXISTS kpi_data') == ('data',)
+        assert written_kinds('SELECT * FROM kpi_data') == ()
+        assert written_kinds('INSERT INTO jobs (name) VALUES (?)') == ()
+
+    def test_partition_writes_are_data_writes(self):
+        """Test the statements that fill and empty a month's partition bump the data version"""
+        table = partition_table('2024-01')
+        statements = [
+            insert(table).from_select(['id'], select(KPIData.__table__.c.id)),
+            table.delete().where(table.c.id == 1),
+            table.update().values(value=1)
+        ]
+        for statement in statements:
+            assert written_kinds(str(statement.compile(dialect=sqlite.dialect()))) == ('data',)
+
+    def test_cached_pages_skip_the_database(self, client, sample_data):
+        """Test repeat page views render from cache without any SQL"""
+        assert b'Test Department' in client.get('/').data
+        assert b'Test KPI' in client.get('/kpi-form').data
+
+        with recorded_statements() as statements:
+            dashboard = client.get('/')
+            form = client.get('/kpi-form')
+        assert dashboard.status_code == form.status_code == 200
+        assert statements == []
+
+    def test_writes_invalidate_fragments(self, client, sample_data):
+        """Test ORM and Core writes show up on the next page view"""
+        client.get('/')
+        client.post('/api/departments/', json={'name': 'Finance'})
+        assert b'Finance' in client.get('/').data
+
+        kpi_id = sample_data['kpi'].id
+        client.post(f'/api/kpi/{kpi_id}/data', json={'value': 123.45, 'target': 100})
+        assert b'123.45' in client.get('/').data
+
+        with db.engine.begin() as connection:
+            connection.execute(insert(KPI), [{'name': 'Core KPI', 'department_id': sample_data['department'].id}])
+            connection.execute(insert(KPIData), [{'kpi_id': kpi_id, 'value': 678.9, 'timestamp': datetime.utcnow()}])
+        page = client.get('/kpi-form').data + client.get('/').data
+        assert b'Core KPI' in page and b'678.9' in page
+
+    def test_recent_rows_match_the_models(self, client, sample_data):
+        """Test the recent-data fragment shows what the ORM objects would"""
+        point = KPIData(kpi_id=sample_data['kpi'].id, value=80, target=100, timestamp=datetime(2024, 5, 1, 9, 30))
+        db.session.add(point)
+        db.session.commit()
+
+        page = client.get('/').get_data(as_text=True)
+        assert point.get_performance_status() in page
+        assert '2024-05-01 09:30' in page
+        assert '<strong>KPIs:</strong> 1' in page
+
+class TestFragmentStore:
+    def test_lru_eviction(self, tmp_path):
+        """Test the least recently used fragment goes first once the cache is full"""
+        cache = FragmentCache(SharedVersions(str(tmp_path / 'versions')), max_entries=2)
+        renders = []
+
+        def render(name):
+            return lambda: renders.append(name) or name
+
+        for name in ('a', 'b', 'a', 'c', 'a', 'b'):
+            cache.get_or_render(name, ['catalog'], render(name))
+        assert renders == ['a', 'b', 'c', 'b']
+        assert list(cache.entries) == ['a', 'b']
+
+    def test_versions_are_shared_between_processes(self, tmp_path):
+        """Test a bump in another process invalidates this process's fragments"""
+        path = str(tmp_path / 'versions')
+        cache = FragmentCache(SharedVersions(path))
+        assert cache.get_or_render('rows', ['data'], lambda: 'old') == 'old'
+
+        pid = os.fork()
+        if pid == 0:
+            SharedVersions(path).bump(['data'])
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+        assert cache.get_or_render('rows', ['data'], lambda: 'new') == 'new'
+        assert cache.get_or_render('other', ['catalog'], lambda: 'kept') == 'kept'
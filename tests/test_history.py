@@ -0,0 +1,229 @@
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import delete, insert, update
+
+from app import create_app, db
+from config import Config
+import database.history
+from database.history import compact_history, downsample, kpi_history, to_epoch
+from models import Department, KPI, KPIData
+
+class HistoryConfig(Config):
+    TESTING = True
+    METRICS_ENABLED = False
+    RATE_LIMIT_ENABLED = False
+    HISTORY_STORE_ENABLED = True
+
+@pytest.fixture
+def app(tmp_path):
+    class FileConfig(HistoryConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'kpi.db'}"
+        HISTORY_STORE_DIR = str(tmp_path / 'history')
+
+    app = create_app(FileConfig)
+    with app.app_context():
+        db.create_all()
+        dept = Department(name='Operations')
+        db.session.add(dept)
+        db.session.flush()
+        kpi = KPI(name='Uptime', unit='%', department_id=dept.id)
+        db.session.add(kpi)
+        db.session.flush()
+        for day in range(1, 8):
+            db.session.add(KPIData(kpi_id=kpi.id, value=90 + day, target=95 if day > 1 else None,
+                                   timestamp=datetime(2024, 1, day)))
+        db.session.commit()
+    return app
+
+class TestHistoryStore:
+    def test_read_ranges(self, app):
+        """Test a KPI's history is read from its mapped files, sliced by time"""
+        store = app.extensions['history_store']
+        with app.app_context():
+            timestamps, values, targets = store.read(1, datetime(2024, 1, 3), datetime(2024, 1, 6))
+            assert isinstance(values, np.memmap)
+            assert timestamps.tolist() == to_epoch([datetime(2024, 1, day) for day in (3, 4, 5)]).tolist()
+            assert values.tolist() == [93, 94, 95]
+            assert np.isnan(store.read(1)[2][0])
+            assert kpi_history(1, datetime(2024, 1, 6))[1].tolist() == [96, 97]
+
+    def test_ingest_appends_after_commit(self, app):
+        """Test committed points are appended, late ones merged in order, rolled back ones dropped"""
+        client = app.test_client()
+        store = app.extensions['history_store']
+
+        client.post('/api/kpi/1/data', json={'value': 42, 'target': 95, 'timestamp': '2024-01-09T00:00:00'})
+        client.post('/api/kpi/1/data', json={'value': 41, 'timestamp': '2024-01-08T00:00:00'})
+        with app.app_context():
+            db.session.add(KPIData(kpi_id=1, value=0, timestamp=datetime(2024, 1, 10)))
+            db.session.flush()
+            db.session.rollback()
+
+            assert store.read(1)[1].tolist() == [91, 92, 93, 94, 95, 96, 97, 41, 42]
+            assert len(os.listdir(store.directory)) == 5
+
+    def test_bulk_loaded_kpis_wait_for_compaction(self, app):
+        """Test a KPI inserted past the session is read from the database until compacted"""
+        store = app.extensions['history_store']
+        with app.app_context():
+            db.session.execute(insert(KPI), [{'name': 'Incidents', 'department_id': 1}])
+            db.session.commit()
+            db.session.add(KPIData(kpi_id=2, value=3, timestamp=datetime(2024, 1, 1)))
+            db.session.commit()
+            assert store.read(2) is None
+            assert kpi_history(2)[1].tolist() == [3]
+
+            assert compact_history(store, [2]) == 1
+            assert store.read(2)[1].tolist() == [3]
+
+    def test_bulk_writes_wait_for_compaction(self, app):
+        """Test KPIs written by bulk statements are read from the database until compacted"""
+        store = app.extensions['history_store']
+        with app.app_context():
+            db.session.add(KPI(name='Incidents', department_id=1))
+            db.session.commit()
+            db.session.execute(delete(KPIData).where(KPIData.value < 94))
+            db.session.execute(insert(KPIData), [{'kpi_id': 1, 'value': 1, 'timestamp': datetime(2023, 1, 1)}])
+            db.session.commit()
+            assert store.read(1) is None
+            assert store.read(2) is not None
+            assert kpi_history(1)[1].tolist() == [1, 94, 95, 96, 97]
+
+            assert compact_history(store) == 5
+            assert store.read(1)[1].tolist() == [1, 94, 95, 96, 97]
+
+            # The way retention deletes
+            KPIData.query.filter(KPIData.value == 1).delete(synchronize_session=False)
+            db.session.commit()
+            assert store.read(1) is None
+            assert store.read(2) is not None
+
+    def test_appends_racing_a_compaction(self, app, monkeypatch):
+        """Test a point committed during a compaction is stored once, whichever side reads it"""
+        client = app.test_client()
+        store = app.extensions['history_store']
+        read_database = database.history.read_database
+        appending = threading.Event()
+        append = store.append
+
+        def signalled_append(*args):
+            appending.set()
+            return append(*args)
+
+        def commit_after_read(kpi_id):
+            history = read_database(kpi_id)
+            # Committed after the read; its append waits for the compaction
+            worker = threading.Thread(target=client.post, args=('/api/kpi/1/data',),
+                                      kwargs={'json': {'value': 42, 'timestamp': '2024-01-08T00:00:00'}})
+            worker.start()
+            assert appending.wait(5)
+            threads.append(worker)
+            return history
+
+        threads = []
+        monkeypatch.setattr(store, 'append', signalled_append)
+        monkeypatch.setattr(database.history, 'read_database', commit_after_read)
+        with app.app_context():
+            compact_history(store, [1])
+            threads[0].join()
+            assert store.read(1)[1].tolist() == [91, 92, 93, 94, 95, 96, 97, 42]
+
+            # Committed before the read; its append arrives after the compaction
+            monkeypatch.setattr(database.history, 'read_database', read_database)
+            db.session.execute(insert(KPIData), [{'kpi_id': 1, 'value': 43, 'timestamp': datetime(2024, 1, 9)}])
+            db.session.commit()
+            compact_history(store, [1])
+            point = KPIData.query.filter_by(value=43).one()
+            assert store.append(1, to_epoch([point.timestamp]), [43.0], [np.nan], [point.id])
+            assert store.read(1)[1].tolist() == [91, 92, 93, 94, 95, 96, 97, 42, 43]
+
+    def test_bulk_writes_drop_only_the_kpis_they_touch(self, app):
+        """Test catalog updates keep histories, and bulk writes by primary key drop only their KPIs"""
+        client = app.test_client()
+        store = app.extensions['history_store']
+        with app.app_context():
+            db.session.add_all([KPI(name='Incidents', department_id=1), KPI(name='Cost', department_id=1)])
+            db.session.commit()
+            db.session.add(KPIData(kpi_id=2, value=5, timestamp=datetime(2024, 1, 1)))
+            db.session.commit()
+
+        response = client.put('/api/catalog', json={'departments': [{'name': 'Operations', 'kpis': [
+            {'name': 'Uptime', 'unit': '%', 'description': 'Changed'}, {'name': 'Incidents'}, {'name': 'Cost'}
+        ]}]})
+        assert response.get_json()['summary']['kpis']['updated'] == 1
+        assert store.kpi_ids() == [1, 2, 3]
+
+        with app.app_context():
+            point = KPIData.query.filter_by(kpi_id=2).one()
+            db.session.execute(update(KPIData), [{'id': point.id, 'value': 6}])
+            db.session.commit()
+            assert store.kpi_ids() == [1, 3]
+
+            db.session.execute(delete(KPI).where(KPI.id == 3))
+            db.session.commit()
+            assert store.kpi_ids() == [1]
+
+    def test_changed_and_deleted_points_drop_their_kpi(self, app):
+        """Test editing or deleting a point through the ORM drops its KPI, and only then"""
+        store = app.extensions['history_store']
+        with app.app_context():
+            point = db.session.get(KPIData, 3)
+            point.notes = 'checked'
+            db.session.commit()
+            assert len(store.read(1)[0]) == 7
+
+            point.value = 50
+            db.session.commit()
+            assert store.read(1) is None
+            assert kpi_history(1)[1].tolist()[2] == 50
+
+            compact_history(store)
+            db.session.delete(db.session.get(KPIData, 3))
+            db.session.commit()
+            assert store.read(1) is None
+            assert len(kpi_history(1)[0]) == 6
+
+    def test_failed_writes_drop_the_kpi(self, app, monkeypatch, caplog):
+        """Test a point the store cannot write is read from the database, not lost"""
+        client = app.test_client()
+        store = app.extensions['history_store']
+
+        def full_disk(*args):
+            raise OSError(28, 'No space left on device')
+
+        monkeypatch.setattr(store, 'append', full_disk)
+        response = client.post('/api/kpi/1/data', json={'value': 42, 'timestamp': '2024-01-08T00:00:00'})
+        assert response.status_code == 201
+        assert 'Could not append to the history of KPI 1' in caplog.text
+        with app.app_context():
+            assert store.read(1) is None
+            assert kpi_history(1)[1].tolist()[-1] == 42
+
+    def test_history_endpoint(self, app):
+        """Test the endpoint returns columns, averaged into buckets when asked for fewer points"""
+        client = app.test_client()
+        data = client.get('/api/kpi/1/history?start=2024-01-02&end=2024-01-04').get_json()['data']
+        assert data == {'timestamps': ['2024-01-02T00:00:00', '2024-01-03T00:00:00'], 'values': [92, 93],
+                        'targets': [95, 95]}
+
+        response = client.get('/api/kpi/1/history?points=3').get_json()
+        assert response['count'] == 3
+        assert response['data']['values'] == [91.5, 93.5, 96]
+        assert response['data']['targets'] == [95, 95, 95]
+        assert client.get('/api/kpi/9/history').status_code == 404
+        assert client.get('/api/kpi/1/history?points=0').status_code == 400
+
+    def test_downsample(self):
+        """Test empty buckets are skipped and targets average over the points that have one"""
+        timestamps = np.array([0, 1, 2, 10, 11, 12], dtype=np.int64)
+        values = np.array([1, 2, 3, 4, 5, 6], dtype=np.float64)
+        targets = np.array([np.nan, np.nan, np.nan, 4, np.nan, 8])
+
+        stamps, means, target_means = downsample(timestamps, values, targets, 4)
+        assert stamps.tolist() == [0, 10]
+        assert means.tolist() == [2, 5]
+        assert np.isnan(target_means[0]) and target_means[1] == 6
@@ -0,0 +1,164 @@
+import os
+import time
+from datetime import datetime, timedelta
+import pytest
+from app import app, db
+from jobs.schedule import CronExpression
+from jobs.tasks import TASKS
+from jobs.worker import Worker, claim, worker_command
+from models import Job, JobRun
+
+def echo_pid():
+    return f'pid {os.getpid()}'
+
+def fail():
+    raise ValueError('bad input')
+
+def hang():
+    time.sleep(10)
+
+def nap():
+    time.sleep(0.5)
+    return os.getpid()
+
+@pytest.fixture
+def tasks(monkeypatch):
+    for name, func in [('echo_pid', echo_pid), ('fail', fail), ('hang', hang), ('nap', nap)]:
+        monkeypatch.setitem(TASKS, name, func)
+
+def add_job(name, task, **kwargs):
+    job = Job(name=name, task=task, next_run_at=datetime.utcnow() - timedelta(seconds=1), **kwargs)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+def run_until_idle(worker, timeout=15):
+    worker.start()
+    try:
+        worker.tick()
+        deadline = time.monotonic() + timeout
+        while worker.running and time.monotonic() < deadline:
+            time.sleep(0.05)
+            worker.collect()
+    finally:
+        worker.executor.shutdown(wait=True)
+
+class TestCronExpression:
+    def test_daily(self):
+        """Test a daily schedule fires later the same day, then the next day"""
+        cron = CronExpression('30 2 * * *')
+        assert cron.next_after(datetime(2024, 5, 1, 1, 0)) == datetime(2024, 5, 1, 2, 30)
+        assert cron.next_after(datetime(2024, 5, 1, 2, 30)) == datetime(2024, 5, 2, 2, 30)
+
+    def test_steps_and_ranges(self):
+        """Test steps and weekday ranges"""
+        assert CronExpression('*/15 * * * *').next_after(datetime(2024, 5, 1, 10, 7)) == datetime(2024, 5, 1, 10, 15)
+        # 2024-05-04 is a Saturday
+        assert CronExpression('0 9 * * 1-5').next_after(datetime(2024, 5, 4, 12, 0)) == datetime(2024, 5, 6, 9, 0)
+
+    def test_monthly_rolls_over_year(self):
+        """Test a monthly schedule crosses month and year boundaries"""
+        cron = CronExpression('15 3 1 * *')
+        assert cron.next_after(datetime(2024, 12, 15)) == datetime(2025, 1, 1, 3, 15)
+
+    def test_day_fields_are_either_or(self):
+        """Test a restricted day of month and day of week match either way, like cron"""
+        # The 13th, or any Friday: 2024-05-03 is a Friday
+        assert CronExpression('0 0 13 * 5').next_after(datetime(2024, 5, 1)) == datetime(2024, 5, 3)
+
+    @pytest.mark.parametrize('expression', ['* * * *', '60 * * * *', '*/0 * * * *', '0 0 31 2 *'])
+    def test_invalid_expressions(self, expression):
+        """Test malformed or impossible expressions are rejected"""
+        with pytest.raises(ValueError):
+            CronExpression(expression).next_after(datetime(2024, 1, 1))
+
+class TestWorker:
+    def test_due_job_runs_in_pool_process(self, client, tasks):
+        """Test a due job runs outside the scheduler process and is recorded"""
+        job = add_job('echo', 'echo_pid', interval_seconds=60)
+        due = job.next_run_at
+
+        run_until_idle(Worker(app, processes=1))
+
+        run = JobRun.query.one()
+        assert run.status == 'succeeded'
+        assert run.result.startswith('pid ') and run.result != f'pid {os.getpid()}'
+        assert run.finished_at >= run.started_at
+
+        job = db.session.get(Job, job.id)
+        assert job.last_status == 'succeeded'
+        assert job.lease_owner is None
+        assert job.next_run_at > due
+
+    def test_failure_records_traceback(self, client, tasks):
+        """Test a raising job is marked failed with its traceback"""
+        add_job('broken', 'fail', interval_seconds=60)
+
+        run_until_idle(Worker(app, processes=1))
+
+        run = JobRun.query.one()
+        assert run.status == 'failed'
+        assert 'ValueError: bad input' in run.error
+
+    def test_timeout_interrupts_job(self, client, tasks):
+        """Test a job running past its timeout is stopped and marked"""
+        add_job('stuck', 'hang', interval_seconds=60, timeout_seconds=1)
+
+        started = time.monotonic()
+        run_until_idle(Worker(app, processes=1))
+
+        assert time.monotonic() - started < 5
+        assert JobRun.query.one().status == 'timeout'
+
+    def test_jobs_run_in_parallel(self, client, tasks):
+        """Test jobs run side by side in separate processes"""
+        add_job('nap-1', 'nap', interval_seconds=60)
+        add_job('nap-2', 'nap', interval_seconds=60)
+
+        run_until_idle(Worker(app, processes=2))
+
+        runs = JobRun.query.all()
+        assert [run.status for run in runs] == ['succeeded', 'succeeded']
+        assert runs[0].result != runs[1].result
+
+    def test_lease_allows_one_instance(self, client, tasks):
+        """Test only one worker can claim a job until its lease expires"""
+        job = add_job('echo', 'echo_pid', interval_seconds=60)
+        now = datetime.utcnow()
+
+        first = claim(job, 'worker-a', now)
+        assert first is not None
+
+        job = db.session.get(Job, job.id)
+        job.next_run_at = now
+        db.session.commit()
+        assert claim(job, 'worker-b', now) is None
+
+        later = now + timedelta(seconds=job.timeout_seconds + 120)
+        assert claim(db.session.get(Job, job.id), 'worker-b', later) is not None
+        assert db.session.get(JobRun, first.id).status == 'abandoned'
+        assert db.session.get(Job, job.id).lease_owner == 'worker-b'
+
+    def test_missed_interval_runs_are_not_replayed(self, client, tasks):
+        """Test a job that was due long ago is scheduled from now, not caught up"""
+        job = add_job('echo', 'echo_pid', interval_seconds=60)
+        job.next_run_at = datetime.utcnow() - timedelta(hours=5)
+        db.session.commit()
+
+        now = datetime.utcnow()
+        claim(job, 'worker-a', now)
+        assert db.session.get(Job, job.id).next_run_at == now + timedelta(seconds=60)
+
+    def test_worker_command_once(self, client, tasks, monkeypatch):
+        """Test `flask worker --once` creates the default jobs and runs them"""
+        monkeypatch.setattr('jobs.worker.DEFAULT_JOBS', [
+            {'name': 'echo', 'task': 'echo_pid', 'interval_seconds': 60},
+            {'name': 'nightly', 'task': 'echo_pid', 'cron': '0 0 * * *'}
+        ])
+
+        result = app.test_cli_runner().invoke(worker_command, ['--once', '--processes', '1'])
+
+        assert result.exit_code == 0, result.output
+        assert 'Created job echo (every 60s)' in result.output
+        assert JobRun.query.count() == 2
+        assert {job.name: job.last_status for job in Job.query} == {'echo': 'succeeded', 'nightly': 'succeeded'}
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+from sqlalchemy import bindparam
+
+import database.latest
+from app import db
+from database.latest import LATEST_COLUMNS, latest_statements, rebuild_latest
+from models import KPI, KPIData, KPILatest
+
+class TestLatestValues:
+    def test_out_of_order_points(self, client, sample_data):
+        """Test a late point with an older timestamp does not replace the newer value"""
+        kpi_id = sample_data['kpi'].id
+        points = [(10, '2024-03-02T00:00:00', 10), (5, '2024-03-01T00:00:00', 10), (20, '2024-03-03T00:00:00', 20)]
+        for value, timestamp, expected in points:
+            client.post(f'/api/kpi/{kpi_id}/data', json={'value': value, 'target': 15, 'timestamp': timestamp})
+            db.session.expire_all()
+            assert db.session.get(KPILatest, kpi_id).value == expected
+
+        latest = db.session.get(KPILatest, kpi_id)
+        assert (latest.value, latest.timestamp) == (20, datetime(2024, 3, 3))
+        assert latest.data_id == KPIData.query.filter_by(value=20).one().id
+
+    def test_bulk_keeps_the_newest_per_kpi(self, client, sample_data):
+        """Test one bulk request picks the newest point per KPI, ties going to the later row"""
+        first = sample_data['kpi'].id
+        second = KPI(name='Second KPI', target_type='lower_better', department_id=sample_data['department'].id)
+        db.session.add(second)
+        db.session.commit()
+
+        response = client.post('/api/kpi/data/bulk', json=[
+            {'kpi_id': first, 'value': 3, 'timestamp': '2024-03-05T00:00:00'},
+            {'kpi_id': first, 'value': 1, 'timestamp': '2024-03-09T00:00:00'},
+            {'kpi_id': second.id, 'value': 7, 'timestamp': '2024-03-09T00:00:00'},
+            {'kpi_id': second.id, 'value': 8, 'timestamp': '2024-03-09T00:00:00'},
+            {'kpi_id': first, 'value': 2, 'timestamp': '2024-03-01T00:00:00'}
+        ])
+        assert response.status_code == 201
+
+        assert {row.kpi_id: row.value for row in KPILatest.query} == {first: 1, second.id: 8}
+
+    def test_lost_insert_race_becomes_an_update(self, client, sample_data, monkeypatch):
+        """Test a first point another transaction beat to the insert is applied, not a 500"""
+        first = sample_data['kpi'].id
+        second = KPI(name='Second KPI', department_id=sample_data['department'].id)
+        db.session.add(second)
+        db.session.commit()
+        client.post(f'/api/kpi/{first}/data', json={'value': 1, 'timestamp': '2024-03-01T00:00:00'})
+
+        # As on SQL Server, where both transactions can pass NOT EXISTS
+        _, update_older = latest_statements()
+        unguarded = KPILatest.__table__.insert().values({name: bindparam(f'p_{name}') for name in LATEST_COLUMNS})
+        monkeypatch.setattr(database.latest, 'latest_statements', lambda: (unguarded, update_older))
+
+        response = client.post('/api/kpi/data/bulk', json=[
+            {'kpi_id': first, 'value': 2, 'timestamp': '2024-03-02T00:00:00'},
+            {'kpi_id': second.id, 'value': 7, 'timestamp': '2024-03-02T00:00:00'}
+        ])
+        assert response.status_code == 201
+        db.session.expire_all()
+        assert {row.kpi_id: row.value for row in KPILatest.query} == {first: 2, second.id: 7}
+        assert KPIData.query.count() == 3
+
+    def test_form_and_orm_inserts(self, client, sample_data):
+        """Test points added through the form and the ORM update the latest value"""
+        kpi_id = sample_data['kpi'].id
+        db.session.add(KPIData(kpi_id=kpi_id, value=1, timestamp=datetime(2020, 1, 1)))
+        db.session.commit()
+        assert db.session.get(KPILatest, kpi_id).value == 1
+
+        client.post('/add-kpi-data', data={'kpi_id': kpi_id, 'value': '42', 'target': '40', 'period': 'daily'})
+        db.session.expire_all()
+        assert db.session.get(KPILatest, kpi_id).value == 42
+
+    def test_rolled_back_points_leave_no_trace(self, client, sample_data):
+        """Test the latest value is written in the point's own transaction"""
+        db.session.add(KPIData(kpi_id=sample_data['kpi'].id, value=1))
+        db.session.flush()
+        db.session.rollback()
+        assert KPILatest.query.count() == 0
+
+    def test_latest_endpoint(self, client, sample_data):
+        """Test the board lists each KPI's newest value with its status"""
+        kpi_id = sample_data['kpi'].id
+        client.post(f'/api/kpi/{kpi_id}/data', json={'value': 80, 'target': 90, 'timestamp': '2024-03-02T00:00:00'})
+        client.post(f'/api/kpi/{kpi_id}/data', json={'value': 95, 'target': 90, 'timestamp': '2024-03-01T00:00:00'})
+
+        data = client.get('/api/kpi/latest').get_json()
+        assert data['count'] == 1
+        assert data['data'][0]['value'] == 80
+        assert data['data'][0]['kpi_name'] == 'Test KPI'
+        assert data['data'][0]['department_name'] == 'Test Department'
+        assert data['data'][0]['performance_status'] == 'Below Target'
+        assert client.get(f'/api/kpi/latest?department_id={kpi_id + 100}').get_json()['count'] == 0
+
+    def test_rebuild(self, client, sample_data):
+        """Test a rebuild recomputes the table from the raw points"""
+        kpi_id = sample_data['kpi'].id
+        db.session.add_all([KPIData(kpi_id=kpi_id, value=value, timestamp=datetime(2024, 1, day))
+                            for value, day in ((4, 2), (6, 3), (5, 1))])
+        db.session.commit()
+        KPILatest.query.delete()
+        db.session.commit()
+
+        assert rebuild_latest() == 1
+        assert db.session.get(KPILatest, kpi_id).value == 6
@@ -0,0 +1,126 @@
+import logging
+import os
+import subprocess
+import sys
+import textwrap
+import time
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from app import app
+from monitoring.metrics import instrument_engine, record_statement, start_request, end_request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def sample(text, name, **labels):
+    """Value of one sample in Prometheus text output (0 if absent)"""
+    for family in text_string_to_metric_families(text):
+        for metric in family.samples:
+            if metric.name == name and all(metric.labels.get(key) == value for key, value in labels.items()):
+                return metric.value
+    return 0
+
+def scrape(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    return response.get_data(as_text=True)
+
+class TestMetrics:
+    def test_requests_counted_per_route_template(self, client, sample_data):
+        """Test latency and status are recorded under the URL rule, not the raw path"""
+        route = '/api/kpi/<int:kpi_id>/data'
+        before = scrape(client)
+
+        client.get(f"/api/kpi/{sample_data['kpi'].id}/data")
+        client.get('/api/kpi/999999/data')
+        after = scrape(client)
+
+        assert sample(after, 'kpi_http_request_duration_seconds_count', method='GET', route=route) - \
+            sample(before, 'kpi_http_request_duration_seconds_count', method='GET', route=route) == 2
+        assert sample(after, 'kpi_http_requests_total', method='GET', route=route, status='200') - \
+            sample(before, 'kpi_http_requests_total', method='GET', route=route, status='200') >= 1
+        assert sample(after, 'kpi_http_requests_in_progress', method='GET', route=route) == 0
+
+    def test_sql_statements_counted_per_request(self, client, sample_data):
+        """Test the statements a request runs are counted and timed"""
+        before = scrape(client)
+        client.get('/api/kpi/')
+        after = scrape(client)
+
+        queries = sample(after, 'kpi_sql_queries_per_request_sum', route='/api/kpi/') - \
+            sample(before, 'kpi_sql_queries_per_request_sum', route='/api/kpi/')
+        assert queries >= 1
+        assert sample(after, 'kpi_sql_seconds_per_request_count', route='/api/kpi/') - \
+            sample(before, 'kpi_sql_seconds_per_request_count', route='/api/kpi/') == 1
+        assert sample(after, 'kpi_sql_statement_duration_seconds_count', operation='SELECT') > \
+            sample(before, 'kpi_sql_statement_duration_seconds_count', operation='SELECT')
+
+    def test_unmatched_requests_share_one_series(self, client):
+        """Test requests without a URL rule are labelled 'unmatched', not by path"""
+        before = scrape(client)
+        client.put('/kpi-form')
+        after = scrape(client)
+
+        assert sample(after, 'kpi_http_requests_total', method='PUT', route='unmatched', status='405') - \
+            sample(before, 'kpi_http_requests_total', method='PUT', route='unmatched', status='405') == 1
+        assert sample(after, 'kpi_http_requests_total', method='PUT', route='/kpi-form') == 0
+
+    def test_slow_query_logged_with_route(self, caplog):
+        """Test statements over the threshold are logged with their route"""
+        with app.test_request_context('/api/kpi/'):
+            start_request()
+            with caplog.at_level(logging.WARNING, logger='kpi.slow_query'):
+                record_statement('SELECT *\n  FROM kpi_data', 0.8, 0.5)
+                record_statement('SELECT 1', 0.1, 0.5)
+            end_request()
+
+        assert len(caplog.records) == 1
+        assert 'Slow query (800.0 ms) on /api/kpi/: SELECT * FROM kpi_data' in caplog.text
+
+    def test_failed_statements_are_timed_and_cleared(self, caplog):
+        """Test a statement that raises is logged as slow and leaves no timer behind"""
+        engine = create_engine('sqlite://')
+
+        @event.listens_for(engine, 'connect')
+        def add_function(dbapi_connection, record):
+            def slow_failure():
+                time.sleep(0.06)
+                raise ValueError('boom')
+            dbapi_connection.create_function('slow_failure', 0, slow_failure)
+
+        instrument_engine(engine, slow_query_ms=50)
+        with engine.connect() as connection, caplog.at_level(logging.WARNING, logger='kpi.slow_query'):
+            with pytest.raises(OperationalError):
+                connection.exec_driver_sql('SELECT slow_failure()')
+            time.sleep(0.06)
+            connection.exec_driver_sql('SELECT 1')
+
+        assert [record.getMessage().split(': ', 1)[1] for record in caplog.records] == ['SELECT slow_failure()']
+
+    def test_multiprocess_mode_sums_workers(self, tmp_path):
+        """Test /metrics adds up samples written by separate worker processes"""
+        script = textwrap.dedent('''
+            import os, sys
+            os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+            from app import app, db
+            with app.app_context():
+                db.create_all()
+            client = app.test_client()
+            for _ in range(int(sys.argv[1])):
+                client.get('/api/departments/')
+            if len(sys.argv) > 2:
+                sys.stdout.write(client.get('/metrics').get_data(as_text=True))
+        ''')
+        env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+
+        def worker(*args):
+            return subprocess.run([sys.executable, '-c', script, *args], cwd=ROOT, env=env,
+                                  capture_output=True, text=True, check=True).stdout
+
+        worker('3')
+        worker('2')
+        text = worker('1', 'scrape')
+
+        assert sample(text, 'kpi_http_requests_total', route='/api/departments/', status='200') == 6
@@ -0,0 +1,74 @@
+import json
+import os
+from datetime import datetime
+from app import db
+from models import KPIData, KPIDataPartition
+from database.partitions import roll_partitions, drop_partition, partitions_in_range, mssql_partition_ddl
+
+def add_months(kpi, months):
+    """Add two points on the 10th of each (year, month)"""
+    for year, month in months:
+        for value in (70.0, 95.0):
+            db.session.add(KPIData(
+                kpi_id=kpi.id,
+                value=value,
+                target=90.0,
+                timestamp=datetime(year, month, 10),
+                period='daily',
+                created_by='test_user'
+            ))
+    db.session.commit()
+
+class TestPartitions:
+    def test_roll_moves_closed_months(self, partitioned, sample_data):
+        """Test closed months move into partition files and the newest stays put"""
+        add_months(sample_data['kpi'], [(2024, 1), (2024, 2), (2024, 3)])
+
+        rolled = roll_partitions(now=datetime(2024, 4, 1))
+        assert [p.month for p in rolled] == ['2024-01', '2024-02']
+        assert all(p.row_count == 2 for p in rolled)
+        assert KPIData.query.count() == 2
+        assert os.path.exists(rolled[0].path)
+
+    def test_reads_span_partitions(self, partitioned, client, sample_data):
+        """Test the data endpoint and exports read rolled months back"""
+        add_months(sample_data['kpi'], [(2024, 1), (2024, 2), (2024, 3)])
+        roll_partitions(now=datetime(2024, 4, 1))
+        kpi_id = sample_data['kpi'].id
+
+        data = json.loads(client.get(f'/api/kpi/{kpi_id}/data').data)
+        assert data['count'] == 6
+        assert data['data'][0]['timestamp'].startswith('2024-03')
+        assert data['data'][-1]['timestamp'].startswith('2024-01')
+
+        data = json.loads(client.get(f'/api/kpi/{kpi_id}/data?start=2024-02-01&end=2024-03-01&status=Below Target').data)
+        assert data['count'] == 1
+        assert data['data'][0]['timestamp'].startswith('2024-02')
+
+        data = json.loads(client.get('/export/powerbi-data').data)
+        assert data['record_count'] == 6
+
+    def test_range_prunes_partitions(self, partitioned, sample_data):
+        """Test only partitions overlapping the range are selected"""
+        add_months(sample_data['kpi'], [(2024, 1), (2024, 2), (2024, 3), (2024, 4)])
+        roll_partitions(now=datetime(2024, 5, 1))
+
+        months = [p.month for p in partitions_in_range(datetime(2024, 2, 15), datetime(2024, 3, 1))]
+        assert months == ['2024-02']
+
+    def test_drop_partition(self, partitioned, client, sample_data):
+        """Test dropping a month removes its file and its rows from reads"""
+        add_months(sample_data['kpi'], [(2024, 1), (2024, 2)])
+        rolled = roll_partitions(now=datetime(2024, 3, 1))
+
+        drop_partition('2024-01')
+        assert not os.path.exists(rolled[0].path)
+        assert db.session.get(KPIDataPartition, '2024-01') is None
+
+        data = json.loads(client.get(f'/api/kpi/{sample_data["kpi"].id}/data').data)
+        assert data['count'] == 2
+
+    def test_mssql_ddl_boundaries(self):
+        """Test the SQL Server partition function gets one boundary per month"""
+        ddl = mssql_partition_ddl('2024-11', '2025-02')
+        assert "'2024-11-01', '2024-12-01', '2025-01-01', '2025-02-01'" in ddl[0]
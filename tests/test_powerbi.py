@@ -0,0 +1,460 @@
+import json
+import threading
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import pytest
+from app import app, db
+from database.rollup import rollup_daily_summaries
+from models import KPI, KPIData, KPIDataDaily, PowerBISyncCheckpoint
+from powerbi.auth import TokenProvider
+from powerbi.integration import (
+    PowerBIIntegration, batches_of_whole_days, powerbi_rows_query, sync_daily_summaries_to_powerbi,
+    sync_kpi_data_to_powerbi
+)
+from powerbi.push import PushPipeline, PushResult, TokenBucket
+
+@pytest.fixture
+def pushes(monkeypatch):
+    """Record pushes instead of calling the Power BI API"""
+    calls = []
+    state = {'fail': False}
+
+    def fake_push(self, dataset_id, table_name, data, in_order=False):
+        result = PushResult([len(data)])
+        if state['fail']:
+            result.failed_chunks[0] = '500 - stub'
+            return result
+        calls.append((dataset_id, table_name, [row['ID'] for row in data]))
+        result.succeeded.add(0)
+        return result
+
+    monkeypatch.setattr(PowerBIIntegration, 'push_rows', fake_push)
+    return calls, state
+
+def add_points(kpi, count):
+    for i in range(count):
+        db.session.add(KPIData(kpi_id=kpi.id, value=80.0 + i, target=90.0, created_by='test_user'))
+    db.session.commit()
+
+class TestIncrementalSync:
+    def test_sync_walks_backlog_in_batches(self, client, sample_data, pushes):
+        """Test the whole backlog is pushed in id order, batch by batch"""
+        calls, _ = pushes
+        add_points(sample_data['kpi'], 25)
+
+        assert sync_kpi_data_to_powerbi('dataset-1', batch_size=10) == 25
+        assert [len(ids) for _, _, ids in calls] == [10, 10, 5]
+        pushed_ids = [i for _, _, ids in calls for i in ids]
+        assert pushed_ids == sorted(pushed_ids)
+
+        checkpoint = PowerBISyncCheckpoint.query.filter_by(dataset_id='dataset-1').one()
+        assert checkpoint.last_id == pushed_ids[-1]
+        assert checkpoint.rows_pushed == 25
+
+    def test_sync_only_pushes_new_rows(self, client, sample_data, pushes):
+        """Test a second run pushes exactly the rows added since the first"""
+        calls, _ = pushes
+        add_points(sample_data['kpi'], 5)
+        sync_kpi_data_to_powerbi('dataset-1')
+        assert sync_kpi_data_to_powerbi('dataset-1') == 0
+
+        add_points(sample_data['kpi'], 3)
+        assert sync_kpi_data_to_powerbi('dataset-1') == 3
+        assert len(calls[-1][2]) == 3
+
+    def test_failed_push_keeps_checkpoint(self, client, sample_data, pushes):
+        """Test the checkpoint only advances after Power BI accepts a batch"""
+        calls, state = pushes
+        add_points(sample_data['kpi'], 5)
+
+        state['fail'] = True
+        assert sync_kpi_data_to_powerbi('dataset-1') == 0
+        assert PowerBISyncCheckpoint.query.filter_by(dataset_id='dataset-1').one().last_id == 0
+
+        state['fail'] = False
+        assert sync_kpi_data_to_powerbi('dataset-1') == 5
+
+    def test_checkpoints_are_per_dataset(self, client, sample_data, pushes):
+        """Test each dataset keeps its own high-water mark"""
+        add_points(sample_data['kpi'], 4)
+        assert sync_kpi_data_to_powerbi('dataset-1') == 4
+        assert sync_kpi_data_to_powerbi('dataset-2') == 4
+
+class TestPowerBIRows:
+    def test_projection_matches_orm_formatting(self, client, sample_data):
+        """Test the joined projection yields the values the ORM objects give"""
+        dept = sample_data['department']
+        lower = KPI(name='Defects', department_id=dept.id, target_type='lower_better', unit='count')
+        untyped = KPI(name='Visits', department_id=dept.id, target_type='exact')
+        db.session.add_all([lower, untyped])
+        db.session.commit()
+
+        for kpi, value, target in [(sample_data['kpi'], 95, 90), (sample_data['kpi'], 85, 90),
+                                   (lower, 3, 5), (lower, 8, 5), (untyped, 10, 10), (untyped, 9, 10),
+                                   (sample_data['kpi'], 50, None)]:
+            db.session.add(KPIData(kpi_id=kpi.id, value=value, target=target, period='daily'))
+        db.session.commit()
+
+        rows = PowerBIIntegration().format_kpi_data_for_powerbi(powerbi_rows_query(KPIData, 0, 100).all())
+        points = KPIData.query.order_by(KPIData.id).all()
+
+        assert [row['ID'] for row in rows] == [point.id for point in points]
+        for row, point in zip(rows, points):
+            assert row['PerformanceStatus'] == point.get_performance_status()
+            assert row['KPIName'] == point.kpi.name
+            assert row['Department'] == point.kpi.department.name
+            assert row['Unit'] == point.kpi.unit
+            assert row['Timestamp'] == point.timestamp.isoformat()
+            assert row['Target'] == (point.target or 0)
+
+    def test_projection_pages_by_id(self, client, sample_data):
+        """Test the projection starts after the given id and honours the limit"""
+        add_points(sample_data['kpi'], 5)
+        ids = [point.id for point in KPIData.query.order_by(KPIData.id)]
+
+        rows = powerbi_rows_query(KPIData, ids[1], 2).all()
+        assert [row.id for row in rows] == ids[2:4]
+
+class TestDailySync:
+    def add_days(self, kpi, first, count):
+        for offset in range(count):
+            db.session.add(KPIDataDaily(kpi_id=kpi.id, day=first + timedelta(days=offset), count=4,
+                                        value_sum=360, min_value=80, max_value=100, last_value=95,
+                                        last_target=90, above_target_count=3))
+        db.session.commit()
+
+    def test_pushes_settled_days_once(self, client, sample_data, monkeypatch):
+        """Test days are pushed once, after the rollup window (2 days) has passed them"""
+        pushed = []
+        def fake_push(self, dataset_id, table_name, data, in_order=False):
+            pushed.append((table_name, data))
+            result = PushResult([len(data)])
+            result.succeeded.add(0)
+            return result
+        monkeypatch.setattr(PowerBIIntegration, 'push_rows', fake_push)
+
+        today = date(2024, 6, 10)
+        self.add_days(sample_data['kpi'], today - timedelta(days=3), 4)
+
+        assert sync_daily_summaries_to_powerbi('dataset-1', today=today) == 2
+        table_name, rows = pushed[0]
+        assert table_name == 'KPIDaily'
+        assert [row['Date'] for row in rows] == ['2024-06-07T00:00:00', '2024-06-08T00:00:00']
+        assert rows[0]['Average'] == 90
+        assert rows[0]['AboveTargetShare'] == 0.75
+        assert rows[0]['KPIName'] == 'Test KPI'
+
+        assert sync_daily_summaries_to_powerbi('dataset-1', today=today) == 0
+        assert sync_daily_summaries_to_powerbi('dataset-1', today=today + timedelta(days=1)) == 1
+        assert pushed[-1][1][0]['Date'] == '2024-06-09T00:00:00'
+    
+    def test_late_points_within_the_rollup_window_are_pushed(self, client, sample_data, monkeypatch):
+        """Test a late point for yesterday reaches Power BI, because yesterday is not pushed yet"""
+        pushed = []
+        def fake_push(self, dataset_id, table_name, data, in_order=False):
+            pushed.extend(data)
+            result = PushResult([len(data)])
+            result.succeeded.add(0)
+            return result
+        monkeypatch.setattr(PowerBIIntegration, 'push_rows', fake_push)
+        
+        kpi = sample_data['kpi']
+        db.session.add(KPIData(kpi_id=kpi.id, value=10, timestamp=datetime(2024, 6, 9, 12)))
+        db.session.commit()
+        rollup_daily_summaries(2, now=datetime(2024, 6, 10, 1))
+        assert sync_daily_summaries_to_powerbi('dataset-1', today=date(2024, 6, 10)) == 0
+        
+        db.session.add(KPIData(kpi_id=kpi.id, value=30, timestamp=datetime(2024, 6, 9, 23)))
+        db.session.commit()
+        rollup_daily_summaries(2, now=datetime(2024, 6, 10, 6))
+        assert sync_daily_summaries_to_powerbi('dataset-1', today=date(2024, 6, 11)) == 1
+        assert (pushed[0]['Date'], pushed[0]['Count'], pushed[0]['Average']) == ('2024-06-09T00:00:00', 2, 20)
+
+    def test_failed_push_keeps_day_checkpoint(self, client, sample_data, monkeypatch):
+        """Test the day checkpoint only advances past accepted requests"""
+        monkeypatch.setattr(PowerBIIntegration, 'push_rows', lambda self, dataset_id, table_name, data, in_order=False: None)
+        today = date(2024, 6, 10)
+        self.add_days(sample_data['kpi'], today - timedelta(days=2), 2)
+
+        assert sync_daily_summaries_to_powerbi('dataset-1', today=today) == 0
+        assert PowerBISyncCheckpoint.query.filter_by(table_name='KPIDaily').one().last_day is None
+
+    def test_batches_never_split_a_day(self):
+        """Test requests are packed with whole days up to the row limit"""
+        rows = [SimpleNamespace(day=day) for day in [1, 1, 1, 2, 2, 3, 4, 4, 4, 4, 4]]
+
+        batches = list(batches_of_whole_days(rows, 5))
+
+        assert [[row.day for row in batch] for batch in batches] == [[1, 1, 1, 2, 2], [3], [4, 4, 4, 4, 4]]
+
+class StubPowerBI(BaseHTTPRequestHandler):
+    """Accepts row pushes like the Power BI REST API, with scripted failures"""
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        rows = body.get('rows', [])
+
+        with server.lock:
+            server.requests += 1
+            status = server.script.pop(0) if server.script else 200
+            if server.token and self.headers['Authorization'] != f"Bearer {server.token}":
+                status = 401
+            if status == 200 and self.path.endswith('/datasets'):
+                self.send_response(201)
+                self.end_headers()
+                self.wfile.write(json.dumps({'id': 'dataset-1', 'name': body['name']}).encode())
+                return
+            if status == 200 and len(rows) > server.max_rows:
+                status = 400
+            if status == 200:
+                server.received.extend(row['ID'] for row in rows)
+
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubPowerBI)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.script = []
+    server.received = []
+    server.max_rows = 100
+    server.token = None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}/rows"
+    server.shutdown()
+    server.server_close()
+
+def make_rows(count):
+    return [{'ID': i} for i in range(count)]
+
+def headers():
+    return {'Authorization': 'Bearer test'}
+
+class TestPushPipeline:
+    def test_rows_split_into_api_sized_chunks(self, stub_server):
+        """Test every row is delivered once in chunks under the row limit"""
+        server, url = stub_server
+        pipeline = PushPipeline(max_rows_per_request=100, requests_per_minute=6000)
+
+        result = pipeline.push(url, make_rows(950), headers)
+
+        assert result.ok
+        assert server.requests == 10
+        assert sorted(server.received) == list(range(950))
+        assert result.rows_pushed == result.confirmed_rows == 950
+
+    def test_throttled_and_failed_chunks_are_retried(self, stub_server):
+        """Test 429 and 5xx responses are retried until the chunk lands"""
+        server, url = stub_server
+        server.script = [429, 503, 500]
+        pipeline = PushPipeline(max_rows_per_request=100, requests_per_minute=6000,
+                                backoff_base=0.001, sleep=lambda seconds: None)
+
+        result = pipeline.push(url, make_rows(300), headers)
+
+        assert result.ok
+        assert result.retries == 3
+        assert sorted(server.received) == list(range(300))
+
+    def test_client_errors_are_not_retried(self, stub_server):
+        """Test a rejected chunk fails at once and is reported"""
+        server, url = stub_server
+        pipeline = PushPipeline(max_rows_per_request=150, requests_per_minute=6000, max_workers=1)
+
+        result = pipeline.push(url, make_rows(300), headers)
+
+        assert not result.ok
+        assert server.requests == 2
+        assert set(result.failed_chunks) == {0, 1}
+        assert result.failed_chunks[0].startswith('400')
+        assert result.retries == 0
+
+    def test_confirmed_rows_stop_at_first_failed_chunk(self, stub_server):
+        """Test only the leading run of accepted chunks counts as confirmed"""
+        server, url = stub_server
+        server.script = [200, 500, 500, 500]
+        pipeline = PushPipeline(max_rows_per_request=100, requests_per_minute=6000, max_workers=1,
+                                max_retries=2, sleep=lambda seconds: None)
+
+        result = pipeline.push(url, make_rows(300), headers)
+
+        assert set(result.failed_chunks) == {1}
+        assert result.rows_pushed == 200
+        assert result.confirmed_rows == 100
+
+    def test_in_order_push_stops_at_first_failed_chunk(self, stub_server):
+        """Test an in-order push sends nothing past a failed chunk"""
+        server, url = stub_server
+        server.script = [200, 400]
+        pipeline = PushPipeline(max_rows_per_request=100, requests_per_minute=6000, max_workers=4)
+
+        result = pipeline.push(url, make_rows(400), headers, in_order=True)
+
+        assert set(result.failed_chunks) == {1}
+        assert server.requests == 2
+        assert server.received == list(range(100))
+        assert result.rows_pushed == result.confirmed_rows == 100
+
+    def test_token_bucket_paces_requests(self):
+        """Test the bucket allows a burst, then one request per interval"""
+        now = [0.0]
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            now[0] += seconds
+
+        bucket = TokenBucket(2, per=1.0, clock=lambda: now[0], sleep=sleep)
+        for _ in range(4):
+            bucket.acquire()
+
+        assert waits == [pytest.approx(0.5), pytest.approx(0.5)]
+
+class TestSyncPushPipeline:
+    def test_sync_checkpoints_confirmed_chunks(self, client, sample_data, stub_server, monkeypatch):
+        """Test a partly failed push only checkpoints rows Power BI accepted"""
+        server, url = stub_server
+        add_points(sample_data['kpi'], 30)
+
+        monkeypatch.setattr(PowerBIIntegration, 'get_access_token', lambda self: 'token')
+        monkeypatch.setattr(PowerBIIntegration, 'push_rows', lambda self, dataset_id, table_name, data, in_order=False:
+                            self.pipeline.push(url, data, headers, in_order=in_order))
+        monkeypatch.setattr('config.Config.POWERBI_MAX_ROWS_PER_REQUEST', 10)
+        monkeypatch.setattr('config.Config.POWERBI_PUSH_WORKERS', 4)
+
+        # The third chunk would be accepted, but comes after a failed one
+        server.script = [200, 400]
+        assert sync_kpi_data_to_powerbi('dataset-1') == 10
+        checkpoint = PowerBISyncCheckpoint.query.filter_by(dataset_id='dataset-1').one()
+        assert checkpoint.last_id == max(server.received)
+
+        assert sync_kpi_data_to_powerbi('dataset-1') == 20
+        assert len(server.received) == 30
+        assert len(set(server.received)) == 30
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.text = json.dumps(body)
+        self.headers = {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception(self.status_code)
+
+class FakeAuthority:
+    """An msal http_client issuing numbered client-credential tokens"""
+
+    def __init__(self, expires_in=3600):
+        self.expires_in = expires_in
+        self.issued = 0
+
+    def get(self, url, **kwargs):
+        base = url.split('/v2.0/')[0]
+        return FakeResponse(200, {
+            'authorization_endpoint': f'{base}/oauth2/v2.0/authorize',
+            'token_endpoint': f'{base}/oauth2/v2.0/token',
+            'issuer': f'{base}/v2.0'
+        })
+
+    def post(self, url, **kwargs):
+        self.issued += 1
+        return FakeResponse(200, {
+            'access_token': f'token-{self.issued}',
+            'expires_in': self.expires_in,
+            'token_type': 'Bearer'
+        })
+
+    def close(self):
+        pass
+
+def make_provider(authority, **kwargs):
+    return TokenProvider('client', 'secret', 'https://login.microsoftonline.com/tenant',
+                         ['https://analysis.windows.net/powerbi/api/.default'],
+                         http_client=authority, **kwargs)
+
+class TestTokenCache:
+    def test_instances_share_one_token(self):
+        """Test integrations on one provider cost a single token round trip"""
+        authority = FakeAuthority()
+        provider = make_provider(authority)
+
+        first = PowerBIIntegration(token_provider=provider)
+        second = PowerBIIntegration(token_provider=provider)
+
+        assert first.get_access_token() and second.get_access_token()
+        assert first.access_token == second.access_token == 'token-1'
+        assert authority.issued == 1
+
+    def test_token_refreshed_ahead_of_expiry(self):
+        """Test a token is renewed once it is within the refresh margin"""
+        authority = FakeAuthority(expires_in=3600)
+        now = [1000.0]
+        provider = make_provider(authority, refresh_margin=300, clock=lambda: now[0])
+
+        assert provider.token() == 'token-1'
+        now[0] += 3200
+        assert provider.token() == 'token-1'
+        now[0] += 200
+        assert provider.token() == 'token-2'
+        assert authority.issued == 2
+
+    def test_cache_persists_across_restarts(self, tmp_path):
+        """Test a new process reuses the token from the cache file"""
+        cache_path = str(tmp_path / 'powerbi' / 'token_cache.json')
+        assert make_provider(FakeAuthority(), cache_path=cache_path).token() == 'token-1'
+
+        authority = FakeAuthority()
+        assert make_provider(authority, cache_path=cache_path).token() == 'token-1'
+        assert authority.issued == 0
+
+    def test_push_refreshes_once_on_401(self, stub_server):
+        """Test a rejected token is replaced and the chunk resent"""
+        server, url = stub_server
+        authority = FakeAuthority()
+        powerbi = PowerBIIntegration(token_provider=make_provider(authority))
+        powerbi.api_url = url
+        assert powerbi.get_access_token()
+
+        server.token = 'token-2'
+        result = powerbi.push_rows('dataset-1', 'KPIData', make_rows(50))
+
+        assert result.ok
+        assert authority.issued == 2
+        assert sorted(server.received) == list(range(50))
+
+    def test_push_gives_up_after_one_refresh(self, stub_server):
+        """Test a token that is still rejected after refreshing fails the chunk"""
+        server, url = stub_server
+        authority = FakeAuthority()
+        powerbi = PowerBIIntegration(token_provider=make_provider(authority))
+        powerbi.api_url = url
+
+        server.token = 'never-issued'
+        assert not powerbi.push_data_to_powerbi('dataset-1', 'KPIData', make_rows(50))
+        assert authority.issued == 2
+        assert server.requests == 2
+
+    def test_create_dataset_refreshes_on_401(self, stub_server):
+        """Test dataset creation retries once with a new token"""
+        server, url = stub_server
+        authority = FakeAuthority()
+        powerbi = PowerBIIntegration(token_provider=make_provider(authority))
+        powerbi.api_url = url
+        assert powerbi.get_access_token()
+
+        server.token = 'token-2'
+        dataset = powerbi.create_dataset('KPI Monitoring', powerbi.get_kpi_table_schema())
+
+        assert dataset['id'] == 'dataset-1'
+        assert authority.issued == 2
@@ -0,0 +1,129 @@
+import os
+import time
+
+import pytest
+
+from app import create_app, db
+from config import Config
+from web import ratelimit
+from web.ratelimit import SharedLimiter, bucket_key, parse_limit
+
+class LimitedConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    METRICS_ENABLED = False
+    API_RATE_LIMIT = '3 per minute'
+    RATE_LIMITS = {'/api/departments/<int:dept_id>': '1 per hour'}
+    CONCURRENCY_LIMITS = {'/api/departments/': 1}
+    RATE_LIMIT_CLIENT_HEADER = 'X-Forwarded-For'
+
+@pytest.fixture
+def limited_app():
+    app = create_app(LimitedConfig)
+    with app.app_context():
+        db.create_all()
+    return app
+
+class TestSharedLimiter:
+    def test_parse_limit(self):
+        """Test limit strings become (tokens per second, burst)"""
+        assert parse_limit('1000 per hour') == (1000 / 3600, 1000)
+        assert parse_limit('10/minute') == (10 / 60, 10)
+        assert parse_limit('5 per 10 seconds') == (0.5, 5)
+        with pytest.raises(ValueError):
+            parse_limit('lots')
+
+    def test_bucket_refills_over_time(self, tmp_path, monkeypatch):
+        """Test a bucket allows its burst, then one request per refill interval"""
+        now = [1000.0]
+        monkeypatch.setattr(ratelimit.time, 'monotonic', lambda: now[0])
+        limiter = SharedLimiter(str(tmp_path / 'limits'))
+        bucket = [(bucket_key('client'), 1.0, 3)]
+
+        assert [limiter.take(bucket) for _ in range(3)] == [0, 0, 0]
+        assert limiter.take(bucket) == pytest.approx(1.0)
+        now[0] += 0.5
+        assert limiter.take(bucket) == pytest.approx(0.5)
+        now[0] += 0.5
+        assert limiter.take(bucket) == 0
+
+    def test_all_or_nothing(self, tmp_path):
+        """Test a request refused by one bucket takes no tokens from the others"""
+        limiter = SharedLimiter(str(tmp_path / 'limits'))
+        client = (bucket_key('client'), 1.0, 2)
+        route = (bucket_key('client', '/export/csv'), 0.001, 1)
+
+        assert limiter.take([client, route]) == 0
+        assert limiter.take([client, route]) > 0
+        assert limiter.take([client]) == 0
+
+    def test_buckets_are_shared_between_processes(self, tmp_path):
+        """Test tokens taken in another process count against the same bucket"""
+        path = str(tmp_path / 'limits')
+        bucket = [(bucket_key('client'), 0.001, 2)]
+        SharedLimiter(path)
+
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if SharedLimiter(path).take(bucket) == 0 else 1)
+        assert os.waitpid(pid, 0)[1] == 0
+
+        limiter = SharedLimiter(path)
+        assert limiter.take(bucket) == 0
+        assert limiter.take(bucket) > 0
+
+    def test_concurrency_slots_free_when_holder_dies(self, tmp_path):
+        """Test slots held by another process are busy until it exits"""
+        path = str(tmp_path / 'limits')
+        read_fd, write_fd = os.pipe()
+
+        pid = os.fork()
+        if pid == 0:
+            limiter = SharedLimiter(path)
+            limiter.acquire(0, 1)
+            os.write(write_fd, b'1')
+            time.sleep(30)
+            os._exit(0)
+
+        assert os.read(read_fd, 1) == b'1'
+        limiter = SharedLimiter(path)
+        assert limiter.acquire(0, 1) is None
+        assert limiter.acquire(1, 1) is not None
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
+        assert limiter.acquire(0, 1) is not None
+
+class TestRateLimitedApp:
+    def test_client_and_route_limits(self, limited_app):
+        """Test 429 with Retry-After once a client's or a route's bucket is empty"""
+        client = limited_app.test_client()
+        first = {'X-Forwarded-For': '10.0.0.1'}
+
+        assert client.get('/api/departments/1', headers=first).status_code != 429
+        response = client.get('/api/departments/1', headers=first)
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) > 3000
+        assert response.get_json() == {'success': False, 'error': 'Rate limit exceeded'}
+
+        assert [client.get('/api/kpi/', headers=first).status_code for _ in range(2)] == [200, 200]
+        response = client.get('/api/kpi/', headers=first)
+        assert response.status_code == 429
+        assert 1 <= int(response.headers['Retry-After']) <= 20
+
+        other = {'X-Forwarded-For': '10.0.0.2, 10.0.0.1'}
+        assert client.get('/api/kpi/', headers=other).status_code == 200
+
+    def test_concurrency_cap(self, limited_app):
+        """Test a capped route answers 429 while its slots are taken"""
+        client = limited_app.test_client()
+        limits = limited_app.extensions['rate_limits']
+
+        acquired, slot = limits.acquire('/api/departments/')
+        assert acquired
+        response = client.get('/api/departments/')
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '1'
+
+        limits.release(slot)
+        assert client.get('/api/departments/').status_code == 200
+        assert client.get('/api/departments/').status_code == 200
@@ -0,0 +1,95 @@
+import json
+from datetime import datetime, timedelta
+from app import app, db
+from models import KPIData, KPIDataDaily
+from database.archive import iter_archived_rows
+from database.retention import plan_retention, apply_retention, retention_report, retention_command
+from database.rollup import rollup_daily_summaries
+
+def add_history(kpi, days=60, per_day=3):
+    """Add `per_day` points per day for the last `days` days"""
+    now = datetime.utcnow()
+    for day in range(days):
+        for i in range(per_day):
+            db.session.add(KPIData(
+                kpi_id=kpi.id,
+                value=80.0 + i * 10,
+                target=90.0,
+                timestamp=now - timedelta(days=day, hours=i),
+                period='daily',
+                created_by='test_user'
+            ))
+    db.session.commit()
+
+class TestRetention:
+    def test_dry_run_reports_without_deleting(self, client, sample_data):
+        """Test the dry run only reports reclaimable rows"""
+        add_history(sample_data['kpi'])
+        total = KPIData.query.count()
+
+        result = app.test_cli_runner().invoke(retention_command, ['--days', '30', '--dry-run'])
+        assert result.exit_code == 0
+        assert 'rows' in result.output
+        assert KPIData.query.count() == total
+
+        report = retention_report(plan_retention(30))
+        assert report[0]['rows'] > 0
+
+    def test_apply_retention_archives_and_compacts(self, client, sample_data, tmp_path):
+        """Test old rows are archived, summarised per day and deleted in batches"""
+        add_history(sample_data['kpi'])
+        plans = plan_retention(30)
+        expected = retention_report(plans)[0]['rows']
+
+        removed = apply_retention(plans, str(tmp_path), batch_size=7)
+        assert removed == expected
+        assert KPIData.query.filter(KPIData.timestamp < plans[0]['cutoff']).count() == 0
+
+        summaries = KPIDataDaily.query.all()
+        assert sum(summary.count for summary in summaries) == removed
+        full_day = next(summary for summary in summaries if summary.count == 3)
+        assert full_day.min_value == 80.0
+        assert full_day.max_value == 100.0
+        assert full_day.avg_value == 90.0
+        assert full_day.above_target_count == 2
+
+        assert len(list(iter_archived_rows(str(tmp_path)))) == removed
+
+    def test_rolled_up_days_are_not_counted_twice(self, client, sample_data, tmp_path):
+        """Test retention keeps the rollup's summary of a day instead of adding the rows to it"""
+        kpi = sample_data['kpi']
+        for hour, value in ((1, 10.0), (2, 20.0), (3, 30.0)):
+            db.session.add(KPIData(kpi_id=kpi.id, value=value, target=15.0, timestamp=datetime(2024, 1, 10, hour)))
+        db.session.commit()
+        rollup_daily_summaries(2, now=datetime(2024, 1, 11))
+
+        assert apply_retention(plan_retention(30, now=datetime(2024, 3, 1)), str(tmp_path), batch_size=2) == 3
+
+        summary = KPIDataDaily.query.one()
+        assert (summary.count, summary.value_sum, summary.above_target_count) == (3, 60, 2)
+        assert (summary.min_value, summary.max_value, summary.last_value) == (10, 30, 30)
+
+    def test_kpi_override_policy(self, client, sample_data):
+        """Test a KPI's own retention_days takes precedence over the default"""
+        sample_data['kpi'].retention_days = 10
+        db.session.commit()
+
+        plans = plan_retention(30)
+        assert [plan['days'] for plan in plans] == [10, 30]
+
+    def test_export_reads_archived_range(self, client, sample_data, tmp_path):
+        """Test exports transparently include archived rows for the requested range"""
+        add_history(sample_data['kpi'])
+        app.config['KPI_DATA_ARCHIVE_DIR'] = str(tmp_path)
+        try:
+            start = (datetime.utcnow() - timedelta(days=45)).date().isoformat()
+            expected = KPIData.query.filter(KPIData.timestamp >= datetime.fromisoformat(start)).count()
+            apply_retention(plan_retention(30), str(tmp_path))
+
+            response = client.get(f'/export/powerbi-data?start={start}')
+            data = json.loads(response.data)
+            assert data['success'] == True
+            assert data['record_count'] == expected
+            assert min(row['Date'] for row in data['data']) == start
+        finally:
+            app.config['KPI_DATA_ARCHIVE_DIR'] = None
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from database.rollup import rollup_daily_summaries
+from models import KPI, KPIData, KPIDataDaily
+
+NOW = datetime(2024, 6, 10, 15, 0)
+
+def add_point(kpi, value, target, timestamp):
+    db.session.add(KPIData(kpi_id=kpi.id, value=value, target=target, timestamp=timestamp))
+    db.session.commit()
+
+class TestDailyRollup:
+    def test_rollup_aggregates_each_day(self, client, sample_data):
+        """Test count, extremes, last point and target share per KPI and day"""
+        kpi = sample_data['kpi']
+        yesterday = NOW - timedelta(days=1)
+        add_point(kpi, 95, 90, yesterday.replace(hour=8))
+        add_point(kpi, 70, 90, yesterday.replace(hour=12))
+        add_point(kpi, 90, 90, yesterday.replace(hour=9))
+        add_point(kpi, 50, 90, NOW.replace(hour=1))
+
+        assert rollup_daily_summaries(2, now=NOW) == 2
+
+        day = KPIDataDaily.query.filter_by(day=yesterday.date()).one()
+        assert day.count == 3
+        assert day.avg_value == pytest.approx(85)
+        assert (day.min_value, day.max_value) == (70, 95)
+        assert (day.last_value, day.last_target) == (70, 90)
+        assert day.last_timestamp == yesterday.replace(hour=12)
+        assert day.above_target_count == 2
+
+        today = KPIDataDaily.query.filter_by(day=NOW.date()).one()
+        assert (today.count, today.above_target_count) == (1, 0)
+
+    def test_rollup_is_idempotent(self, client, sample_data):
+        """Test rerunning replaces summaries instead of adding to them"""
+        kpi = sample_data['kpi']
+        add_point(kpi, 95, 90, NOW.replace(hour=1))
+
+        rollup_daily_summaries(2, now=NOW)
+        rollup_daily_summaries(2, now=NOW)
+        assert KPIDataDaily.query.one().count == 1
+
+        add_point(kpi, 80, 90, NOW.replace(hour=2))
+        rollup_daily_summaries(2, now=NOW)
+        summary = KPIDataDaily.query.one()
+        assert (summary.count, summary.last_value) == (2, 80)
+
+    def test_rollup_leaves_older_days_alone(self, client, sample_data):
+        """Test days outside the window, such as compacted ones, are untouched"""
+        kpi = sample_data['kpi']
+        old_day = (NOW - timedelta(days=30)).date()
+        db.session.add(KPIDataDaily(kpi_id=kpi.id, day=old_day, count=7, value_sum=700, above_target_count=7))
+        db.session.commit()
+        add_point(kpi, 50, 90, NOW - timedelta(days=30))
+
+        rollup_daily_summaries(2, now=NOW)
+        assert KPIDataDaily.query.filter_by(day=old_day).one().count == 7
+
+    def test_rollup_separates_kpis_and_unknown_types(self, client, sample_data):
+        """Test each KPI gets its own row and untyped KPIs count exact hits"""
+        untyped = KPI(name='Visits', department_id=sample_data['department'].id, target_type='exact')
+        db.session.add(untyped)
+        db.session.commit()
+        add_point(sample_data['kpi'], 95, 90, NOW.replace(hour=1))
+        add_point(untyped, 10, 10, NOW.replace(hour=1))
+        add_point(untyped, 11, 10, NOW.replace(hour=2))
+
+        assert rollup_daily_summaries(1, now=NOW) == 2
+        summary = KPIDataDaily.query.filter_by(kpi_id=untyped.id).one()
+        assert (summary.count, summary.above_target_count) == (2, 1)
@@ -0,0 +1,94 @@
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app import db
+from database.search import create_sqlite_search, fts5_query, match_terms, mssql_query, mssql_search_ddl
+from models import Department, KPI, KPIData
+
+def search(client, query, **args):
+    response = client.get('/api/search', query_string={'q': query, **args})
+    assert response.status_code == 200
+    return [(result['type'], result['name']) for result in response.get_json()['data']]
+
+class TestSearch:
+    def test_finds_kpis_departments_and_notes(self, client, sample_data):
+        """Test one query searches names, descriptions and notes, best match first"""
+        kpi = sample_data['kpi']
+        db.session.add(KPI(name='Server uptime', description='Availability of the web servers',
+                           department_id=sample_data['department'].id))
+        db.session.add(Department(name='Infrastructure', description='Servers and networks'))
+        db.session.add(KPIData(kpi_id=kpi.id, value=1, notes='Server room cooling failed overnight',
+                               timestamp=datetime(2024, 2, 1)))
+        db.session.commit()
+
+        assert sorted(search(client, 'servers')) == [('department', 'Infrastructure'), ('kpi', 'Server uptime')]
+        # The last word matches as a prefix; a name match outranks the rest
+        results = search(client, 'server')
+        assert results[0] == ('kpi', 'Server uptime')
+        assert sorted(results[1:]) == [('department', 'Infrastructure'), ('note', 'Test KPI')]
+        assert search(client, 'ser', type='note') == [('note', 'Test KPI')]
+
+        note = client.get('/api/search?q=cooling').get_json()['data'][0]
+        assert note['kpi_id'] == kpi.id
+        assert note['text'] == 'Server room cooling failed overnight'
+        assert note['department_name'] == 'Test Department'
+        assert note['timestamp'] == '2024-02-01T00:00:00'
+
+    def test_index_follows_writes(self, client, sample_data):
+        """Test updates, deletes and Core bulk inserts reach the index"""
+        kpi = sample_data['kpi']
+        assert search(client, 'revenue') == []
+
+        kpi.name = 'Monthly revenue'
+        db.session.commit()
+        assert search(client, 'revenue') == [('kpi', 'Monthly revenue')]
+
+        db.session.execute(insert(KPIData), [
+            {'kpi_id': kpi.id, 'value': value, 'notes': notes, 'timestamp': datetime(2024, 1, 1)}
+            for value, notes in ((1, 'late invoice'), (2, ''), (3, None), (4, 'invoice disputed'))
+        ])
+        db.session.commit()
+        assert len(search(client, 'invoice', type='note')) == 2
+
+        KPIData.query.filter_by(value=1).delete()
+        kpi.name = 'Costs'
+        db.session.commit()
+        assert len(search(client, 'invoice', type='note')) == 1
+        assert search(client, 'revenue') == []
+
+    def test_pagination(self, client, sample_data):
+        """Test pages follow the ranking without overlapping"""
+        db.session.execute(insert(KPIData), [
+            {'kpi_id': sample_data['kpi'].id, 'value': i, 'notes': 'backlog ' * (i + 1) + 'growing'}
+            for i in range(7)
+        ])
+        db.session.commit()
+
+        pages = [client.get(f'/api/search?q=backlog&limit=3&offset={offset}').get_json() for offset in (0, 3, 6)]
+        ids = [result['id'] for page in pages for result in page['data']]
+        scores = [result['score'] for page in pages for result in page['data']]
+        assert [page['count'] for page in pages] == [3, 3, 1]
+        assert len(set(ids)) == 7
+        assert scores == sorted(scores, reverse=True)
+
+    def test_existing_rows_are_indexed(self, client, sample_data):
+        """Test creating the index over existing rows fills it"""
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DROP TABLE kpi_search')
+            create_sqlite_search(connection)
+        assert search(client, 'test', type='kpi') == [('kpi', 'Test KPI')]
+
+    def test_bad_requests(self, client):
+        """Test missing queries and unknown types are rejected; punctuation is ignored"""
+        assert client.get('/api/search').status_code == 400
+        assert client.get('/api/search?q=x&type=kpi,users').get_json()['error'] == 'Invalid type: users'
+        assert search(client, '"NEAR( AND -') == []
+
+    def test_query_translation(self):
+        """Test user input becomes quoted terms with a prefix on the last one"""
+        assert match_terms('  cost-per "unit" ') == ['cost', 'per', 'unit']
+        assert fts5_query(['cost', 'per']) == '"cost" "per"*'
+        assert mssql_query(['cost', 'per']) == '"cost" AND "per*"'
+        assert fts5_query(['cost', 'pe']) == '"cost" "pe"'
+        assert all('CHANGE_TRACKING AUTO' in statement for statement in mssql_search_ddl()[1:])
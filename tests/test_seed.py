@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+from app import app, db
+from database.init_db import seed_rule
+from database.seed import seed_command, seed_data
+from models import Department, KPI, KPIData, KPILatest
+
+END = datetime(2024, 6, 1)
+
+def points():
+    return [(point.kpi_id, point.value, point.timestamp) for point in KPIData.query.order_by(KPIData.id)]
+
+class TestSeed:
+    def test_seed_builds_catalog_and_history(self, client):
+        """Test every KPI gets one point per step over the requested days"""
+        assert seed_data(departments=3, kpis_per_department=4, days=2, resolution='hourly', end=END) == (3, 12, 576)
+
+        assert Department.query.count() == 3
+        assert KPI.query.count() == 12
+        timestamps = [timestamp for (timestamp,) in db.session.query(KPIData.timestamp).distinct()]
+        assert len(timestamps) == 48
+        assert min(timestamps) == END - timedelta(days=2)
+        assert max(timestamps) == END - timedelta(hours=1)
+
+        for kpi in KPI.query:
+            low, high, target = seed_rule(kpi.name)
+            values = [point.value for point in kpi.kpi_data]
+            assert len(values) == 48
+            assert low <= min(values) and max(values) <= high
+            assert {point.target for point in kpi.kpi_data} == {target}
+
+        latest = KPILatest.query.all()
+        assert len(latest) == 12
+        assert {row.timestamp for row in latest} == {END - timedelta(hours=1)}
+
+    def test_seed_is_reproducible(self, client):
+        """Test the same arguments and seed generate the same values"""
+        seed_data(departments=2, kpis_per_department=3, days=1, seed=7, chunk_size=10, end=END)
+        first = points()
+        KPIData.query.delete()
+        KPI.query.delete()
+        Department.query.delete()
+        db.session.commit()
+
+        seed_data(departments=2, kpis_per_department=3, days=1, seed=7, chunk_size=10, end=END)
+        assert [point[1:] for point in points()] == [point[1:] for point in first]
+
+    def test_timestamps_match_orm_filters(self, client):
+        """Test bulk-written timestamps compare like ORM-written ones"""
+        seed_data(departments=1, kpis_per_department=2, days=1, resolution='hourly', end=END)
+
+        noon = END - timedelta(hours=12)
+        assert KPIData.query.filter(KPIData.timestamp == noon).count() == 2
+        assert KPIData.query.filter(KPIData.timestamp >= noon).count() == 24
+
+    def test_seed_command_appends_new_departments(self, client):
+        """Test rerunning the command adds departments instead of clashing on names"""
+        runner = app.test_cli_runner()
+        args = ['--departments', '2', '--kpis-per-department', '1', '--days', '1', '--resolution', 'daily']
+
+        assert runner.invoke(seed_command, args).exit_code == 0
+        result = runner.invoke(seed_command, args)
+
+        assert result.exit_code == 0
+        assert 'Seeded 2 departments, 2 KPIs and 2 data points' in result.output
+        assert Department.query.count() == 4
+        assert KPIData.query.count() == 4
@@ -0,0 +1,147 @@
+import csv
+import os
+from datetime import datetime
+from io import StringIO
+
+import pytest
+from sqlalchemy import delete, event
+
+from app import create_app, db
+from config import Config
+from models import Department, KPI, KPIData
+
+class SnapshotConfig(Config):
+    TESTING = True
+    METRICS_ENABLED = False
+    RATE_LIMIT_ENABLED = False
+    EXPORT_SNAPSHOT_ENABLED = True
+    EXPORT_SNAPSHOT_SEGMENT_ROWS = 3
+
+@pytest.fixture
+def app(tmp_path):
+    class FileConfig(SnapshotConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'kpi.db'}"
+        EXPORT_SNAPSHOT_DIR = str(tmp_path / 'snapshot')
+        FRAGMENT_CACHE_VERSIONS = str(tmp_path / 'versions')
+
+    app = create_app(FileConfig)
+    with app.app_context():
+        db.create_all()
+        dept = Department(name='Operations')
+        db.session.add(dept)
+        db.session.flush()
+        kpi = KPI(name='Uptime', unit='%', department_id=dept.id)
+        db.session.add(kpi)
+        db.session.flush()
+        for day in range(1, 8):
+            db.session.add(KPIData(kpi_id=kpi.id, value=90 + day, target=95, timestamp=datetime(2024, 1, day)))
+        db.session.commit()
+    return app
+
+def exported(client, path='/export/csv'):
+    response = client.get(path)
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+def values(text):
+    return [float(row['Actual_Value']) for row in csv.DictReader(StringIO(text))]
+
+class TestExportSnapshot:
+    def test_snapshot_matches_the_query(self, app):
+        """Test the served file is byte for byte the CSV the query path builds"""
+        client = app.test_client()
+        response = client.get('/export/csv')
+
+        assert response.headers['Content-Type'] == 'text/csv'
+        assert 'kpi_data.csv' in response.headers['Content-Disposition']
+        # A start date takes the query path
+        assert response.get_data(as_text=True) == exported(client, '/export/csv?start=2000-01-01')
+        assert sorted(os.listdir(os.path.join(app.config['EXPORT_SNAPSHOT_DIR'], 'segments'))) == [
+            '00000000.csv', '00000001.csv', '00000002.csv'
+        ]
+
+    def test_new_rows_are_appended(self, app):
+        """Test a refresh writes only the rows past the watermark"""
+        client = app.test_client()
+        snapshot = app.extensions['export_snapshot']
+        exported(client)
+
+        client.post('/api/kpi/1/data', json={'value': 42, 'target': 95, 'timestamp': '2024-01-08T00:00:00'})
+        client.post('/api/kpi/1/data', json={'value': 43, 'target': 95, 'timestamp': '2024-01-09T00:00:00'})
+        with app.app_context():
+            assert snapshot.refresh() == 2
+            assert snapshot.refresh() == 0
+
+        text = exported(client)
+        assert values(text)[-2:] == [42, 43]
+        assert text == exported(client, '/export/csv?start=2000-01-01')
+
+    def test_append_never_changes_a_file_being_served(self, app):
+        """Test an append replaces the served file, so a download in flight keeps its bytes"""
+        client = app.test_client()
+        snapshot = app.extensions['export_snapshot']
+        expected = exported(client).encode()
+
+        with open(snapshot.path, 'rb') as serving:
+            client.post('/api/kpi/1/data', json={'value': 42, 'target': 95, 'timestamp': '2024-01-08T00:00:00'})
+            with app.app_context():
+                assert snapshot.refresh() == 1
+            assert os.fstat(serving.fileno()).st_ino != os.stat(snapshot.path).st_ino
+            assert serving.read() == expected
+
+    def test_catalog_change_rebuilds(self, app):
+        """Test renaming a KPI rewrites every row"""
+        client = app.test_client()
+        exported(client)
+
+        with app.app_context():
+            db.session.get(KPI, 1).name = 'Availability'
+            db.session.commit()
+
+        text = exported(client)
+        assert {row['KPI_Name'] for row in csv.DictReader(StringIO(text))} == {'Availability'}
+
+    def test_verify_rewrites_changed_segments(self, app):
+        """Test deleted rows drop out of the segments they were in, and only those"""
+        client = app.test_client()
+        snapshot = app.extensions['export_snapshot']
+        exported(client)
+
+        with app.app_context():
+            db.session.execute(delete(KPIData).where(KPIData.id == 2))
+            db.session.commit()
+            assert snapshot.refresh(verify=True) == 2
+
+        assert values(exported(client)) == [91, 93, 94, 95, 96, 97]
+
+    def test_unchanged_snapshot_is_served_without_queries(self, app):
+        """Test repeat requests with no writes in between skip the database"""
+        client = app.test_client()
+        exported(client)
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                exported(client)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+        assert statements == []
+
+    def test_interrupted_append_is_discarded(self, app):
+        """Test bytes written after the last saved manifest are cut off"""
+        client = app.test_client()
+        expected = exported(client)
+        snapshot = app.extensions['export_snapshot']
+
+        for path in (snapshot._segment_path(2), snapshot.path):
+            with open(path, 'ab') as f:
+                f.write(b'half a row')
+        with app.app_context():
+            assert snapshot.refresh() == 0
+        assert exported(client, '/export/csv?start=2000-01-01') == expected
+        with open(snapshot.path, 'rb') as f:
+            assert f.read() == expected.encode()
@@ -0,0 +1,86 @@
+import gzip
+import json
+from datetime import date, datetime
+
+import brotli
+import pytest
+from flask import Response, jsonify, request
+
+from app import create_app
+from config import Config
+from web import json_provider
+from web.compression import negotiate
+
+class WebConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    METRICS_ENABLED = False
+    COMPRESSION_STREAM_MIN_SIZE = 20000
+
+@pytest.fixture
+def web_client():
+    app = create_app(WebConfig)
+
+    @app.route('/_test/rows')
+    def rows():
+        return {'values': list(range(int(request.args['count']))), 'at': datetime(2024, 1, 2, 3, 4, 5)}
+
+    @app.route('/_test/stream')
+    def stream():
+        return Response((f'row {i}\n' for i in range(10000)), mimetype='text/csv')
+
+    return app.test_client()
+
+class TestJSONProvider:
+    def test_dates_are_iso_8601(self, monkeypatch):
+        """Test both encoders write dates and datetimes as ISO 8601 with sorted keys"""
+        data = {'b': datetime(2024, 1, 2, 3, 4, 5, 600), 'a': date(2024, 1, 2), 'c': None}
+        expected = b'{"a":"2024-01-02","b":"2024-01-02T03:04:05.000600","c":null}'
+
+        assert json_provider.dumps(data) == expected
+        monkeypatch.setattr(json_provider, 'orjson', None)
+        assert json_provider.dumps(data) == expected
+
+    def test_jsonify_and_get_json(self):
+        """Test responses and request bodies go through the app's provider"""
+        app = create_app(WebConfig)
+        with app.test_request_context(json={'value': 1.5}):
+            assert jsonify(at=datetime(2024, 1, 2)).get_data() == b'{"at":"2024-01-02T00:00:00"}\n'
+            assert request.get_json() == {'value': 1.5}
+
+class TestCompression:
+    def test_negotiation(self):
+        """Test brotli is preferred and q-values are honoured"""
+        assert negotiate('gzip, deflate, br') == 'br'
+        assert negotiate('gzip') == 'gzip'
+        assert negotiate('br;q=0, gzip;q=0.5') == 'gzip'
+        assert negotiate('identity') is None
+        assert negotiate(None) is None
+
+    def test_json_is_compressed_per_accept_encoding(self, web_client):
+        """Test large JSON is encoded as the client accepts and small JSON is left alone"""
+        br = web_client.get('/_test/rows?count=2000', headers={'Accept-Encoding': 'gzip, br'})
+        assert br.headers['Content-Encoding'] == 'br'
+        assert 'Accept-Encoding' in br.headers['Vary']
+        assert json.loads(brotli.decompress(br.get_data()))['at'] == '2024-01-02T03:04:05'
+
+        gz = web_client.get('/_test/rows?count=2000', headers={'Accept-Encoding': 'gzip'})
+        assert gz.headers['Content-Encoding'] == 'gzip'
+        assert int(gz.headers['Content-Length']) == len(gz.get_data())
+        assert len(json.loads(gzip.decompress(gz.get_data()))['values']) == 2000
+
+        assert 'Content-Encoding' not in web_client.get('/_test/rows?count=2000').headers
+        small = web_client.get('/_test/rows?count=10', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in small.headers
+        assert small.get_json()['values'] == list(range(10))
+
+    def test_large_and_streamed_bodies_stream_through_the_compressor(self, web_client):
+        """Test generators and bodies over the stream threshold are compressed chunk by chunk"""
+        large = web_client.get('/_test/rows?count=10000', headers={'Accept-Encoding': 'gzip'})
+        assert large.is_streamed
+        assert 'Content-Length' not in large.headers
+        assert len(json.loads(gzip.decompress(large.get_data()))['values']) == 10000
+
+        stream = web_client.get('/_test/stream', headers={'Accept-Encoding': 'br'})
+        assert stream.is_streamed
+        assert brotli.decompress(stream.get_data()).decode().splitlines()[-1] == 'row 9999'
@@ -0,0 +1,450 @@
+from flask import Blueprint, current_app, render_template, request, jsonify, redirect, flash, send_file
+import hashlib
+from datetime import datetime
+from types import SimpleNamespace
+from sqlalchemy import func
+from database import db
+from database.database import use_reader
+from database.archive import iter_archived_rows
+from database.retention import archive_dir
+from database.partitions import query_partitions
+from models import Department, KPI, KPIData, KPIDataPartition, PERFORMANCE_STATUSES, performance_status_for
+from web.fragments import fragment
+
+main_bp = Blueprint('main', __name__)
+
+@main_bp.route('/')
+def dashboard():
+    """Main dashboard page"""
+    return render_template('dashboard.html')
+
+@main_bp.route('/kpi-form')
+def kpi_form():
+    """KPI data entry form"""
+    return render_template('kpi_form.html')
+
+def department_rows():
+    """Departments with their KPI counts, for the page fragments"""
+    kpi_count = db.session.query(func.count(KPI.id))\
+        .filter(KPI.department_id == Department.id)\
+        .correlate(Department)\
+        .scalar_subquery()
+    return db.session.query(
+        Department.id, Department.name, Department.description, Department.created_at,
+        kpi_count.label('kpi_count')
+    ).all()
+
+@fragment('department_options', depends=['catalog'])
+def department_options():
+    departments = db.session.query(Department.id, Department.name).all()
+    return render_template('fragments/department_options.html', departments=departments)
+
+@fragment('department_count', depends=['catalog'])
+def department_count():
+    return str(db.session.query(func.count(Department.id)).scalar())
+
+@fragment('department_cards', depends=['catalog'])
+def department_cards():
+    return render_template('fragments/department_cards.html', departments=department_rows())
+
+@fragment('kpi_options', depends=['catalog'])
+def kpi_options():
+    kpis = db.session.query(KPI.id, KPI.name, KPI.department_id).all()
+    return render_template('fragments/kpi_options.html', kpis=kpis)
+
+@fragment('recent_kpis', depends=['catalog', 'data'])
+def recent_kpis():
+    rows = db.session.query(
+        KPIData.value,
+        KPIData.target,
+        KPIData.timestamp,
+        KPIData.performance_status.label('performance_status'),
+        KPI.name.label('kpi_name'),
+        Department.name.label('department_name')
+    ).outerjoin(KPI, KPIData.kpi_id == KPI.id)\
+     .outerjoin(Department, KPI.department_id == Department.id)\
+     .order_by(KPIData.timestamp.desc())\
+     .limit(10).all()
+    return render_template('fragments/recent_kpis.html', recent_kpis=rows)
+
+@main_bp.route('/add-kpi-data', methods=['POST'])
+def add_kpi_data():
+    """Handle KPI data form submission"""
+    try:
+        kpi_id = request.form.get('kpi_id')
+        value = request.form.get('value')
+        target = request.form.get('target')
+        period = request.form.get('period')
+        notes = request.form.get('notes', '')
+        
+        if not kpi_id or not value or not target:
+            flash('Please fill in all required fields.', 'error')
+            return redirect('/kpi-form')
+        
+        try:
+            value = float(value)
+            target = float(target)
+            kpi_id = int(kpi_id)
+        except (ValueError, TypeError):
+            flash('Invalid value format. Please enter valid numbers.', 'error')
+            return redirect('/kpi-form')
+        
+        kpi = KPI.query.get(kpi_id)
+        if not kpi:
+            flash('Selected KPI does not exist.', 'error')
+            return redirect('/kpi-form')
+        
+        kpi_data = KPIData(
+            kpi_id=kpi_id,
+            value=value,
+            target=target,
+            period=period,
+            notes=notes,
+            created_by='admin',
+            timestamp=datetime.utcnow()
+        )
+        
+        db.session.add(kpi_data)
+        db.session.commit()
+        
+        flash(f'KPI data for "{kpi.name}" added successfully!', 'success')
+        return redirect('/')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error adding KPI data: {str(e)}', 'error')
+        return redirect('/kpi-form')
+
+@main_bp.route('/api/dashboard-data')
+def dashboard_data():
+    """API endpoint for dashboard data"""
+    try:
+        total_departments = Department.query.count()
+        total_kpis = KPI.query.count()
+        total_data_points = KPIData.query.count()
+        
+        recent_data = db.session.query(
+            KPIData, KPI, Department
+        ).select_from(KPIData).join(
+            KPI, KPIData.kpi_id == KPI.id
+        ).join(
+            Department, KPI.department_id == Department.id
+        ).order_by(
+            KPIData.timestamp.desc()
+        ).limit(20).all()
+        
+        recent_kpis = []
+        for kpi_data, kpi, dept in recent_data:
+            recent_kpis.append({
+                'id': kpi_data.id,
+                'kpi_name': kpi.name,
+                'department': dept.name,
+                'value': kpi_data.value,
+                'target': kpi_data.target,
+                'timestamp': kpi_data.timestamp,
+                'performance': 'Above Target' if kpi_data.value >= kpi_data.target else 'Below Target'
+            })
+        
+        return jsonify({
+            'success': True,
+            'summary': {
+                'total_departments': total_departments,
+                'total_kpis': total_kpis,
+                'total_data_points': total_data_points
+            },
+            'recent_kpis': recent_kpis
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@main_bp.route('/api/departments/<int:dept_id>/kpis')
+def get_department_kpis(dept_id):
+    """Get KPIs for a specific department (for AJAX filtering)"""
+    try:
+        kpis = KPI.query.filter_by(department_id=dept_id).all()
+        kpi_list = [{'id': kpi.id, 'name': kpi.name} for kpi in kpis]
+        return jsonify({'success': True, 'kpis': kpi_list})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@main_bp.app_errorhandler(404)
+def page_not_found(e):
+    """Handle 404 errors"""
+    return render_template('404.html'), 404
+
+@main_bp.app_errorhandler(500)
+def internal_server_error(e):
+    """Handle 500 errors"""
+    return render_template('500.html'), 500
+
+def parse_export_args():
+    """Read the status and start/end range filters shared by the exports"""
+    status_filter = request.args.get('status')
+    if status_filter and status_filter not in PERFORMANCE_STATUSES:
+        raise ValueError(f'Invalid status: {status_filter}')
+    
+    start = request.args.get('start')
+    end = request.args.get('end')
+    try:
+        start = datetime.fromisoformat(start) if start else None
+        end = datetime.fromisoformat(end) if end else None
+    except ValueError:
+        raise ValueError('start and end must be ISO dates')
+    
+    return status_filter, start, end
+
+EXPORT_FIELDS = [
+    'Data_ID', 'KPI_ID', 'KPI_Name', 'KPI_Description', 'KPI_Unit', 'KPI_Target_Type',
+    'Department_ID', 'Department_Name', 'Department_Description',
+    'Actual_Value', 'Target_Value', 'Variance', 'Achievement_Rate', 'Status', 'Performance_Category',
+    'Period', 'Date', 'DateTime', 'Year', 'Month', 'Month_Name', 'Quarter', 'Week', 'Day', 'Weekday',
+    'Notes', 'Created_By'
+]
+
+def catalog_columns():
+    """KPI and department columns of an export row"""
+    return [
+        KPI.id.label('kpi_id'),
+        KPI.name.label('kpi_name'),
+        KPI.description.label('kpi_description'),
+        KPI.unit.label('kpi_unit'),
+        KPI.target_type.label('kpi_target_type'),
+        Department.id.label('department_id'),
+        Department.name.label('department_name'),
+        Department.description.label('department_description')
+    ]
+
+def export_columns(entity):
+    """Columns of an export row, read from `entity` (KPIData or a partition)"""
+    return [
+        entity.id.label('data_id'),
+        entity.value,
+        entity.target,
+        entity.period,
+        entity.timestamp,
+        entity.notes,
+        entity.created_by,
+        entity.performance_status.label('status'),
+        *catalog_columns()
+    ]
+
+def export_record(row, blank_missing=False):
+    """One export row as a Power BI / CSV record.
+    
+    With `blank_missing`, optional text columns come out as '' instead of
+    None (the CSV export).
+    """
+    def text(value):
+        return (value or '') if blank_missing else value
+    
+    # Calculate performance metrics
+    achievement_rate = (row.value / row.target * 100) if row.target > 0 else 0
+    variance = row.value - row.target
+    
+    # Determine performance category
+    if achievement_rate >= 100:
+        performance_category = 'Excellent'
+    elif achievement_rate >= 90:
+        performance_category = 'Good'
+    elif achievement_rate >= 75:
+        performance_category = 'Fair'
+    else:
+        performance_category = 'Poor'
+    
+    return {
+        'Data_ID': row.data_id,
+        'KPI_ID': row.kpi_id,
+        'KPI_Name': row.kpi_name,
+        'KPI_Description': text(row.kpi_description),
+        'KPI_Unit': text(row.kpi_unit),
+        'KPI_Target_Type': text(row.kpi_target_type),
+        'Department_ID': row.department_id,
+        'Department_Name': row.department_name,
+        'Department_Description': text(row.department_description),
+        'Actual_Value': row.value,
+        'Target_Value': row.target,
+        'Variance': variance,
+        'Achievement_Rate': round(achievement_rate, 2),
+        'Status': row.status,
+        'Performance_Category': performance_category,
+        'Period': row.period,
+        'Date': row.timestamp.strftime('%Y-%m-%d'),
+        'DateTime': row.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        'Year': row.timestamp.year,
+        'Month': row.timestamp.month,
+        'Month_Name': row.timestamp.strftime('%B'),
+        'Quarter': f"Q{((row.timestamp.month-1)//3)+1}",
+        'Week': row.timestamp.isocalendar()[1],
+        'Day': row.timestamp.day,
+        'Weekday': row.timestamp.strftime('%A'),
+        'Notes': row.notes or '',
+        'Created_By': text(row.created_by)
+    }
+
+def export_query(entity, *columns):
+    """Export rows of `entity` joined to their KPI and department; `columns`
+    replace the export columns"""
+    return db.session.query(*(columns or export_columns(entity))).select_from(entity)\
+     .join(KPI, entity.kpi_id == KPI.id)\
+     .join(Department, KPI.department_id == Department.id)
+
+def get_export_rows(status_filter=None, start=None, end=None):
+    """Joined KPI data rows for the exports.
+    
+    Only the kpi_data partitions the range touches are read. When a start
+    date is given, archived rows in the range are read back from the
+    compressed archive as well, so retention stays invisible to exports.
+    """
+    def build_query(entity):
+        query = export_query(entity)
+        
+        if status_filter:
+            query = query.filter(entity.performance_status == status_filter)
+        
+        if start:
+            query = query.filter(entity.timestamp >= start)
+        if end:
+            query = query.filter(entity.timestamp < end)
+        
+        return query
+    
+    data = query_partitions(build_query, start, end)
+    
+    if start:
+        data = get_archived_export_rows(status_filter, start, end) + data
+    
+    return data
+
+def get_archived_export_rows(status_filter, start, end):
+    """Archived rows in the range, shaped like the rows of get_export_rows()"""
+    catalog = {
+        row.kpi_id: row for row in db.session.query(*catalog_columns())
+            .join(Department, KPI.department_id == Department.id)
+    }
+    
+    rows = []
+    for archived in iter_archived_rows(archive_dir(), start, end):
+        kpi = catalog.get(archived['kpi_id'])
+        if kpi is None:
+            continue
+        
+        status = performance_status_for(archived['value'], archived['target'], kpi.kpi_target_type)
+        if status_filter and status != status_filter:
+            continue
+        
+        rows.append(SimpleNamespace(
+            data_id=archived['id'],
+            value=archived['value'],
+            target=archived['target'],
+            period=archived['period'],
+            timestamp=archived['timestamp'],
+            notes=archived['notes'],
+            created_by=archived['created_by'],
+            status=status,
+            **kpi._asdict()
+        ))
+    
+    return rows
+
+class ExportSnapshotSource:
+    """Rows of the unfiltered CSV export by id range, for web.snapshots"""
+    fields = EXPORT_FIELDS
+    
+    def fingerprint(self):
+        """Digest of every catalog column that goes into export rows"""
+        digest = hashlib.blake2b(digest_size=16)
+        for row in db.session.query(*catalog_columns()).join(Department, KPI.department_id == Department.id).order_by(KPI.id):
+            digest.update(repr(tuple(row)).encode())
+        return digest.hexdigest()
+    
+    def max_id(self):
+        return max(
+            db.session.query(func.max(KPIData.id)).scalar() or 0,
+            db.session.query(func.max(KPIDataPartition.max_id)).scalar() or 0
+        )
+    
+    def segment_counts(self, segment_rows, last_id):
+        """Export rows per id range of `segment_rows` ids, up to `last_id`"""
+        def build_query(entity):
+            segment = (entity.id - 1) // segment_rows
+            return export_query(entity, segment, func.count())\
+                .filter(entity.id <= last_id)\
+                .group_by(segment)
+        
+        counts = {}
+        for segment, count in query_partitions(build_query):
+            counts[int(segment)] = counts.get(int(segment), 0) + count
+        return counts
+    
+    def records(self, first_id, last_id=None):
+        """(id, CSV record) of the export rows with ids in [first_id, last_id], by id"""
+        def build_query(entity):
+            query = export_query(entity).filter(entity.id >= first_id)
+            if last_id is not None:
+                query = query.filter(entity.id <= last_id)
+            return query
+        
+        rows = query_partitions(build_query, after_id=first_id - 1, sort_key=lambda row: row.data_id)
+        return [(row.data_id, export_record(row, blank_missing=True)) for row in rows]
+
+@main_bp.route('/export/powerbi-data')
+@use_reader
+def export_powerbi_data():
+    """Export data in format suitable for Power BI"""
+    try:
+        try:
+            status_filter, start, end = parse_export_args()
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        data = get_export_rows(status_filter, start, end)
+        
+        result = [export_record(row) for row in data]
+        
+        return jsonify({
+            'success': True,
+            'data': result,
+            'record_count': len(result)
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@main_bp.route('/export/csv')
+@use_reader
+def export_csv():
+    """Export data as CSV for Power BI import"""
+    import csv
+    from io import StringIO
+    from flask import make_response
+    
+    try:
+        try:
+            status_filter, start, end = parse_export_args()
+        except ValueError as e:
+            return f"Error exporting CSV: {str(e)}", 400
+        
+        snapshot = current_app.extensions.get('export_snapshot')
+        if snapshot and not (status_filter or start or end):
+            response = send_file(snapshot.current(), as_attachment=True, download_name='kpi_data.csv')
+            response.headers['Content-Type'] = 'text/csv'
+            return response
+        
+        data = get_export_rows(status_filter, start, end)
+        
+        # Create CSV content
+        output = StringIO()
+        writer = csv.DictWriter(output, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        
+        for row in data:
+            writer.writerow(export_record(row, blank_missing=True))
+        
+        # Return as downloadable file
+        response = make_response(output.getvalue())
+        response.headers['Content-Type'] = 'text/csv'
+        response.headers['Content-Disposition'] = 'attachment; filename=kpi_data.csv'
+        return response
+        
+    except Exception as e:
+        return f"Error exporting CSV: {str(e)}", 500
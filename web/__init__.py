@@ -0,0 +1,7 @@
+from .compression import init_compression
+from .fragments import fragment, init_fragment_cache
+from .json_provider import FastJSONProvider, dumps
+from .ratelimit import init_rate_limits
+from .snapshots import init_export_snapshot
+
+__all__ = ['FastJSONProvider', 'dumps', 'fragment', 'init_compression', 'init_export_snapshot', 'init_fragment_cache', 'init_rate_limits']
@@ -0,0 +1,101 @@
+import zlib
+
+from flask import request
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - gzip only
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'text/csv', 'text/html', 'text/plain', 'text/css',
+    'text/javascript', 'application/javascript', 'application/xml', 'text/xml'
+}
+
+# Buffered bodies at least this large are compressed slice by slice as they
+# are sent, instead of all at once before the first byte goes out
+STREAM_SLICE = 256 * 1024
+
+class Compressor:
+    """Incremental gzip or brotli encoder"""
+
+    def __init__(self, encoding, gzip_level=6, brotli_quality=4):
+        self.encoding = encoding
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=brotli_quality)
+            self.compress, self.finish = compressor.process, compressor.finish
+        else:
+            # wbits 31: deflate with a gzip header and trailer
+            compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+            self.compress, self.finish = compressor.compress, compressor.flush
+
+    def iter(self, chunks):
+        """Compress an iterable of byte chunks, yielding output as it is ready"""
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = self.compress(chunk)
+            if data:
+                yield data
+        yield self.finish()
+
+def negotiate(accept_encoding):
+    """The encoding to use for an Accept-Encoding header, or None"""
+    encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return parse_accept_header(accept_encoding or '').best_match(encodings)
+
+def compressible(mimetype, status_code, headers):
+    return (
+        mimetype in COMPRESSIBLE_MIMETYPES
+        and 200 <= status_code < 300 and status_code != 204
+        and 'Content-Encoding' not in headers
+    )
+
+def compress_response(response, config):
+    if not compressible(response.mimetype, response.status_code, response.headers):
+        return response
+    # File responses keep their Content-Length and byte ranges
+    if response.direct_passthrough:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+
+    compressor = Compressor(encoding, config['COMPRESSION_GZIP_LEVEL'], config['COMPRESSION_BROTLI_QUALITY'])
+    if response.is_streamed:
+        response.response = compressor.iter(response.response)
+    else:
+        body = response.get_data()
+        if len(body) < config['COMPRESSION_MIN_SIZE']:
+            return response
+        if len(body) >= config['COMPRESSION_STREAM_MIN_SIZE']:
+            response.response = compressor.iter(
+                body[i:i + STREAM_SLICE] for i in range(0, len(body), STREAM_SLICE)
+            )
+        else:
+            response.set_data(compressor.compress(body) + compressor.finish())
+
+    if response.is_streamed:
+        response.headers.pop('Content-Length', None)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_compression(app):
+    """Compress responses with brotli or gzip, as the client's Accept-Encoding allows"""
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return
+
+    config = {
+        'COMPRESSION_MIN_SIZE': 1024,
+        'COMPRESSION_STREAM_MIN_SIZE': 1024 * 1024,
+        'COMPRESSION_GZIP_LEVEL': 6,
+        'COMPRESSION_BROTLI_QUALITY': 4
+    }
+    config.update({key: app.config[key] for key in config if key in app.config})
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, config)
@@ -0,0 +1,157 @@
+import fcntl
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from markupsafe import Markup
+from sqlalchemy import event
+
+from database.database import db
+from .shared import shared_file
+
+# What each kind of version covers: a write to any of its tables bumps it
+VERSION_TABLES = {
+    'catalog': ('departments', 'kpis'),
+    'data': ('kpi_data',)
+}
+VERSION_KINDS = list(VERSION_TABLES)
+COUNTER = struct.Struct('<Q')
+
+WRITE_STATEMENT = re.compile(
+    r'^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM|MERGE\s+(?:INTO\s+)?|'
+    r'(?:DROP|ALTER|CREATE)\s+TABLE\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?)\s*'
+    r'(?:[\["`]?(\w+)[\]"`]?\.)?[\["`]?(\w+)',
+    re.IGNORECASE
+)
+# Monthly partitions are kpi_data tables in attached p_YYYY_MM schemas
+PARTITION_SCHEMA = re.compile(r'^p_\d{4}_\d{2}$', re.IGNORECASE)
+
+def written_kinds(statement):
+    """Version kinds a statement changes: () for reads and untracked tables"""
+    if statement[:6].upper() not in ('INSERT', 'REPLAC', 'UPDATE', 'DELETE', 'MERGE ', 'DROP T', 'ALTER ', 'CREATE'):
+        return ()
+    match = WRITE_STATEMENT.match(statement)
+    if not match:
+        return ()
+    schema, table = match.group(1), match.group(2).lower()
+    if schema and PARTITION_SCHEMA.match(schema):
+        table = 'kpi_data'
+    return tuple(kind for kind, tables in VERSION_TABLES.items() if table in tables)
+
+class SharedVersions:
+    """Version counters in a memory-mapped file shared by every worker"""
+
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = len(VERSION_KINDS) * COUNTER.size
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.map = mmap.mmap(self.fd, size)
+
+    def get(self, kind):
+        return COUNTER.unpack_from(self.map, VERSION_KINDS.index(kind) * COUNTER.size)[0]
+
+    def bump(self, kinds):
+        fcntl.lockf(self.fd, fcntl.LOCK_EX)
+        try:
+            for kind in kinds:
+                offset = VERSION_KINDS.index(kind) * COUNTER.size
+                COUNTER.pack_into(self.map, offset, COUNTER.unpack_from(self.map, offset)[0] + 1)
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN)
+
+class FragmentCache:
+    """Rendered fragments per process, least recently used evicted first.
+
+    An entry is valid while the versions it was rendered at are current and
+    it is younger than `ttl` seconds.
+    """
+
+    def __init__(self, versions, max_entries=256, ttl=300):
+        self.versions = versions
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get_or_render(self, name, depends, render):
+        key = tuple(self.versions.get(kind) for kind in depends)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is not None and entry[0] == key and entry[1] > now:
+                self.entries.move_to_end(name)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        html = Markup(render())
+        with self.lock:
+            self.entries[name] = (key, now + self.ttl, html)
+            self.entries.move_to_end(name)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+# name -> (version kinds, render function), filled by @fragment
+FRAGMENTS = {}
+
+def fragment(name, depends):
+    """Register a function rendering an HTML fragment that changes only when
+    the `depends` versions do"""
+    def decorator(render):
+        FRAGMENTS[name] = (tuple(depends), render)
+        return render
+    return decorator
+
+def render_fragment(name):
+    """The fragment's HTML, from the cache when it is current (a Jinja global)"""
+    depends, render = FRAGMENTS[name]
+    cache = current_app.extensions.get('fragment_cache')
+    if cache is None:
+        return Markup(render())
+    return cache.get_or_render(name, depends, render)
+
+def track_writes(engine, versions):
+    """Bump versions when a connection that wrote to their tables goes back to the pool.
+
+    Bumping at check-in rather than at execute time means the commit has
+    happened, so a page rendered after the bump sees the new rows.
+    """
+    @event.listens_for(engine, 'after_cursor_execute')
+    def note_write(conn, cursor, statement, parameters, context, executemany):
+        kinds = written_kinds(statement)
+        if kinds:
+            conn.info.setdefault('fragment_writes', set()).update(kinds)
+
+    @event.listens_for(engine, 'checkin')
+    def bump_versions(dbapi_connection, connection_record):
+        kinds = connection_record.info.pop('fragment_writes', None)
+        if kinds:
+            versions.bump(kinds)
+
+def init_fragment_cache(app):
+    """Serve page fragments from a per-process LRU cache keyed on shared versions"""
+    app.jinja_env.globals['fragment'] = render_fragment
+    if not app.config.get('FRAGMENT_CACHE_ENABLED', True):
+        return
+
+    versions = SharedVersions(shared_file(app.config.get('FRAGMENT_CACHE_VERSIONS'), 'kpi-fragments-'))
+    app.extensions['fragment_cache'] = FragmentCache(
+        versions,
+        max_entries=app.config.get('FRAGMENT_CACHE_SIZE', 256),
+        ttl=app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+    )
+    with app.app_context():
+        for engine in db.engines.values():
+            track_writes(engine, versions)
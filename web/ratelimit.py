@@ -0,0 +1,213 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+from flask import jsonify, request
+
+from .shared import shared_file
+
+LIMIT_PATTERN = re.compile(r'^\s*(\d+)\s*(?:per|/)\s*(\d+)?\s*(second|minute|hour|day)s?\s*$')
+UNIT_SECONDS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+MAGIC = b'KPIRL001'
+HEADER = struct.Struct('<8sI')
+HEADER_SIZE = 64
+# One bucket: key hash, tokens left, time of the last update
+SLOT = struct.Struct('<Qdd')
+PROBES = 8
+# Concurrency slots are byte-range locks this far into the file; nothing
+# is stored there, the locks alone carry the state
+SLOT_LOCK_BASE = 1 << 30
+SLOTS_PER_ROUTE = 1 << 16
+
+# Per-request state lives in the WSGI environ, like the metrics' state
+REQUEST_SLOT = 'kpi.concurrency_slot'
+
+def parse_limit(limit):
+    """'1000 per hour' or '10/minute' as (tokens per second, burst size)"""
+    match = LIMIT_PATTERN.match(limit)
+    if not match:
+        raise ValueError(f'Invalid rate limit: {limit}')
+    count, multiple, unit = match.groups()
+    seconds = int(multiple or 1) * UNIT_SECONDS[unit]
+    return int(count) / seconds, int(count)
+
+def bucket_key(*parts):
+    """Stable 64-bit key, the same in every worker (hash() is salted per process)"""
+    digest = hashlib.blake2b('\0'.join(parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') | 1
+
+class SharedLimiter:
+    """Token buckets and concurrency slots shared by every process using `path`.
+
+    Buckets live in a memory-mapped hash table; updates are serialised by a
+    byte-range lock on the file, plus a thread lock within a process.
+    Concurrency slots are byte-range locks too, so the kernel frees the
+    slots of a worker that dies mid-request.
+    """
+
+    def __init__(self, path, slots=4096):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = HEADER_SIZE + slots * SLOT.size
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, 0)
+        try:
+            if os.fstat(self.fd).st_size < size:
+                os.ftruncate(self.fd, size)
+            self.map = mmap.mmap(self.fd, size)
+            magic, existing = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC or existing != slots:
+                self.map[:size] = bytes(size)
+                HEADER.pack_into(self.map, 0, MAGIC, slots)
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, 0)
+        self.slots = slots
+        self.lock = threading.Lock()
+        self.held = set()
+
+    def take(self, buckets, cost=1):
+        """Take `cost` tokens from every (key, rate, capacity) bucket, or none.
+
+        Returns 0 when allowed, else the seconds until all buckets can pay.
+        """
+        now = time.monotonic()
+        with self.lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, 0)
+            try:
+                found = []
+                wait = 0
+                for key, rate, capacity in buckets:
+                    offset, tokens, updated = self._find(key, capacity, now, [entry[0] for entry in found])
+                    elapsed = now - updated
+                    # A clock behind the stored time (reboot) refills the bucket
+                    tokens = capacity if elapsed < 0 else min(capacity, tokens + elapsed * rate)
+                    if tokens < cost:
+                        wait = max(wait, (cost - tokens) / rate)
+                    found.append((offset, key, tokens))
+
+                for offset, key, tokens in found:
+                    SLOT.pack_into(self.map, offset, key, tokens - cost if not wait else tokens, now)
+                return wait
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, 0)
+
+    def _find(self, key, capacity, now, claimed):
+        """(offset, tokens, updated) of a key's bucket, claiming a slot if new.
+
+        When every probed slot is taken, the least recently updated one is
+        reused; an idle bucket has refilled anyway.
+        """
+        start = key % self.slots
+        oldest = None
+        for probe in range(PROBES):
+            offset = HEADER_SIZE + ((start + probe) % self.slots) * SLOT.size
+            if offset in claimed:
+                continue
+            stored, tokens, updated = SLOT.unpack_from(self.map, offset)
+            if stored == key:
+                return offset, tokens, updated
+            if stored == 0:
+                return offset, capacity, now
+            if oldest is None or updated < oldest[1]:
+                oldest = (offset, updated)
+        return oldest[0], capacity, now
+
+    def acquire(self, route_index, limit):
+        """Claim one of `limit` concurrent slots for a route; None when all are busy"""
+        base = SLOT_LOCK_BASE + route_index * SLOTS_PER_ROUTE
+        with self.lock:
+            for offset in range(base, base + limit):
+                # Byte-range locks belong to the process, so threads of this
+                # process keep track of the slots they hold themselves
+                if offset in self.held:
+                    continue
+                try:
+                    fcntl.lockf(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, offset)
+                except OSError:
+                    continue
+                self.held.add(offset)
+                return offset
+        return None
+
+    def release(self, offset):
+        with self.lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, offset)
+            self.held.discard(offset)
+
+class RateLimits:
+    """The app's limits: a bucket per client, a bucket per client and route,
+    and concurrency caps per route"""
+
+    def __init__(self, config):
+        self.limiter = SharedLimiter(shared_file(config.get('RATE_LIMIT_STORAGE'), 'kpi-ratelimit-'))
+        self.client_limit = parse_limit(config['API_RATE_LIMIT']) if config.get('API_RATE_LIMIT') else None
+        self.route_limits = {rule: parse_limit(limit) for rule, limit in config.get('RATE_LIMITS', {}).items()}
+        self.concurrency = {
+            rule: (index, limit) for index, (rule, limit) in enumerate(sorted(config.get('CONCURRENCY_LIMITS', {}).items()))
+        }
+        self.retry_after = config.get('CONCURRENCY_RETRY_AFTER', 1)
+
+    def check(self, client, rule):
+        """Seconds the client must wait before `rule` may run, or 0"""
+        buckets = []
+        if self.client_limit:
+            buckets.append((bucket_key(client), *self.client_limit))
+        if rule in self.route_limits:
+            buckets.append((bucket_key(client, rule), *self.route_limits[rule]))
+        return self.limiter.take(buckets) if buckets else 0
+
+    def acquire(self, rule):
+        """(acquired, slot): a concurrency slot for capped routes, None for the rest"""
+        if rule not in self.concurrency:
+            return True, None
+        slot = self.limiter.acquire(*self.concurrency[rule])
+        return slot is not None, slot
+
+    def release(self, slot):
+        if slot is not None:
+            self.limiter.release(slot)
+
+def too_many_requests(retry_after, message):
+    response = jsonify({'success': False, 'error': message})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def init_rate_limits(app):
+    """Enforce API_RATE_LIMIT, RATE_LIMITS and CONCURRENCY_LIMITS with 429 responses"""
+    if not app.config.get('RATE_LIMIT_ENABLED', True):
+        return
+
+    limits = RateLimits(app.config)
+    client_header = app.config.get('RATE_LIMIT_CLIENT_HEADER')
+    app.extensions['rate_limits'] = limits
+
+    def client_id():
+        if client_header and request.headers.get(client_header):
+            return request.headers[client_header].split(',')[0].strip()
+        return request.remote_addr or 'unknown'
+
+    @app.before_request
+    def limit_request():
+        if request.url_rule is None or request.endpoint in ('static', 'metrics'):
+            return
+        rule = request.url_rule.rule
+
+        wait = limits.check(client_id(), rule)
+        if wait:
+            return too_many_requests(wait, 'Rate limit exceeded')
+
+        acquired, slot = limits.acquire(rule)
+        if not acquired:
+            return too_many_requests(limits.retry_after, 'Too many concurrent requests for this endpoint')
+        request.environ[REQUEST_SLOT] = slot
+
+    @app.teardown_request
+    def release_slot(exc=None):
+        limits.release(request.environ.pop(REQUEST_SLOT, None))
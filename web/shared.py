@@ -0,0 +1,21 @@
+import atexit
+import os
+import tempfile
+
+def shared_file(path, prefix):
+    """Path of a file for state shared between worker processes.
+
+    Without a configured `path` a temporary file is created; workers forked
+    from this process share it, and it is removed when this process exits.
+    """
+    if path:
+        return path
+    fd, path = tempfile.mkstemp(prefix=prefix)
+    os.close(fd)
+    atexit.register(remove_shared_file, path, os.getpid())
+    return path
+
+def remove_shared_file(path, owner):
+    # Forked workers inherit the exit hook; only the creator removes the file
+    if os.getpid() == owner and os.path.exists(path):
+        os.unlink(path)
@@ -0,0 +1,239 @@
+import csv
+import fcntl
+import io
+import json
+import os
+import shutil
+import threading
+import time
+
+MANIFEST_VERSION = 1
+
+def encode_csv(fields, records, header=False):
+    """CSV bytes for `records`, written exactly as csv.DictWriter would"""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=fields)
+    if header:
+        writer.writeheader()
+    writer.writerows(records)
+    return output.getvalue().encode('utf-8')
+
+class ExportSnapshot:
+    """A CSV export kept on disk and brought up to date incrementally.
+
+    Rows live in segment files by id range (`segment_rows` ids each), and
+    the header plus the segments, in order, make up the file that is
+    served. Rows past the watermark are appended to their segments and the
+    served file is assembled again under a new inode. A changed
+    catalog rebuilds everything; `refresh(verify=True)` rewrites only the
+    segments whose row counts no longer match the database (rows deleted
+    by retention, or committed after a higher id was already appended).
+
+    `source` supplies the rows: fields, fingerprint(), max_id(),
+    segment_counts(segment_rows, last_id) and records(first_id, last_id).
+    """
+
+    def __init__(self, directory, source, segment_rows=100000, versions=None, ttl=300):
+        self.directory = directory
+        self.source = source
+        self.segment_rows = segment_rows
+        self.versions = versions
+        self.ttl = ttl
+        self.path = os.path.join(directory, 'kpi_data.csv')
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.segment_dir = os.path.join(directory, 'segments')
+        self.header = encode_csv(source.fields, [], header=True)
+        self.lock = threading.Lock()
+        self.checked = None
+        os.makedirs(self.segment_dir, exist_ok=True)
+
+    def current(self):
+        """Path of the snapshot file, refreshed first if the database may have changed.
+
+        With shared versions (the fragment cache's), a process that found
+        the snapshot current serves it again without any query until a
+        write bumps the catalog or data version, or `ttl` seconds pass.
+        """
+        token = tuple(self.versions.get(kind) for kind in ('catalog', 'data')) if self.versions else None
+        checked = self.checked
+        if token is not None and checked is not None and checked[0] == token and checked[1] > time.monotonic():
+            return self.path
+
+        self.refresh()
+        self.checked = (token, time.monotonic() + self.ttl) if token is not None else None
+        return self.path
+
+    def refresh(self, verify=False):
+        """Bring the files up to date; returns the number of rows written"""
+        with self.lock:
+            fd = os.open(os.path.join(self.directory, '.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                # Other workers wait here rather than writing the same rows
+                fcntl.lockf(fd, fcntl.LOCK_EX)
+                manifest = self._load()
+                fingerprint = self.source.fingerprint()
+                if manifest is None or manifest['fingerprint'] != fingerprint:
+                    return self._rebuild(fingerprint)
+
+                written = self._verify(manifest) if verify else 0
+                return written + self._append(manifest)
+            finally:
+                os.close(fd)
+
+    def _segment_path(self, index):
+        return os.path.join(self.segment_dir, f'{index:08d}.csv')
+
+    def _segment_range(self, index, last_id):
+        return index * self.segment_rows + 1, min((index + 1) * self.segment_rows, last_id)
+
+    def _load(self):
+        """The manifest, with segments cut back to the sizes it records; None to rebuild.
+
+        An append interrupted before its manifest was saved leaves bytes
+        past those sizes; truncating drops them, and the next append
+        writes the same rows again. The served file is never changed in
+        place: if it does not match the manifest it is assembled afresh.
+        """
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (manifest.get('version') != MANIFEST_VERSION or manifest.get('fields') != self.source.fields
+                or manifest.get('segment_rows') != self.segment_rows):
+            return None
+
+        for index, segment in manifest['segments'].items():
+            path = self._segment_path(int(index))
+            try:
+                if os.path.getsize(path) < segment['bytes']:
+                    return None
+                os.truncate(path, segment['bytes'])
+            except OSError:
+                return None
+
+        try:
+            served = os.path.getsize(self.path)
+        except OSError:
+            served = None
+        if served != manifest['bytes']:
+            self._assemble(manifest)
+            self._save(manifest)
+        return manifest
+
+    def _discard(self):
+        """Drop the manifest before rewriting files in place, so a crash
+        part way leads to a rebuild rather than a mix of old and new"""
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+    def _save(self, manifest):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _write_segment(self, manifest, index):
+        """Rewrite one segment from the database, up to the watermark"""
+        path = self._segment_path(index)
+        first_id, last_id = self._segment_range(index, manifest['watermark'])
+        records = [record for _, record in self.source.records(first_id, last_id)]
+        if not records:
+            manifest['segments'].pop(str(index), None)
+            if os.path.exists(path):
+                os.remove(path)
+            return 0
+
+        data = encode_csv(self.source.fields, records)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+        manifest['segments'][str(index)] = {'rows': len(records), 'bytes': len(data)}
+        return len(records)
+
+    def _assemble(self, manifest):
+        """Write the served file as the header followed by every segment"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as out:
+            out.write(self.header)
+            for index in sorted(manifest['segments'], key=int):
+                with open(self._segment_path(int(index)), 'rb') as segment:
+                    shutil.copyfileobj(segment, out)
+        # Requests already sending the old file keep reading it
+        os.replace(tmp_path, self.path)
+        manifest['bytes'] = os.path.getsize(self.path)
+
+    def _rebuild(self, fingerprint):
+        watermark = self.source.max_id()
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'fields': self.source.fields,
+            'segment_rows': self.segment_rows,
+            'fingerprint': fingerprint,
+            'watermark': watermark,
+            'segments': {},
+            'bytes': 0
+        }
+        self._discard()
+        for name in os.listdir(self.segment_dir):
+            os.remove(os.path.join(self.segment_dir, name))
+
+        written = 0
+        for index in sorted(self.source.segment_counts(self.segment_rows, watermark)):
+            written += self._write_segment(manifest, index)
+        self._assemble(manifest)
+        self._save(manifest)
+        return written
+
+    def _verify(self, manifest):
+        counts = self.source.segment_counts(self.segment_rows, manifest['watermark'])
+        stale = sorted(
+            index for index in set(counts) | {int(index) for index in manifest['segments']}
+            if counts.get(index, 0) != manifest['segments'].get(str(index), {}).get('rows', 0)
+        )
+        if not stale:
+            return 0
+
+        self._discard()
+        written = sum(self._write_segment(manifest, index) for index in stale)
+        self._assemble(manifest)
+        self._save(manifest)
+        return written
+
+    def _append(self, manifest):
+        rows = self.source.records(manifest['watermark'] + 1, None)
+        if not rows:
+            return 0
+
+        by_segment = {}
+        for data_id, record in rows:
+            by_segment.setdefault((data_id - 1) // self.segment_rows, []).append(record)
+
+        for index, records in sorted(by_segment.items()):
+            data = encode_csv(self.source.fields, records)
+            with open(self._segment_path(index), 'ab') as segment:
+                segment.write(data)
+            entry = manifest['segments'].setdefault(str(index), {'rows': 0, 'bytes': 0})
+            entry['rows'] += len(records)
+            entry['bytes'] += len(data)
+
+        manifest['watermark'] = rows[-1][0]
+        # A new file rather than an append: downloads in flight (and ranged
+        # resumes, which send If-Range) keep reading the file they started on
+        self._assemble(manifest)
+        self._save(manifest)
+        return len(rows)
+
+def init_export_snapshot(app, source):
+    """Serve the unfiltered CSV export from an ExportSnapshot of `source`"""
+    if not app.config.get('EXPORT_SNAPSHOT_ENABLED'):
+        return
+
+    fragment_cache = app.extensions.get('fragment_cache')
+    app.extensions['export_snapshot'] = ExportSnapshot(
+        app.config.get('EXPORT_SNAPSHOT_DIR') or os.path.join(app.instance_path, 'export_snapshot'),
+        source,
+        segment_rows=app.config.get('EXPORT_SNAPSHOT_SEGMENT_ROWS', 100000),
+        versions=fragment_cache.versions if fragment_cache else None,
+        ttl=app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+    )
@@ -0,0 +1,4 @@
+"""Production entry point: gunicorn -c gunicorn.conf.py (serves wsgi:app)"""
+from app import app, preload
+
+preload(app)